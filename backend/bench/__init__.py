@@ -0,0 +1,4 @@
+"""
+串流壓力測試工具：本機假攝影機 (bench.fakecam) 與 /stream/ 負載產生器 (bench.stream_load)。
+全部只用標準函式庫 + OpenCV / numpy，可離線在一般 Linux 主機上執行。
+"""
@@ -0,0 +1,233 @@
+# bench/fakecam.py
+"""
+本機假攝影機：以 MJPEG over HTTP (multipart/x-mixed-replace) 輸出合成畫面或循環播放影片檔。
+
+每張影格上緣畫有影格編號的黑白條碼，並記錄送出時間；
+負載產生器解回編號後即可算出「攝影機送出 → 觀看者收到」的端到端延遲。
+
+    python -m bench.fakecam --port 8765 --fps 25 --size 640x480
+    python -m bench.fakecam --video sample.mp4
+"""
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+STAMP_BITS = 20
+CHECK_BITS = 4
+_CELLS = STAMP_BITS + CHECK_BITS
+BOUNDARY = b"fakecam"
+DEFAULT_FPS = 25.0
+DEFAULT_SIZE = (640, 480)
+
+
+def _checksum(value: int) -> int:
+    return bin(value).count("1") % (1 << CHECK_BITS)
+
+
+def draw_stamp(frame, value: int):
+    """
+    在 frame 上緣 1/8 高度畫出 value (STAMP_BITS 位元) 與檢查碼，每個位元一格黑或白。
+    """
+    value %= 1 << STAMP_BITS
+    bits = (value << CHECK_BITS) | _checksum(value)
+    h, w = frame.shape[:2]
+    band = max(1, h // 8)
+    for i in range(_CELLS):
+        x0 = i * w // _CELLS
+        x1 = (i + 1) * w // _CELLS
+        on = (bits >> (_CELLS - 1 - i)) & 1
+        frame[:band, x0:x1] = 255 if on else 0
+    return frame
+
+
+def read_stamp(frame) -> int | None:
+    """
+    從 (可能已縮放、轉灰階、JPEG 壓縮過的) 影格解回編號；檢查碼不符時回傳 None。
+    """
+    if frame is None:
+        return None
+    h, w = frame.shape[:2]
+    band = max(1, h // 8)
+    if w < _CELLS * 2:
+        return None
+    row = frame[band // 2]
+    if row.ndim == 2:
+        row = row.mean(axis=1)
+    bits = 0
+    for i in range(_CELLS):
+        x = (2 * i + 1) * w // (2 * _CELLS)
+        bits = (bits << 1) | int(row[x] >= 128)
+    value = bits >> CHECK_BITS
+    if bits & ((1 << CHECK_BITS) - 1) != _checksum(value):
+        return None
+    return value
+
+
+class _FrameSource:
+    """
+    依 fps 產生影格並 JPEG 編碼一次，所有連線共用同一張；stamps 保留最近的送出時間。
+    """
+
+    def __init__(self, fps: float, size: tuple[int, int], video: str | None = None, quality: int = 80):
+        self.interval = 1.0 / fps
+        self.width, self.height = size
+        self.quality = quality
+        self.video = cv2.VideoCapture(video) if video else None
+        if self.video is not None and not self.video.isOpened():
+            raise SystemExit(f"cannot open video: {video}")
+        self.seq = 0
+        self.jpeg = b""
+        self.stamps: dict[int, float] = {}
+        self._cond = threading.Condition()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fakecam", daemon=True)
+
+    def start(self):
+        self._render()
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _next_image(self):
+        if self.video is not None:
+            ok, frame = self.video.read()
+            if not ok:
+                self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ok, frame = self.video.read()
+            if ok:
+                return cv2.resize(frame, (self.width, self.height))
+        # 合成畫面：移動的漸層，避免被動態偵測視為靜止
+        x = np.arange(self.width, dtype=np.uint16)
+        row = ((x + self.seq * 8) % 256).astype(np.uint8)
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        frame[:] = row[None, :, None]
+        frame[..., 1] = (self.seq * 3) % 256
+        return frame
+
+    def _render(self):
+        frame = draw_stamp(self._next_image(), self.seq)
+        ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+        if not ok:
+            return
+        with self._cond:
+            self.jpeg = buf.tobytes()
+            self.stamps[self.seq % (1 << STAMP_BITS)] = time.monotonic()
+            self.stamps.pop((self.seq - 4096) % (1 << STAMP_BITS), None)
+            self._cond.notify_all()
+
+    def _run(self):
+        deadline = time.monotonic()
+        while not self._stopped.is_set():
+            deadline += self.interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                deadline = time.monotonic()
+            self.seq += 1
+            self._render()
+
+    def wait(self, after_seq: int, timeout: float = 1.0):
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq != after_seq or self._stopped.is_set(), timeout)
+            return self.seq, self.jpeg
+
+    def emitted_at(self, value: int) -> float | None:
+        with self._cond:
+            return self.stamps.get(value)
+
+
+class FakeCamera:
+    """
+    在背景執行緒啟動假攝影機；url 指向 MJPEG 串流 (/video)。
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        fps: float = DEFAULT_FPS,
+        size: tuple[int, int] = DEFAULT_SIZE,
+        video: str | None = None,
+    ):
+        self.frames = _FrameSource(fps, size, video)
+        frames = self.frames
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.0"
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/video":
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", f"multipart/x-mixed-replace; boundary={BOUNDARY.decode()}")
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                seq = -1
+                try:
+                    while not frames._stopped.is_set():
+                        seq, jpeg = frames.wait(seq)
+                        self.wfile.write(
+                            b"--" + BOUNDARY + b"\r\nContent-Type: image/jpeg\r\n"
+                            + b"Content-Length: %d\r\n\r\n" % len(jpeg) + jpeg + b"\r\n"
+                        )
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}/video"
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fakecam-http", daemon=True)
+
+    def start(self):
+        self.frames.start()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.frames.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def emitted_at(self, value: int) -> float | None:
+        return self.frames.emitted_at(value)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+def parse_size(value: str) -> tuple[int, int]:
+    w, _, h = value.lower().partition("x")
+    return int(w), int(h)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Synthetic MJPEG camera for stream benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS)
+    parser.add_argument("--size", type=parse_size, default=DEFAULT_SIZE, help="WIDTHxHEIGHT")
+    parser.add_argument("--video", help="loop this video file instead of synthetic frames")
+    args = parser.parse_args(argv)
+    camera = FakeCamera(args.host, args.port, args.fps, args.size, args.video).start()
+    print(f"fakecam serving {camera.url}", flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        camera.stop()
+
+
+if __name__ == "__main__":
+    main()
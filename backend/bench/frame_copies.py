@@ -0,0 +1,166 @@
+# bench/frame_copies.py
+"""
+MJPEG 送出路徑的複製量微基準：比較舊路徑 (每幀 tobytes()，再替每個連線串接標頭 + JPEG + 結尾)
+與共用片段 (encode_part 每幀每個 variant 只 join 一次，所有連線送出同一個 bytes) 的差異。
+
+每幀量測三件事，JPEG 編碼本身兩邊相同，不計入：
+- 新建立的 bytes 物件數與其總長度 (= 複製的位元組)；
+- tracemalloc 看到的配置量 (輸出保留到該幀結束，模擬仍在 socket 佇列中的片段)；
+- 不開 tracemalloc 時的耗時。
+片段經過 StreamingHttpResponse.make_bytes，與 Django 實際送出前的處理相同。
+
+    cd backend
+    python -m bench.frame_copies --size 1920x1080 --clients 1,8,32 --frames 200
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import UTC, datetime
+from pathlib import Path
+from statistics import mean
+
+import numpy as np
+from django.http import StreamingHttpResponse
+
+from camera.frames import PART_HEADER, PART_TRAILER, FrameVariant, encode_buffer
+
+from .fakecam import parse_size
+from .stream_load import _round
+
+PATHS = ("legacy", "shared")
+
+
+def _synthetic_frames(size: tuple[int, int], count: int) -> list:
+    # 平滑漸層加上雜訊，JPEG 大小接近實際攝影機畫面
+    width, height = size
+    rng = np.random.default_rng(0)
+    x = np.arange(width, dtype=np.uint16)
+    frames = []
+    for seq in range(count):
+        row = ((x + seq * 8) % 256).astype(np.uint8)
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[:] = row[None, :, None]
+        noise = rng.integers(0, 24, size=frame.shape, dtype=np.uint8)
+        frames.append(frame + noise)
+    return frames
+
+
+def _legacy(buf, clients: int, make_bytes, sink: list):
+    payload = buf.tobytes()
+    sink.append(payload)  # hub 快取持有的編碼結果
+    for _ in range(clients):
+        sink.append(make_bytes(PART_HEADER + payload + PART_TRAILER))
+
+
+def _shared(buf, clients: int, make_bytes, sink: list):
+    part = b"".join((PART_HEADER, buf, PART_TRAILER))
+    sink.append(part)
+    for _ in range(clients):
+        sink.append(make_bytes(part))
+
+
+def measure(path: str, buffers: list, clients: int, frames: int) -> dict:
+    deliver = _legacy if path == "legacy" else _shared
+    make_bytes = StreamingHttpResponse().make_bytes
+    objects, copied, allocated = [], [], []
+
+    tracemalloc.start()
+    try:
+        for index in range(frames):
+            sink = []
+            before = tracemalloc.get_traced_memory()[0]
+            deliver(buffers[index % len(buffers)], clients, make_bytes, sink)
+            allocated.append(tracemalloc.get_traced_memory()[0] - before)
+            distinct = {id(item): item for item in sink}
+            objects.append(len(distinct))
+            copied.append(sum(len(item) for item in distinct.values()))
+    finally:
+        tracemalloc.stop()
+
+    sink = []
+    started = time.perf_counter()
+    for index in range(frames):
+        deliver(buffers[index % len(buffers)], clients, make_bytes, sink)
+        sink.clear()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "path": path,
+        "clients": clients,
+        "objects_per_frame": _round(mean(objects), 1),
+        "copied_kb_per_frame": _round(mean(copied) / 1024, 1),
+        "traced_kb_per_frame": _round(mean(allocated) / 1024, 1),
+        "us_per_frame": _round(elapsed / frames * 1e6, 1),
+    }
+
+
+def run(args) -> dict:
+    variant = FrameVariant(quality=args.quality)
+    buffers = [encode_buffer(frame, variant) for frame in _synthetic_frames(args.size, 8)]
+    rows = [measure(path, buffers, clients, args.frames) for clients in args.clients for path in PATHS]
+    return {
+        "meta": {
+            "created_at": datetime.now(UTC).isoformat(),
+            "host": platform.node(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "size": f"{args.size[0]}x{args.size[1]}",
+            "quality": args.quality,
+            "jpeg_kb": _round(mean(len(buf) for buf in buffers) / 1024, 1),
+            "frames": args.frames,
+        },
+        "rows": rows,
+    }
+
+
+def print_report(result: dict):
+    meta = result["meta"]
+    print(f"{meta['size']} q{meta['quality']}, JPEG ≈ {meta['jpeg_kb']} KB, {meta['frames']} frames")
+    print(f"{'path':<8}{'clients':>8}{'objects':>9}{'copied KB':>11}{'traced KB':>11}{'us/frame':>10}")
+    for row in result["rows"]:
+        print(
+            f"{row['path']:<8}{row['clients']:>8}{row['objects_per_frame']:>9}{row['copied_kb_per_frame']:>11}"
+            f"{row['traced_kb_per_frame']:>11}{row['us_per_frame']:>10}"
+        )
+
+
+def parse_clients(value: str) -> list[int]:
+    try:
+        clients = [int(item) for item in value.split(",") if item.strip()]
+    except ValueError:
+        clients = []
+    if not clients or any(count < 1 for count in clients):
+        raise argparse.ArgumentTypeError("clients must be a comma separated list of positive integers")
+    return clients
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Measure bytes copied per MJPEG frame delivery.")
+    parser.add_argument("--size", type=parse_size, default=(1920, 1080), help="WIDTHxHEIGHT")
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--clients", type=parse_clients, default=[1, 8, 32])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--output", help="write results JSON here")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    import django
+
+    django.setup()
+    result = run(args)
+    print_report(result)
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+# bench/startup.py
+"""
+冷啟動量測：依 DJANGO_SERVER_ROLE 啟動後端，記錄從啟動到 /healthz/ 回應的時間，
+以及第一個請求 (api 角色為 GET /data/) 之後 server 與 worker 的 RSS 合計。
+每個角色重複 --repeat 次取中位數，結果可寫成 JSON 與之後比對。
+
+    cd backend
+    python -m bench.startup --roles all,api,stream --repeat 5
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+from statistics import median
+
+from .stream_load import BACKEND_DIR, SERVER_COMMANDS, ProcessMonitor, _round, start_server
+
+ROLES = ("all", "api", "stream")
+# 啟動後送出的第一個請求：讓 worker 進入與實際服務相同的狀態 (URLconf 已載入、連線已建立)
+WARMUP_PATHS = {"all": "/data/", "api": "/data/", "stream": "/healthz/"}
+
+
+def _get(base_url: str, path: str) -> int:
+    host, port = base_url.split("//", 1)[1].split(":")
+    conn = http.client.HTTPConnection(host, int(port), timeout=10)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    finally:
+        conn.close()
+
+
+def measure(args, role: str, db_path: str) -> dict:
+    started = time.monotonic()
+    process, base_url = start_server(
+        args.server, args.host, args.workers,
+        extra_env={"DJANGO_SERVER_ROLE": role, "DJANGO_DB_PATH": db_path},
+    )
+    try:
+        ready = time.monotonic() - started
+        status = _get(base_url, WARMUP_PATHS[role])
+        rss_mb = ProcessMonitor(process.pid).rss_mb()
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {"ready_s": ready, "rss_mb": rss_mb, "warmup_status": status}
+
+
+def run(args) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="startup-") as tmp:
+        db_path = str(Path(tmp) / "db.sqlite3")
+        subprocess.run(
+            [sys.executable, "manage.py", "migrate", "--noinput", "-v", "0"],
+            cwd=BACKEND_DIR, env={**os.environ, "DJANGO_DB_PATH": db_path}, check=True,
+        )
+        for role in args.roles:
+            trials = [measure(args, role, db_path) for _ in range(args.repeat)]
+            results[role] = {
+                "ready_s_median": _round(median(t["ready_s"] for t in trials), 3),
+                "ready_s_max": _round(max(t["ready_s"] for t in trials), 3),
+                "rss_mb_median": _round(median(t["rss_mb"] for t in trials), 1),
+                "warmup_path": WARMUP_PATHS[role],
+                "warmup_status": trials[-1]["warmup_status"],
+            }
+    return {
+        "meta": {
+            "created_at": datetime.now(UTC).isoformat(),
+            "host": platform.node(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "server": args.server,
+            "workers": args.workers,
+            "repeat": args.repeat,
+        },
+        "roles": results,
+    }
+
+
+def print_report(result: dict):
+    print(f"{'role':<8}{'ready s (p50)':>15}{'ready s (max)':>15}{'rss MB':>10}  warmup")
+    for role, row in result["roles"].items():
+        print(
+            f"{role:<8}{row['ready_s_median']:>15}{row['ready_s_max']:>15}{row['rss_mb_median']:>10}"
+            f"  {row['warmup_path']} -> {row['warmup_status']}"
+        )
+
+
+def parse_roles(value: str) -> list[str]:
+    roles = [item.strip() for item in value.split(",") if item.strip()]
+    if not roles or any(role not in ROLES for role in roles):
+        raise argparse.ArgumentTypeError(f"roles must be a comma separated subset of {', '.join(ROLES)}")
+    return roles
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Measure backend cold start time and RSS per server role.")
+    parser.add_argument("--roles", type=parse_roles, default=list(ROLES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--server", choices=sorted(SERVER_COMMANDS), default="gunicorn")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", help="write results JSON here")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    result = run(args)
+    print_report(result)
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,482 @@
+# bench/stream_load.py
+"""
+/stream/ 負載測試：啟動本機假攝影機與後端，讓 N 個觀看者以不同 gray / width 組合同時觀看，
+量測每位觀看者的實際 fps、首幀時間、端到端延遲，以及後端 process 的 CPU 與 RSS，
+結果寫成 JSON 供之後比對。
+
+    cd backend
+    python -m bench.stream_load --clients 8 --duration 20 --variants color,gray@320,color@640 \
+        --output bench-results.json
+    python -m bench.stream_load --compare bench-baseline.json --output bench-results.json
+
+預設以 gunicorn + UvicornWorker (與 Docker 映像相同) 啟動後端；
+--target 可改測已在執行的伺服器 (搭配 --server-pid 才會量 CPU / RSS)。
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+from urllib.parse import urlencode, urlparse
+
+import cv2
+import numpy as np
+
+from .fakecam import DEFAULT_FPS, DEFAULT_SIZE, FakeCamera, parse_size, read_stamp
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+PART_START = b"--frame\r\n"
+HEADER_END = b"\r\n\r\n"
+JPEG_END = b"\xff\xd9\r\n"
+SERVER_COMMANDS = {
+    "gunicorn": [
+        sys.executable, "-m", "gunicorn", "config.asgi:application",
+        "-k", "uvicorn_worker.UvicornWorker", "--bind", "{host}:{port}", "--workers", "{workers}",
+    ],
+    "uvicorn": [
+        sys.executable, "-m", "uvicorn", "config.asgi:application",
+        "--host", "{host}", "--port", "{port}", "--workers", "{workers}", "--no-access-log",
+    ],
+    "runserver": [
+        sys.executable, "manage.py", "runserver", "{host}:{port}", "--noreload",
+    ],
+}
+# summary 內各指標的方向：1 表示越大越好，-1 表示越小越好
+SUMMARY_DIRECTIONS = {
+    "fps_mean": 1,
+    "fps_min": 1,
+    "ttff_ms_p50": -1,
+    "ttff_ms_max": -1,
+    "latency_ms_p50": -1,
+    "latency_ms_p95": -1,
+    "latency_ms_p99": -1,
+    "server_cpu_percent": -1,
+    "server_rss_mb_peak": -1,
+}
+
+
+def percentile(values: list[float], pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _round(value, digits: int = 2):
+    return None if value is None else round(value, digits)
+
+
+def parse_variants(value: str) -> list[dict]:
+    """
+    "color,gray@320,color@640" → [{}, {"gray": "1", "width": "320"}, {"width": "640"}]
+    """
+    variants = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        mode, _, width = item.partition("@")
+        if mode not in ("color", "gray"):
+            raise argparse.ArgumentTypeError(f"unknown variant mode: {mode}")
+        params = {}
+        if mode == "gray":
+            params["gray"] = "1"
+        if width:
+            params["width"] = str(int(width))
+        variants.append(params)
+    if not variants:
+        raise argparse.ArgumentTypeError("at least one variant is required")
+    return variants
+
+
+def variant_label(params: dict) -> str:
+    label = "gray" if params.get("gray") else "color"
+    return f"{label}@{params['width']}" if params.get("width") else label
+
+
+class ClientResult:
+    def __init__(self, index: int, params: dict):
+        self.index = index
+        self.params = params
+        self.frames = 0
+        self.bytes = 0
+        self.ttff = None
+        self.first_at = None
+        self.last_at = None
+        self.latencies: list[float] = []
+        self.error = None
+
+    def to_dict(self) -> dict:
+        fps = None
+        if self.frames > 1 and self.last_at > self.first_at:
+            fps = (self.frames - 1) / (self.last_at - self.first_at)
+        latencies_ms = [value * 1000 for value in self.latencies]
+        return {
+            "index": self.index,
+            "variant": variant_label(self.params),
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "fps": _round(fps),
+            "ttff_ms": _round(self.ttff * 1000 if self.ttff is not None else None),
+            "latency_ms": {
+                "samples": len(latencies_ms),
+                "p50": _round(percentile(latencies_ms, 50)),
+                "p95": _round(percentile(latencies_ms, 95)),
+                "max": _round(max(latencies_ms) if latencies_ms else None),
+            },
+            "error": self.error,
+        }
+
+
+def _iter_parts(response):
+    """
+    逐張取出 multipart 裡的 JPEG；以 JPEG 結尾判斷完整，不必等下一個分隔線才算收到。
+    """
+    buf = b""
+    while True:
+        chunk = response.read1(65536)
+        if not chunk:
+            return
+        buf += chunk
+        while True:
+            start = buf.find(PART_START)
+            if start < 0:
+                break
+            body = buf.find(HEADER_END, start)
+            if body < 0:
+                break
+            end = buf.find(JPEG_END, body)
+            if end < 0:
+                break
+            yield buf[body + len(HEADER_END):end + 2]
+            buf = buf[end + len(JPEG_END):]
+
+
+def run_client(
+    result: ClientResult,
+    base_url: str,
+    camera_url: str,
+    deadline: float,
+    camera: FakeCamera | None,
+    latency_every: int,
+):
+    target = urlparse(base_url)
+    params = {**result.params, "url": camera_url, "client": f"bench-{result.index}"}
+    conn = http.client.HTTPConnection(target.hostname, target.port, timeout=10)
+    started = time.monotonic()
+    try:
+        conn.request("GET", f"{target.path.rstrip('/')}/stream/?{urlencode(params)}")
+        response = conn.getresponse()
+        if response.status != 200:
+            result.error = f"HTTP {response.status}"
+            return
+        for jpeg in _iter_parts(response):
+            now = time.monotonic()
+            if result.first_at is None:
+                result.first_at = now
+                result.ttff = now - started
+            result.last_at = now
+            result.frames += 1
+            result.bytes += len(jpeg)
+            if camera is not None and latency_every and result.frames % latency_every == 0:
+                frame = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_GRAYSCALE)
+                stamp = read_stamp(frame)
+                emitted = camera.emitted_at(stamp) if stamp is not None else None
+                if emitted is not None:
+                    result.latencies.append(now - emitted)
+            if now >= deadline:
+                break
+    except (OSError, http.client.HTTPException) as exc:
+        result.error = f"{type(exc).__name__}: {exc}"
+    finally:
+        conn.close()
+
+
+class ProcessMonitor:
+    """
+    定期讀取 /proc，累計 pid 及其子 process (gunicorn / uvicorn worker) 的 CPU 時間與 RSS。
+    """
+
+    def __init__(self, pid: int, interval: float = 0.5):
+        self.pid = pid
+        self.interval = interval
+        self.samples: list[tuple[float, float, float]] = []
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="bench-monitor", daemon=True)
+        self._ticks = os.sysconf("SC_CLK_TCK")
+
+    def _tree(self) -> list[int]:
+        pids, pending = [], [self.pid]
+        while pending:
+            pid = pending.pop()
+            pids.append(pid)
+            for task in Path(f"/proc/{pid}/task").glob("*/children"):
+                try:
+                    pending.extend(int(child) for child in task.read_text().split())
+                except OSError:
+                    continue
+        return pids
+
+    def _sample(self):
+        cpu = 0.0
+        rss_kb = 0.0
+        for pid in self._tree():
+            try:
+                stat = Path(f"/proc/{pid}/stat").read_text()
+                status = Path(f"/proc/{pid}/status").read_text()
+            except OSError:
+                continue
+            fields = stat.rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / self._ticks
+            for line in status.splitlines():
+                if line.startswith("VmRSS:"):
+                    rss_kb += int(line.split()[1])
+        self.samples.append((time.monotonic(), cpu, rss_kb / 1024))
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._sample()
+        self._thread.start()
+
+    def rss_mb(self) -> float:
+        self._sample()
+        return self.samples[-1][2]
+
+    def stop(self) -> dict:
+        self._stopped.set()
+        self._thread.join()
+        self._sample()
+        (t0, cpu0, _), (t1, cpu1, rss_end) = self.samples[0], self.samples[-1]
+        return {
+            "cpu_percent": _round((cpu1 - cpu0) / (t1 - t0) * 100 if t1 > t0 else None),
+            "rss_mb_peak": _round(max(sample[2] for sample in self.samples)),
+            "rss_mb_end": _round(rss_end),
+        }
+
+
+def _free_port(host: str) -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind: str, host: str, workers: int, camera_url: str = "", extra_env: dict | None = None):
+    port = _free_port(host)
+    command = [part.format(host=host, port=port, workers=workers) for part in SERVER_COMMANDS[kind]]
+    env = {
+        **os.environ,
+        "CAMERA_URL": camera_url,
+        "DJANGO_DEBUG": "false",
+        "DJANGO_ALLOWED_HOSTS": f"{host},localhost",
+        **(extra_env or {}),
+    }
+    process = subprocess.Popen(
+        command, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    base_url = f"http://{host}:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"server exited early:\n{process.stderr.read().decode(errors='replace')}")
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1)
+            conn.request("GET", "/healthz/")
+            if conn.getresponse().status == 200:
+                return process, base_url
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise SystemExit("server did not become healthy within 30s")
+
+
+def summarize(clients: list[dict], duration: float) -> dict:
+    fps = [c["fps"] for c in clients if c["fps"] is not None]
+    ttff = [c["ttff_ms"] for c in clients if c["ttff_ms"] is not None]
+    return {
+        "clients": len(clients),
+        "errors": sum(1 for c in clients if c["error"]),
+        "fps_mean": _round(sum(fps) / len(fps) if fps else None),
+        "fps_min": _round(min(fps) if fps else None),
+        "ttff_ms_p50": _round(percentile(ttff, 50)),
+        "ttff_ms_max": _round(max(ttff) if ttff else None),
+        "throughput_mbps": _round(sum(c["bytes"] for c in clients) * 8 / duration / 1e6, 3),
+    }
+
+
+def run(args) -> dict:
+    camera = None
+    camera_url = args.camera_url
+    if camera_url is None:
+        camera = FakeCamera(args.host, 0, args.camera_fps, args.camera_size, args.video).start()
+        camera_url = camera.url
+
+    process = None
+    monitor = None
+    try:
+        if args.target:
+            base_url = args.target
+            server_pid = args.server_pid
+        else:
+            process, base_url = start_server(args.server, args.host, args.workers, camera_url)
+            server_pid = process.pid
+        if server_pid:
+            monitor = ProcessMonitor(server_pid)
+            monitor.start()
+
+        results = [ClientResult(i, args.variants[i % len(args.variants)]) for i in range(args.clients)]
+        started = time.monotonic()
+        deadline = started + args.duration
+        threads = [
+            threading.Thread(
+                target=run_client,
+                args=(result, base_url, camera_url, deadline, camera, args.latency_every),
+                name=f"bench-client-{result.index}",
+                daemon=True,
+            )
+            for result in results
+        ]
+        for thread in threads:
+            thread.start()
+            if args.ramp:
+                time.sleep(args.ramp)
+        for thread in threads:
+            thread.join(args.duration + 15)
+        elapsed = time.monotonic() - started
+        server = monitor.stop() if monitor else None
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if camera is not None:
+            camera.stop()
+
+    clients = [result.to_dict() for result in results]
+    latencies = [value * 1000 for result in results for value in result.latencies]
+    summary = summarize(clients, elapsed)
+    summary.update(
+        latency_ms_p50=_round(percentile(latencies, 50)),
+        latency_ms_p95=_round(percentile(latencies, 95)),
+        latency_ms_p99=_round(percentile(latencies, 99)),
+        server_cpu_percent=server["cpu_percent"] if server else None,
+        server_rss_mb_peak=server["rss_mb_peak"] if server else None,
+    )
+    by_variant = {}
+    for client in clients:
+        by_variant.setdefault(client["variant"], []).append(client)
+    return {
+        "meta": {
+            "created_at": datetime.now(UTC).isoformat(),
+            "host": platform.node(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "cpu_count": os.cpu_count(),
+            "server": "external" if args.target else args.server,
+            "workers": None if args.target else args.workers,
+            "clients": args.clients,
+            "duration": args.duration,
+            "camera": {
+                "url": "synthetic" if camera else camera_url,
+                "fps": args.camera_fps if camera else None,
+                "size": list(args.camera_size) if camera else None,
+                "video": args.video,
+            },
+        },
+        "summary": summary,
+        "variants": {label: summarize(items, elapsed) for label, items in by_variant.items()},
+        "server": server,
+        "clients": clients,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> tuple[list[str], bool]:
+    """
+    逐項比對 summary；往不好的方向變動超過 tolerance (比例) 視為退步。
+    """
+    lines = [f"{'metric':<22}{'baseline':>12}{'current':>12}{'change':>10}"]
+    regressed = False
+    for key, direction in SUMMARY_DIRECTIONS.items():
+        old = baseline.get("summary", {}).get(key)
+        new = current["summary"].get(key)
+        if old in (None, 0) or new is None:
+            lines.append(f"{key:<22}{str(old):>12}{str(new):>12}{'-':>10}")
+            continue
+        change = (new - old) / abs(old)
+        flag = ""
+        if change * direction < -tolerance:
+            flag = "  REGRESSION"
+            regressed = True
+        lines.append(f"{key:<22}{old:>12}{new:>12}{change:>+10.1%}{flag}")
+    return lines, regressed
+
+
+def print_report(result: dict):
+    print(f"{'client':<8}{'variant':<14}{'frames':>8}{'fps':>8}{'ttff ms':>10}{'lat p50':>10}{'lat p95':>10}  error")
+    for client in result["clients"]:
+        latency = client["latency_ms"]
+        print(
+            f"{client['index']:<8}{client['variant']:<14}{client['frames']:>8}"
+            f"{str(client['fps']):>8}{str(client['ttff_ms']):>10}"
+            f"{str(latency['p50']):>10}{str(latency['p95']):>10}  {client['error'] or ''}"
+        )
+    print(json.dumps(result["summary"], indent=2))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Load test the /stream/ MJPEG endpoint.")
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per client")
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds between client starts")
+    parser.add_argument(
+        "--variants", type=parse_variants, default=parse_variants("color,gray@320"),
+        help="comma separated MODE[@WIDTH] assigned round-robin, MODE is color or gray",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--server", choices=sorted(SERVER_COMMANDS), default="gunicorn")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--target", help="benchmark an already running backend, e.g. http://127.0.0.1:8000")
+    parser.add_argument("--server-pid", type=int, help="pid to sample CPU / RSS when using --target")
+    parser.add_argument("--camera-url", help="use this camera instead of the built-in synthetic one (no latency)")
+    parser.add_argument("--camera-fps", type=float, default=DEFAULT_FPS)
+    parser.add_argument("--camera-size", type=parse_size, default=DEFAULT_SIZE, help="WIDTHxHEIGHT")
+    parser.add_argument("--video", help="loop this video file through the synthetic camera")
+    parser.add_argument(
+        "--latency-every", type=int, default=1,
+        help="decode every Nth frame on the client to read its stamp (0 disables latency)",
+    )
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative regression")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    result = run(args)
+    print_report(result)
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2) + "\n")
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        lines, regressed = compare(result, baseline, args.tolerance)
+        print("\n".join(lines))
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import io
+from urllib.request import urlopen
+
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from camera.frames import FrameVariant, encode_variant
+
+from .fakecam import FakeCamera, draw_stamp, read_stamp
+from .frame_copies import measure, parse_clients
+from .stream_load import _iter_parts, compare, parse_variants
+from .write_load import parse_profiles
+
+
+class StampTests(SimpleTestCase):
+    def test_stamp_survives_resize_gray_and_jpeg(self):
+        frame = draw_stamp(np.full((480, 640, 3), 90, dtype=np.uint8), 123456)
+        for variant in (FrameVariant(), FrameVariant(gray=True, width=320), FrameVariant(width=160, quality=30)):
+            jpeg = encode_variant(frame, variant)
+            decoded = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_GRAYSCALE)
+            self.assertEqual(read_stamp(decoded), 123456, variant)
+
+    def test_corrupted_stamp_is_rejected(self):
+        frame = draw_stamp(np.zeros((120, 240), dtype=np.uint8), 5)
+        frame[:15, :10] = 255 - frame[:15, :10]
+        self.assertIsNone(read_stamp(frame))
+
+
+class FakeCameraTests(SimpleTestCase):
+    def test_serves_stamped_mjpeg(self):
+        with FakeCamera(fps=50, size=(240, 160)) as camera:
+            with urlopen(camera.url, timeout=5) as resp:
+                self.assertIn("multipart/x-mixed-replace", resp.headers["Content-Type"])
+                data = resp.read(4096)
+        start = data.index(b"\r\n\r\n") + 4
+        end = data.index(b"\xff\xd9", start) + 2
+        frame = cv2.imdecode(np.frombuffer(data[start:end], np.uint8), cv2.IMREAD_GRAYSCALE)
+        stamp = read_stamp(frame)
+        self.assertIsNotNone(stamp)
+        self.assertIsNotNone(camera.emitted_at(stamp))
+
+
+class _Chunked(io.BytesIO):
+    def read1(self, size=-1):
+        return super().read1(7)
+
+
+class StreamLoadTests(SimpleTestCase):
+    def test_iter_parts_yields_complete_jpegs(self):
+        part = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n\xff\xd8abc\xff\xd9\r\n"
+        self.assertEqual(list(_iter_parts(_Chunked(part * 3))), [b"\xff\xd8abc\xff\xd9"] * 3)
+
+    def test_parse_variants(self):
+        self.assertEqual(parse_variants("color, gray@320"), [{}, {"gray": "1", "width": "320"}])
+
+    def test_compare_flags_regressions_beyond_tolerance(self):
+        baseline = {"summary": {"fps_mean": 25.0, "latency_ms_p95": 10.0}}
+        current = {"summary": {"fps_mean": 24.0, "latency_ms_p95": 15.0}}
+        lines, regressed = compare(current, baseline, tolerance=0.1)
+        self.assertTrue(regressed)
+        self.assertTrue(any("latency_ms_p95" in line and "REGRESSION" in line for line in lines))
+        self.assertFalse(any("fps_mean" in line and "REGRESSION" in line for line in lines))
+
+
+class WriteLoadTests(SimpleTestCase):
+    def test_parse_profiles(self):
+        self.assertEqual(parse_profiles("production, default"), ["production", "default"])
+        with self.assertRaises(Exception):
+            parse_profiles("wal")
+
+
+class FrameCopiesTests(SimpleTestCase):
+    def test_shared_part_is_copied_once_per_frame(self):
+        buffers = [np.frombuffer(b"\xff\xd8" + bytes(1000) + b"\xff\xd9", np.uint8)]
+        legacy = measure("legacy", buffers, clients=4, frames=3)
+        shared = measure("shared", buffers, clients=4, frames=3)
+        self.assertEqual(legacy["objects_per_frame"], 5)
+        self.assertEqual(shared["objects_per_frame"], 1)
+        self.assertLess(shared["copied_kb_per_frame"], legacy["copied_kb_per_frame"] / 4)
+
+    def test_parse_clients(self):
+        self.assertEqual(parse_clients("1, 8"), [1, 8])
+        with self.assertRaises(Exception):
+            parse_clients("0")
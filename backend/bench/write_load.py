@@ -0,0 +1,189 @@
+# bench/write_load.py
+"""
+/data/ 寫入負載測試：以多個 worker 啟動後端、N 個客戶端同時 POST (可選擇夾雜 PATCH)，
+量測每秒寫入數、延遲分位數與失敗次數 (例如 "database is locked" 造成的 500)。
+每個資料庫設定檔各用一個新的暫存 SQLite 檔，可一次比較多個設定檔。
+
+    cd backend
+    python -m bench.write_load --workers 4 --clients 32 --duration 10 --profiles default,production
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+from urllib.parse import urlparse
+
+from .stream_load import BACKEND_DIR, SERVER_COMMANDS, _round, percentile, start_server
+
+PROFILES = ("default", "production")
+
+
+class WriterResult:
+    def __init__(self, index: int):
+        self.index = index
+        self.ok = 0
+        self.failed = 0
+        self.statuses: dict[int, int] = {}
+        self.latencies: list[float] = []
+        self.error: str | None = None
+
+
+def run_writer(result: WriterResult, base_url: str, deadline: float, update_every: int):
+    url = urlparse(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port, timeout=30)
+    headers = {"Content-Type": "application/json"}
+    last_id = None
+    n = 0
+    try:
+        while time.monotonic() < deadline:
+            n += 1
+            if update_every and last_id and n % update_every == 0:
+                method, path = "PATCH", f"/data/{last_id}/"
+            else:
+                method, path = "POST", "/data/"
+            body = json.dumps({"text": f"client {result.index} write {n}"})
+            started = time.perf_counter()
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            payload = response.read()
+            result.latencies.append(time.perf_counter() - started)
+            result.statuses[response.status] = result.statuses.get(response.status, 0) + 1
+            if response.status < 300:
+                result.ok += 1
+                if method == "POST":
+                    last_id = json.loads(payload)["id"]
+            else:
+                result.failed += 1
+    except Exception as exc:
+        result.error = f"{type(exc).__name__}: {exc}"
+    finally:
+        conn.close()
+
+
+def _migrate(db_path: str, profile: str):
+    env = {**os.environ, "DJANGO_DB_PATH": db_path, "DJANGO_DB_PROFILE": profile, "DJANGO_DEBUG": "false"}
+    subprocess.run(
+        [sys.executable, "manage.py", "migrate", "--noinput", "-v", "0"], cwd=BACKEND_DIR, env=env, check=True
+    )
+
+
+def run_profile(args, profile: str) -> dict:
+    with tempfile.TemporaryDirectory(prefix="write-load-") as tmp:
+        db_path = str(Path(tmp) / "db.sqlite3")
+        _migrate(db_path, profile)
+        process, base_url = start_server(
+            args.server, args.host, args.workers,
+            extra_env={"DJANGO_DB_PATH": db_path, "DJANGO_DB_PROFILE": profile},
+        )
+        try:
+            results = [WriterResult(i) for i in range(args.clients)]
+            started = time.monotonic()
+            deadline = started + args.duration
+            threads = [
+                threading.Thread(
+                    target=run_writer, args=(result, base_url, deadline, args.update_every),
+                    name=f"bench-writer-{result.index}", daemon=True,
+                )
+                for result in results
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(args.duration + 35)
+            elapsed = time.monotonic() - started
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    latencies = [value * 1000 for result in results for value in result.latencies]
+    statuses: dict[str, int] = {}
+    for result in results:
+        for status, count in result.statuses.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    ok = sum(result.ok for result in results)
+    return {
+        "profile": profile,
+        "writes": ok,
+        "failed": sum(result.failed for result in results),
+        "client_errors": [result.error for result in results if result.error],
+        "writes_per_sec": _round(ok / elapsed, 1),
+        "latency_ms_p50": _round(percentile(latencies, 50)),
+        "latency_ms_p95": _round(percentile(latencies, 95)),
+        "latency_ms_p99": _round(percentile(latencies, 99)),
+        "statuses": statuses,
+    }
+
+
+def run(args) -> dict:
+    return {
+        "meta": {
+            "created_at": datetime.now(UTC).isoformat(),
+            "host": platform.node(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "server": args.server,
+            "workers": args.workers,
+            "clients": args.clients,
+            "duration": args.duration,
+            "update_every": args.update_every,
+        },
+        "profiles": [run_profile(args, profile) for profile in args.profiles],
+    }
+
+
+def print_report(result: dict):
+    print(f"{'profile':<12}{'writes/s':>10}{'ok':>8}{'failed':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}  statuses")
+    for row in result["profiles"]:
+        print(
+            f"{row['profile']:<12}{str(row['writes_per_sec']):>10}{row['writes']:>8}{row['failed']:>8}"
+            f"{str(row['latency_ms_p50']):>9}{str(row['latency_ms_p95']):>9}{str(row['latency_ms_p99']):>9}"
+            f"  {row['statuses']}"
+        )
+        for error in row["client_errors"][:3]:
+            print(f"    client error: {error}")
+
+
+def parse_profiles(value: str) -> list[str]:
+    profiles = [item.strip() for item in value.split(",") if item.strip()]
+    unknown = [item for item in profiles if item not in PROFILES]
+    if not profiles or unknown:
+        raise argparse.ArgumentTypeError(f"profiles must be a comma separated subset of {', '.join(PROFILES)}")
+    return profiles
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Load test concurrent writes to /data/.")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per profile")
+    parser.add_argument("--profiles", type=parse_profiles, default=list(PROFILES), help="DJANGO_DB_PROFILE values to compare")
+    parser.add_argument("--update-every", type=int, default=0, help="make every Nth request a PATCH of the client's last row")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--server", choices=sorted(SERVER_COMMANDS), default="gunicorn")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--output", help="write results JSON here")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    result = run(args)
+    print_report(result)
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
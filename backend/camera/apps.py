@@ -1,6 +1,31 @@
+import os
+import sys
+
 from django.apps import AppConfig
 
 
+def _running_management_command() -> bool:
+    # manage.py migrate / shell 等指令不服務串流，不必連上攝影機；runserver 仍預熱
+    program = sys.argv[0] if sys.argv else ""
+    if os.path.basename(program) not in ("manage.py", "django-admin") and not program.endswith(
+        os.path.join("django", "__main__.py")
+    ):
+        return False
+    return sys.argv[1:2] != ["runserver"]
+
+
 class CameraConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'camera'
+
+    def ready(self):
+        from django.conf import settings
+
+        if (
+            settings.SERVER_ROLE != "api"
+            and os.getenv("CAMERA_PREWARM", "false").lower() == "true"
+            and not _running_management_command()
+        ):
+            from .views import prewarm_default_source
+
+            prewarm_default_source()
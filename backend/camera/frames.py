@@ -0,0 +1,121 @@
+# camera/frames.py
+"""
+影格轉換與 JPEG 編碼；同一來源、同一組參數的輸出由 hub 快取後共用。
+轉換步驟由 camera.pipeline 執行，opencv() 也定義在該處 (第一次使用時才載入 cv2)。
+
+串流使用 encode_part：每幀每個 variant 只產生一個完整的 multipart 片段 (標頭 + JPEG + 結尾)，
+所有連線送出同一個 bytes 物件，不再各自 tobytes() 與串接。
+"""
+import time
+from typing import NamedTuple
+
+from config.metrics import observe_stage
+
+from .pipeline import compile_steps, opencv, run
+
+DEFAULT_JPEG_QUALITY = 80
+MOTION_THUMB_WIDTH = 64
+PART_HEADER = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+PART_TRAILER = b"\r\n"
+
+
+class FrameVariant(NamedTuple):
+    """
+    hub 的快取鍵。ops 為空時由 width / gray 組成管線；ops 不為空時即為完整管線 (已 optimize)，
+    gray / width 只供顯示。請以 from_steps 建立，等價的管線才會得到相同的鍵。
+    """
+
+    gray: bool = False
+    width: int | None = None
+    quality: int = DEFAULT_JPEG_QUALITY
+    ops: tuple = ()
+
+    @classmethod
+    def from_steps(cls, steps: tuple, quality: int = DEFAULT_JPEG_QUALITY) -> "FrameVariant":
+        names = [step[0] for step in steps]
+        widths = [step[1] for step in steps if step[0] == "resize"]
+        gray = "gray" in names
+        width = widths[-1] if widths else None
+        if steps == compile_steps(gray, width, ()):
+            # 只有 width / gray 的管線與 ?gray=&width= 共用同一個鍵
+            return cls(gray, width, quality)
+        return cls(gray, width, quality, steps)
+
+    @property
+    def steps(self) -> tuple:
+        return compile_steps(self.gray, self.width, self.ops)
+
+
+def encode_buffer(frame, variant: FrameVariant):
+    """
+    回傳 imencode 的輸出緩衝區 (uint8 ndarray)；失敗時回傳 None。
+    """
+    cv2 = opencv()
+    frame = run(variant.steps, frame)
+    started = time.perf_counter()
+    ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), variant.quality])
+    observe_stage("imencode", started)
+    return buf if ok else None
+
+
+def encode_variant(frame, variant: FrameVariant) -> bytes | None:
+    buf = encode_buffer(frame, variant)
+    return None if buf is None else buf.tobytes()
+
+
+def encode_part(frame, variant: FrameVariant) -> bytes | None:
+    """
+    編碼並直接組成 MJPEG 的一個 part；join 讀取 ndarray 的緩衝區，JPEG 只複製這一次。
+    """
+    buf = encode_buffer(frame, variant)
+    if buf is None:
+        return None
+    return b"".join((PART_HEADER, buf, PART_TRAILER))
+
+
+def part_jpeg(part: bytes) -> memoryview:
+    """
+    encode_part 輸出中的 JPEG 部分，不複製。
+    """
+    return memoryview(part)[len(PART_HEADER):-len(PART_TRAILER)]
+
+
+def motion_thumbnail(frame):
+    """
+    動態偵測用的小尺寸灰階圖；每幀由 CaptureSource.derived 只算一次。
+    """
+    cv2 = opencv()
+    started = time.perf_counter()
+    h = max(1, int(frame.shape[0] * (MOTION_THUMB_WIDTH / frame.shape[1])))
+    thumb = cv2.resize(frame, (MOTION_THUMB_WIDTH, h), interpolation=cv2.INTER_AREA)
+    if thumb.ndim == 3:
+        thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+    observe_stage("motion", started)
+    return thumb
+
+
+class MotionGate:
+    """
+    與上一張「已送出」影格的縮圖比較平均絕對差 (0–255)，
+    低於 threshold 視為靜止畫面而略過；至少每 keepalive 秒仍送出一幀。
+    """
+
+    def __init__(self, threshold: float, keepalive: float):
+        self.threshold = threshold
+        self.keepalive = keepalive
+        self._last_thumb = None
+        self._last_sent = 0.0
+
+    def admit(self, source, seq: int, frame) -> bool:
+        thumb = source.derived("motion", seq, frame, motion_thumbnail)
+        now = time.monotonic()
+        if (
+            self._last_thumb is not None
+            and self._last_thumb.shape == thumb.shape
+            and now - self._last_sent < self.keepalive
+            and float(opencv().absdiff(thumb, self._last_thumb).mean()) < self.threshold
+        ):
+            return False
+        self._last_thumb = thumb
+        self._last_sent = now
+        return True
@@ -0,0 +1,903 @@
+# camera/hub.py
+"""
+同一個攝影機來源在整個 process 內只開一個 VideoCapture：
+由背景執行緒讀取影格，再廣播給所有訂閱者；最後一位訂閱者離開時釋放來源。
+相同轉換參數 (variant) 的編碼結果每幀只產生一次，由該 variant 的訂閱者共用。
+ASGI 下的訂閱者以 asyncio future 等待新影格，不佔用執行緒。
+讀取與輸出互相獨立：來源永遠只保留最新一幀，慢的客戶端直接跳過過期影格，
+並以 delivered / dropped 計數記錄在各自的 Subscription 上。
+限速 (fps) 由單調時鐘排程：讀取執行緒對每個封包只 grab()，
+只有在某位訂閱者到期時才 retrieve() 解碼，中間的影格不會被解碼。
+最後一位訂閱者離開後，來源會在 idle_ttl 秒內保持連線（只 grab 不解碼），
+重新觀看時不必再付一次 RTSP 握手與等待關鍵幀的成本。
+可選的 gate（例如 frames.MotionGate）能在編碼前略過與上一幀幾乎相同的畫面。
+
+指定 EncodePool 時，不限速、無 gate 的訂閱者改走編碼管線：讀取執行緒把每個新影格交給
+執行緒池平行編碼，結果依影格序號重新排序後才發布，訂閱者逐幀依序取得而不是只拿最新一幀；
+每個 variant 同時在池中的影格數有上限，超過時直接略過該幀，積壓不會讓記憶體與延遲無限成長。
+"""
+import asyncio
+import itertools
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+from config.metrics import Counter, observe_stage
+
+_DEFAULT_PORTS = {"http": 80, "https": 443, "rtsp": 554}
+_SUBSCRIPTION_IDS = itertools.count(1)
+PIN_RETRY_MIN = 1.0  # 常駐來源讀取失敗後重新開啟的等待秒數，連續失敗時加倍
+PIN_RETRY_MAX = 30.0
+
+FRAMES_DECODED = Counter("camera_frames_decoded_total", "Frames decoded per source.", ("source",))
+FRAMES_DELIVERED = Counter(
+    "camera_frames_delivered_total", "Frames handed to viewers per source.", ("source",)
+)
+FRAMES_DROPPED = Counter(
+    "camera_frames_dropped_total",
+    "Frames viewers skipped because they fell behind or missed their fps slot.",
+    ("source",),
+)
+FRAMES_UNCHANGED = Counter(
+    "camera_frames_unchanged_total", "Frames suppressed by motion gating per source.", ("source",)
+)
+BYTES_SENT = Counter("camera_bytes_sent_total", "MJPEG bytes written per source.", ("source",))
+ENCODE_SKIPPED = Counter(
+    "camera_encode_skipped_total",
+    "Frames not sent to the encode pool because a variant had max in-flight frames.",
+    ("source",),
+)
+_SOURCE_METRICS = (FRAMES_DECODED, FRAMES_DELIVERED, FRAMES_DROPPED, FRAMES_UNCHANGED, BYTES_SENT, ENCODE_SKIPPED)
+# 每個 source label 目前有幾個 CaptureSource 在使用；歸零時移除指標子項，
+# ?url= 由客戶端決定，不移除的話 /metrics 會隨著出現過的 URL 無限成長
+_LABEL_REFS: dict[str, int] = {}
+_LABEL_REFS_LOCK = threading.Lock()
+
+
+def _acquire_label(label: str):
+    with _LABEL_REFS_LOCK:
+        _LABEL_REFS[label] = _LABEL_REFS.get(label, 0) + 1
+
+
+def _release_label(label: str):
+    with _LABEL_REFS_LOCK:
+        remaining = _LABEL_REFS.get(label, 0) - 1
+        if remaining > 0:
+            _LABEL_REFS[label] = remaining
+            return
+        _LABEL_REFS.pop(label, None)
+        for metric in _SOURCE_METRICS:
+            metric.remove(label)
+
+
+def normalize_source_url(url: str) -> str:
+    """
+    以 scheme/host 小寫、移除預設埠與 fragment 的形式作為來源鍵，
+    讓 `HTTP://Cam:80/video` 與 `http://cam/video` 共用同一個 capture。
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host
+    if port is not None and port != _DEFAULT_PORTS.get(scheme):
+        netloc = f"{host}:{port}"
+    if parts.username is not None:
+        userinfo = parts.username
+        if parts.password is not None:
+            userinfo = f"{userinfo}:{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+def source_label(url: str) -> str:
+    """
+    指標用的來源名稱：只留 host、port 與 path，不含帳密與 query。
+    """
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port is not None:
+        host = f"{host}:{port}"
+    return f"{host}{parts.path or '/'}"
+
+
+class EncodePool:
+    """
+    跨來源共用的編碼執行緒池；OpenCV 的 resize / imencode 會釋放 GIL，多核心可同時編碼多幀。
+    max_inflight 為每個 variant 同時在池中的影格上限，預設為 workers 的兩倍。
+    """
+
+    def __init__(self, workers: int, max_inflight: int = 0):
+        self.workers = workers
+        self.max_inflight = max(max_inflight or workers * 2, 1)
+        self._executor: ThreadPoolExecutor | None = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args) -> Future:
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    # fork 後執行緒不會被繼承，依 pid 重新建立
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="camera-encode")
+                    self._pid = pid
+        return self._executor.submit(fn, *args)
+
+
+class _VariantSlot:
+    __slots__ = ("refcount", "eager", "result", "lock", "inflight", "ready")
+
+    def __init__(self, backlog: int = 1):
+        self.refcount = 0
+        self.eager = 0  # 走編碼管線的訂閱者數
+        self.result = (0, None)  # (seq, payload)，整組替換以便無鎖讀取
+        self.lock = threading.Lock()
+        # 以下由 CaptureSource._cond 保護：依序號排列的編碼中工作，與已依序發布的結果
+        self.inflight: dict[int, Future] = {}
+        self.ready: deque[tuple[int, bytes]] = deque(maxlen=backlog)
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class CaptureSource:
+    """
+    單一來源的讀取執行緒；只保留最新一幀，訂閱者依序號判斷是否有新影格。
+    """
+
+    def __init__(
+        self,
+        key: str,
+        url: str,
+        opener,
+        renderer=None,
+        on_idle=None,
+        pool: EncodePool | None = None,
+        on_close=None,
+    ):
+        self.key = key
+        self.url = url
+        self.refcount = 0
+        self.pinned = False
+        self.idle_since = time.monotonic()
+        self.label = source_label(url)
+        _acquire_label(self.label)
+        self.frames_decoded = FRAMES_DECODED.labels(self.label)
+        self.frames_delivered = FRAMES_DELIVERED.labels(self.label)
+        self.frames_dropped = FRAMES_DROPPED.labels(self.label)
+        self.frames_unchanged = FRAMES_UNCHANGED.labels(self.label)
+        self.bytes_sent = BYTES_SENT.labels(self.label)
+        self.encode_skipped = ENCODE_SKIPPED.labels(self.label)
+        self._on_idle = on_idle
+        self._on_close = on_close
+        self._opener = opener
+        self._renderer = renderer
+        self._pool = pool
+        self._variants: dict[tuple, _VariantSlot] = {}
+        self._variants_lock = threading.Lock()
+        self._derived: dict[str, tuple[int, object]] = {}
+        self._derived_lock = threading.Lock()
+        # 只會整份替換，讀取不加鎖；_snapshots_lock 只保護替換與 per-variant 鎖的取得
+        self._snapshots: dict[tuple, tuple[int, bytes]] = {}
+        self._snapshot_locks: dict[tuple, threading.Lock] = {}
+        self._snapshots_lock = threading.Lock()
+        # 同一 process 內重開的來源序號會從 1 重新開始，ETag 以此區分不同的 capture
+        self.token = secrets.token_hex(4)
+        self._cond = threading.Condition()
+        self._async_waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._subscribers: set["Subscription"] = set()
+        self._frame = None
+        self._frame_ts = 0.0
+        self._seq = 0
+        self._closed = False
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"capture:{key}", daemon=True)
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def attach(self, subscription: "Subscription"):
+        with self._cond:
+            self._subscribers.add(subscription)
+
+    def detach(self, subscription: "Subscription"):
+        with self._cond:
+            self._subscribers.discard(subscription)
+
+    def _frame_wanted(self, now: float) -> bool:
+        with self._cond:
+            for subscription in self._subscribers:
+                if not subscription.interval:
+                    return True
+                # 已到期、且還沒有為這次排程解碼過影格 (訂閱者尚未取走前不重複解碼)
+                if subscription.next_due <= now and self._frame_ts < subscription.next_due:
+                    return True
+        return False
+
+    def _run(self):
+        cap = self._opener(self.url)
+        if cap is None:
+            self._close()
+            return
+        try:
+            while not self._stopping.is_set():
+                if self.refcount <= 0 and self._on_idle and self._on_idle(self):
+                    break
+                started = time.perf_counter()
+                if not cap.grab():
+                    break
+                started = observe_stage("read", started)
+                now = time.monotonic()
+                if not self._frame_wanted(now):
+                    continue
+                ok, frame = cap.retrieve()
+                if not ok or frame is None:
+                    break
+                observe_stage("decode", started)
+                self.frames_decoded.inc()
+                with self._cond:
+                    self._frame = frame
+                    self._frame_ts = now
+                    self._seq += 1
+                    seq = self._seq
+                    self._notify()
+                if self._pool is not None:
+                    self._dispatch(seq, frame)
+        finally:
+            cap.release()
+            self._close()
+
+    def _close(self):
+        with self._cond:
+            released, self._closed = not self._closed, True
+            self._notify()
+        if released:
+            _release_label(self.label)
+            if self._on_close is not None:
+                self._on_close(self)
+
+    @property
+    def stopped(self) -> bool:
+        """
+        是否由 stop() 結束 (而非來源斷線或無法開啟)。
+        """
+        return self._stopping.is_set()
+
+    def _notify(self):
+        # 呼叫端需持有 self._cond
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # event loop 已關閉
+
+    def _dispatch(self, seq: int, frame):
+        """
+        把新影格交給編碼池：每個有管線訂閱者的 variant 各一個工作；in-flight 已滿的 variant 略過此幀。
+        """
+        with self._variants_lock:
+            slots = [(variant, slot) for variant, slot in self._variants.items() if slot.eager]
+        for variant, slot in slots:
+            with self._cond:
+                if len(slot.inflight) >= self._pool.max_inflight:
+                    self.encode_skipped.inc()
+                    continue
+                future = slot.inflight[seq] = self._pool.submit(self._renderer, frame, variant)
+            future.add_done_callback(lambda _, slot=slot: self._publish(slot))
+
+    def _publish(self, slot: _VariantSlot):
+        """
+        由編碼執行緒呼叫：從最舊的工作開始，把已完成的結果依序號發布；
+        較新的幀先編完時會等前面的幀，訂閱者看到的序號永遠遞增。
+        """
+        with self._cond:
+            popped = False
+            while slot.inflight:
+                seq, future = next(iter(slot.inflight.items()))
+                if not future.done():
+                    break
+                del slot.inflight[seq]
+                popped = True
+                # 編碼失敗與 renderer 回傳 None 相同，略過此幀
+                payload = None if future.exception() is not None else future.result()
+                if payload is not None:
+                    slot.ready.append((seq, payload))
+            if popped:
+                self._notify()
+
+    def _wait_until(self, pick, settled, timeout: float | None):
+        with self._cond:
+            self._cond.wait_for(lambda: pick() is not None or settled(), timeout)
+            return pick()
+
+    async def _await_until(self, pick, settled, timeout: float | None):
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            with self._cond:
+                if (result := pick()) is not None or settled():
+                    return result
+                future = loop.create_future()
+                waiter = (loop, future)
+                self._async_waiters.append(waiter)
+            remaining = None if deadline is None else deadline - loop.time()
+            try:
+                await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                with self._cond:
+                    return pick()
+            finally:
+                with self._cond:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def wait_frame(self, after_seq: int, timeout: float | None = None, not_before: float = 0.0):
+        """
+        等待序號大於 after_seq、且解碼時間不早於 not_before 的影格，回傳 (seq, frame)；
+        逾時或來源已關閉時回傳 None。
+        """
+        return self._wait_until(lambda: self._snapshot(after_seq, not_before), lambda: self._closed, timeout)
+
+    async def wait_frame_async(
+        self, after_seq: int, timeout: float | None = None, not_before: float = 0.0
+    ):
+        """
+        wait_frame 的 asyncio 版本；由讀取執行緒透過 call_soon_threadsafe 喚醒。
+        """
+        return await self._await_until(
+            lambda: self._snapshot(after_seq, not_before), lambda: self._closed, timeout
+        )
+
+    def wait_encoded(self, variant: tuple, after_seq: int, timeout: float | None = None):
+        """
+        編碼管線用：等待序號大於 after_seq 的最舊已發布結果，回傳 (seq, payload)；
+        逾時、或來源已關閉且池中沒有剩餘工作時回傳 None。
+        """
+        return self._wait_until(
+            lambda: self._next_encoded(variant, after_seq), lambda: self._encode_settled(variant), timeout
+        )
+
+    async def wait_encoded_async(self, variant: tuple, after_seq: int, timeout: float | None = None):
+        return await self._await_until(
+            lambda: self._next_encoded(variant, after_seq), lambda: self._encode_settled(variant), timeout
+        )
+
+    def _next_encoded(self, variant: tuple, after_seq: int):
+        # 呼叫端需持有 self._cond
+        slot = self._variants.get(variant)
+        if slot is None:
+            return None
+        for entry in slot.ready:
+            if entry[0] > after_seq:
+                return entry
+        return None
+
+    def _encode_settled(self, variant: tuple) -> bool:
+        # 呼叫端需持有 self._cond
+        slot = self._variants.get(variant)
+        return self._closed and (slot is None or not slot.inflight)
+
+    def _ready(self, after_seq: int, not_before: float) -> bool:
+        return self._seq > after_seq and self._frame_ts >= not_before
+
+    def _snapshot(self, after_seq: int, not_before: float = 0.0):
+        if not self._ready(after_seq, not_before):
+            return None
+        return self._seq, self._frame
+
+    def acquire_variant(self, variant: tuple, eager: bool = False):
+        with self._variants_lock:
+            slot = self._variants.get(variant)
+            if slot is None:
+                backlog = self._pool.max_inflight if self._pool is not None else 1
+                slot = self._variants[variant] = _VariantSlot(backlog)
+            slot.refcount += 1
+            slot.eager += eager
+
+    def release_variant(self, variant: tuple, eager: bool = False):
+        with self._variants_lock:
+            slot = self._variants.get(variant)
+            if slot is None:
+                return
+            slot.refcount -= 1
+            slot.eager -= eager
+            if slot.refcount <= 0:
+                del self._variants[variant]
+
+    def variants(self) -> dict[tuple, int]:
+        with self._variants_lock:
+            return {variant: slot.refcount for variant, slot in self._variants.items()}
+
+    def encoded(self, variant: tuple, seq: int, frame):
+        """
+        回傳 (seq, payload)。同一幀同一 variant 只編碼一次；
+        若其他訂閱者已編出更新的影格，直接沿用較新的結果。
+        """
+        with self._variants_lock:
+            slot = self._variants.get(variant)
+        if slot is None:
+            return seq, self._renderer(frame, variant)
+        with slot.lock:
+            if slot.result[0] < seq:
+                slot.result = (seq, self._renderer(frame, variant))
+            return slot.result
+
+    def derived(self, name: str, seq: int, frame, compute):
+        """
+        每幀只計算一次的衍生資料（例如動態偵測用的縮圖），由所有訂閱者共用。
+        """
+        with self._derived_lock:
+            cached = self._derived.get(name)
+            if cached is not None and cached[0] == seq:
+                return cached[1]
+            value = compute(frame)
+            self._derived[name] = (seq, value)
+            return value
+
+    def latest(self):
+        """
+        回傳最新一幀的 (seq, frame, 解碼時間)；尚未解碼過任何影格時回傳 None。
+        """
+        with self._cond:
+            if self._frame is None:
+                return None
+            return self._seq, self._frame, self._frame_ts
+
+    def snapshot(self, variant: tuple, seq: int, frame, encode: bool = True):
+        """
+        靜態影像用：回傳 (seq, payload)。串流中相同 variant 已編好的結果直接沿用，
+        否則每個 variant 只保留最新一幀的編碼結果；encode=False 時只查快取，未命中回傳 None。
+        """
+        cached = self.cached(variant, seq)
+        if cached is not None:
+            return cached
+        # encode=False 由 event loop 直接呼叫，不能等待任何編碼中的鎖
+        hit = self._snapshots.get(variant)
+        if hit is not None and hit[0] >= seq:
+            return hit
+        if not encode:
+            return None
+        with self._snapshots_lock:
+            lock = self._snapshot_locks.setdefault(variant, threading.Lock())
+        # 同一 variant 同時只編碼一次，不同 variant 各自平行編碼
+        with lock:
+            hit = self._snapshots.get(variant)
+            if hit is not None and hit[0] >= seq:
+                return hit
+            payload = self._renderer(frame, variant)
+            if payload is None:
+                return None
+            with self._snapshots_lock:
+                snapshots = {key: value for key, value in self._snapshots.items() if value[0] >= seq}
+                current = snapshots.get(variant)
+                if current is None or current[0] < seq:
+                    snapshots[variant] = (seq, payload)
+                self._snapshots = snapshots
+                self._snapshot_locks = {key: value for key, value in self._snapshot_locks.items() if key in snapshots}
+        return seq, payload
+
+    def cached(self, variant: tuple, seq: int):
+        """
+        不加鎖、不編碼：若快取已有 >= seq 的結果則回傳 (seq, payload)，否則 None。
+        """
+        slot = self._variants.get(variant)
+        if slot is None:
+            return None
+        result = slot.result
+        if result[0] < seq:
+            return None
+        return result
+
+
+class Subscription:
+    """
+    訂閱者的讀取游標；frame 為共用的 ndarray，使用端不得就地修改。
+    dropped 為客戶端忙碌期間來源已覆寫、因而未送出的影格數；
+    限速訂閱者則計算錯過的排程次數。eager 的訂閱者走編碼管線，
+    dropped 為編碼池略過或落後超過 backlog 而未送出的影格數。
+    """
+
+    def __init__(
+        self,
+        hub: "CaptureHub",
+        source: CaptureSource,
+        variant: tuple | None = None,
+        label: str | None = None,
+        fps: float | None = None,
+        gate=None,
+        eager: bool = False,
+    ):
+        self.source = source
+        self.variant = variant
+        self.label = label
+        self.fps = fps
+        self.gate = gate
+        self.eager = eager
+        self.interval = 1.0 / fps if fps else 0.0
+        # 只接受訂閱之後才解碼的影格，避免拿到閒置期間殘留的舊畫面
+        self.next_due = time.monotonic()
+        self.started_at = time.time()
+        # 管線訂閱者從訂閱後的第一幀開始，不補播同 variant 其他訂閱者的積壓
+        self.last_seq = source.seq if eager else 0
+        self.id = next(_SUBSCRIPTION_IDS)
+        self.delivered = 0
+        self.dropped = 0
+        self.unchanged = 0
+        self.bytes_sent = 0
+        self._hub = hub
+        self._released = False
+
+    @property
+    def closed(self) -> bool:
+        source = self.source
+        if not source.closed:
+            return False
+        if self.eager:
+            with source._cond:
+                return source._encode_settled(self.variant) and source._next_encoded(self.variant, self.last_seq) is None
+        return source._snapshot(self.last_seq, self.next_due) is None
+
+    def _advance(self, seq: int, delivered: bool = True):
+        missed = 0
+        if self.interval:
+            now = time.monotonic()
+            if self.delivered or self.unchanged:
+                self.next_due += self.interval
+                if self.next_due <= now:
+                    missed = int((now - self.next_due) // self.interval) + 1
+                    self.next_due += missed * self.interval
+            else:
+                self.next_due = now + self.interval
+        elif self.last_seq:
+            missed = max(0, seq - self.last_seq - 1)
+        if missed:
+            self.dropped += missed
+            self.source.frames_dropped.inc(missed)
+        self.last_seq = seq
+        if delivered:
+            self.delivered += 1
+            self.source.frames_delivered.inc()
+        else:
+            self.unchanged += 1
+            self.source.frames_unchanged.inc()
+
+    def record_sent(self, nbytes: int):
+        self.bytes_sent += nbytes
+        self.source.bytes_sent.inc(nbytes)
+
+    def _pace(self, timeout: float | None):
+        """
+        回傳 (需等待秒數, 剩餘 timeout)；需等待秒數超過 timeout 時剩餘為負值。
+        """
+        delay = self.next_due - time.monotonic() if self.interval else 0.0
+        if delay <= 0:
+            return 0.0, timeout
+        if timeout is None:
+            return delay, None
+        return min(delay, timeout), timeout - delay
+
+    def _wait(self, timeout: float | None):
+        delay, timeout = self._pace(timeout)
+        if delay:
+            time.sleep(delay)
+        if timeout is not None and timeout < 0:
+            return None
+        return self.source.wait_frame(self.last_seq, timeout, self.next_due)
+
+    async def _await(self, timeout: float | None):
+        delay, timeout = self._pace(timeout)
+        if delay:
+            await asyncio.sleep(delay)
+        if timeout is not None and timeout < 0:
+            return None
+        return await self.source.wait_frame_async(self.last_seq, timeout, self.next_due)
+
+    def stats(self) -> dict:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "source": self.source.label,
+            "variant": self.variant,
+            "fps": self.fps,
+            "started_at": self.started_at,
+            "last_seq": self.last_seq,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "unchanged": self.unchanged,
+            "bytes_sent": self.bytes_sent,
+        }
+
+    def next_frame(self, timeout: float | None = None):
+        result = self._wait(timeout)
+        if result is None:
+            return None
+        seq, frame = result
+        self._advance(seq)
+        return frame
+
+    def poll_frame(self):
+        """
+        不等待：有新影格時回傳 (seq, frame) 並前進游標，否則回傳 None。
+        供依 fps 同時輪詢多個來源的呼叫端 (例如 mosaic) 使用：取走後下一次解碼排在半個間隔後，
+        下一次輪詢時已有新影格，來源每個間隔最多解碼一幀。
+        """
+        result = self.source.wait_frame(self.last_seq, 0, self.next_due)
+        if result is not None:
+            self._advance(result[0])
+            if self.interval:
+                self.next_due = time.monotonic() + self.interval / 2
+        return result
+
+    def next_payload(self, timeout: float | None = None):
+        """
+        取得下一幀的共用編碼結果；逾時、被 gate 略過或編碼失敗時回傳 None。
+        """
+        if self.eager:
+            result = self.source.wait_encoded(self.variant, self.last_seq, timeout)
+            if result is None:
+                return None
+            self._advance(result[0])
+            return result[1]
+        result = self._wait(timeout)
+        if result is None:
+            return None
+        seq, frame = result
+        if self.gate is not None and not self.gate.admit(self.source, seq, frame):
+            self._advance(seq, delivered=False)
+            return None
+        seq, payload = self.source.encoded(self.variant, seq, frame)
+        self._advance(seq)
+        return payload
+
+    async def anext_payload(self, timeout: float | None = None):
+        """
+        next_payload 的 asyncio 版本；只有需要實際編碼時才把工作丟到執行緒。
+        """
+        if self.eager:
+            result = await self.source.wait_encoded_async(self.variant, self.last_seq, timeout)
+            if result is None:
+                return None
+            self._advance(result[0])
+            return result[1]
+        result = await self._await(timeout)
+        if result is None:
+            return None
+        seq, frame = result
+        if self.gate is not None:
+            admitted = await asyncio.to_thread(self.gate.admit, self.source, seq, frame)
+            if not admitted:
+                self._advance(seq, delivered=False)
+                return None
+        cached = self.source.cached(self.variant, seq)
+        if cached is None:
+            cached = await asyncio.to_thread(self.source.encoded, self.variant, seq, frame)
+        seq, payload = cached
+        self._advance(seq)
+        return payload
+
+    def close(self):
+        if self._released:
+            return
+        self._released = True
+        if self.variant is not None:
+            self.source.release_variant(self.variant, self.eager)
+        self.source.detach(self)
+        self._hub._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CaptureHub:
+    """
+    以正規化 URL 為鍵管理 CaptureSource，並以參考計數決定何時釋放；
+    idle_ttl > 0 時沒有訂閱者的來源會保留該秒數供下一次訂閱沿用；
+    pool 為 None 時不使用編碼管線，所有訂閱者都在自己的執行緒上編碼最新一幀。
+    hub 記錄建立來源的 pid：fork 後 (例如 gunicorn --preload 的 master 已預熱) 捨棄繼承的來源，
+    常駐的來源在子 process 中重新開啟。warm() 的 URL 記在 hub 上：重建的來源同樣常駐，
+    讀取失敗結束時依 PIN_RETRY_MIN ~ PIN_RETRY_MAX 的退避重新開啟，不必等觀看者。
+    """
+
+    def __init__(self, opener, renderer=None, idle_ttl: float = 0.0, pool: EncodePool | None = None):
+        self._opener = opener
+        self._renderer = renderer
+        self.idle_ttl = idle_ttl
+        self.pool = pool
+        self._sources: dict[str, CaptureSource] = {}
+        self._subscriptions: set[Subscription] = set()
+        self._pinned: dict[str, str] = {}  # key → url
+        self._pin_retry: dict[str, float] = {}  # key → 下一次重新開啟前的等待秒數
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _check_pid(self):
+        # 呼叫端需持有 self._lock
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        # 讀取執行緒不會被 fork 繼承：沿用父 process 的來源時它沒有 closed，訂閱者卻永遠等不到影格
+        inherited, self._sources, self._subscriptions = self._sources, {}, set()
+        self._pid = pid
+        for source in inherited.values():
+            _release_label(source.label)
+        for key, url in self._pinned.items():
+            self._source_for(key, url)
+
+    def subscribe(
+        self,
+        url: str,
+        variant: tuple | None = None,
+        label: str | None = None,
+        fps: float | None = None,
+        gate=None,
+    ) -> Subscription:
+        key = normalize_source_url(url)
+        # 限速與 gate 的訂閱者多半只取少量影格，仍在需要時才編碼
+        eager = self.pool is not None and variant is not None and not fps and gate is None
+        with self._lock:
+            source = self._source_for(key, url)
+            source.refcount += 1
+            if variant is not None:
+                source.acquire_variant(variant, eager)
+            subscription = Subscription(self, source, variant, label, fps, gate, eager)
+            source.attach(subscription)
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def _release(self, subscription: Subscription):
+        source = subscription.source
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            source.refcount -= 1
+            if source.refcount > 0:
+                return
+            source.idle_since = time.monotonic()
+            if source.pinned or self.idle_ttl > 0:
+                return
+            if self._sources.get(source.key) is source:
+                del self._sources[source.key]
+        source.stop()
+
+    def _source_for(self, key: str, url: str) -> CaptureSource:
+        # 呼叫端需持有 self._lock
+        self._check_pid()
+        source = self._sources.get(key)
+        if source is None or source.closed:
+            source = CaptureSource(
+                key, url, self._opener, self._renderer, self._expire_idle, self.pool, self._source_closed
+            )
+            source.pinned = key in self._pinned
+            self._sources[key] = source
+            source.start()
+        return source
+
+    def _source_closed(self, source: CaptureSource):
+        """
+        由讀取執行緒在結束時呼叫；常駐來源因斷線或無法開啟而結束時，退避後重新開啟。
+        """
+        if not source.pinned or source.stopped:
+            return
+        with self._lock:
+            if source.key not in self._pinned or self._pid != os.getpid():
+                return
+            # 曾經取得影格代表連線原本正常，從最短的等待重新開始
+            delay = PIN_RETRY_MIN if source.seq else self._pin_retry.get(source.key, PIN_RETRY_MIN)
+            self._pin_retry[source.key] = min(delay * 2, PIN_RETRY_MAX)
+        timer = threading.Timer(delay, self._reopen_pinned, args=(source.key,))
+        timer.daemon = True
+        timer.start()
+
+    def _reopen_pinned(self, key: str):
+        with self._lock:
+            url = self._pinned.get(key)
+            if url is None or self._pid != os.getpid():
+                return
+            current = self._sources.get(key)
+            if current is None or current.closed:
+                self._source_for(key, url)
+
+    def _expire_idle(self, source: CaptureSource) -> bool:
+        """
+        由讀取執行緒在沒有訂閱者時呼叫；閒置超過 idle_ttl 就從 hub 移除並結束。
+        """
+        with self._lock:
+            if source.refcount > 0 or source.pinned:
+                return False
+            if time.monotonic() - source.idle_since < self.idle_ttl:
+                return False
+            if self._sources.get(source.key) is source:
+                del self._sources[source.key]
+        return True
+
+    def _fresh_snapshot(self, url: str, variant: tuple, max_age: float, encode: bool):
+        with self._lock:
+            self._check_pid()
+            source = self._sources.get(normalize_source_url(url))
+        if source is None or source.closed:
+            return None
+        latest = source.latest()
+        if latest is None or time.monotonic() - latest[2] > max_age:
+            return None
+        seq, frame, _ = latest
+        result = source.snapshot(variant, seq, frame, encode)
+        return None if result is None else (source.token, *result)
+
+    def cached_snapshot(self, url: str, variant: tuple, max_age: float):
+        """
+        不開來源、不編碼、不等待：已有不超過 max_age 秒的影格且該 variant 已編好時
+        回傳 (來源 token, seq, payload)，否則回傳 None。
+        """
+        return self._fresh_snapshot(url, variant, max_age, encode=False)
+
+    def snapshot(self, url: str, variant: tuple, max_age: float, timeout: float | None = None):
+        """
+        回傳來源最新一幀的 (來源 token, seq, payload)。已有夠新的影格時直接編碼 (或沿用快取)；
+        否則短暫訂閱一幀：來源已開啟時只多解碼一幀，沒有時才開一個 capture，
+        之後依 idle_ttl 釋放。逾時或來源無法開啟時回傳 None。
+        """
+        result = self._fresh_snapshot(url, variant, max_age, encode=True)
+        if result is not None:
+            return result
+        subscription = self.subscribe(url, label="snapshot")
+        try:
+            latest = subscription.source.wait_frame(0, timeout, subscription.next_due)
+        finally:
+            subscription.close()
+        if latest is None:
+            return None
+        source = subscription.source
+        result = source.snapshot(variant, *latest)
+        return None if result is None else (source.token, *result)
+
+    def warm(self, url: str) -> CaptureSource:
+        """
+        預先開啟來源並常駐（不受 idle_ttl 影響），供啟動時預熱預設攝影機。
+        """
+        key = normalize_source_url(url)
+        with self._lock:
+            self._pinned[key] = url
+            source = self._source_for(key, url)
+            source.pinned = True
+        return source
+
+    def sources(self) -> dict[str, int]:
+        with self._lock:
+            self._check_pid()
+            return {key: source.refcount for key, source in self._sources.items()}
+
+    def subscriptions(self) -> list[Subscription]:
+        with self._lock:
+            self._check_pid()
+            return list(self._subscriptions)
@@ -0,0 +1,135 @@
+# camera/mosaic.py
+"""
+多來源拼接 (mosaic)：把多個攝影機的最新影格排進同一張畫布，只編碼一次、以一條 MJPEG 輸出。
+
+- 每個來源以限速訂閱取得影格 (與 /stream/?fps= 相同)，來源只在到期時解碼；
+  同一來源的 capture 仍與其他觀看者共用。
+- 只有影格更新的格子才重新縮放 (每幀一次 cv2.resize，直接寫入畫布的對應區域)，
+  沒有任何格子更新時不編碼也不送出。
+- 格子等比例縮放置中 (letterbox)，其餘區域保持黑色；variant 的管線 (灰階、時間戳…) 在整張畫布上執行一次。
+"""
+import math
+import time
+
+import numpy as np
+
+from config.metrics import observe_stage
+
+from .frames import FrameVariant, encode_part, opencv
+
+TILE_ASPECT = 16 / 9
+
+
+def parse_layout(value: str | None, count: int) -> tuple[int, int] | None:
+    """
+    "3x2" → (3 欄, 2 列)；未指定時取最接近正方形的排列。
+    格子不夠放所有來源、或有整欄 / 整列空白 (例如 1x20000，畫布大小不受來源數限制) 時回傳 None。
+    """
+    if not value:
+        cols = math.ceil(math.sqrt(count))
+        return cols, math.ceil(count / cols)
+    try:
+        cols, rows = (int(part) for part in value.lower().split("x"))
+    except ValueError:
+        return None
+    if cols < 1 or rows < 1 or cols * rows < count:
+        return None
+    # 依列填入：第一列之外都要有來源，最後一列之前都是滿的
+    if cols > count or (rows - 1) * cols >= count:
+        return None
+    return cols, rows
+
+
+class _Tile:
+    __slots__ = ("subscription", "y", "x", "height", "width", "placed")
+
+    def __init__(self, subscription, y: int, x: int, height: int, width: int):
+        self.subscription = subscription
+        self.y = y
+        self.x = x
+        self.height = height
+        self.width = width
+        self.placed = None  # 上一次放入的影格尺寸，變更時先清空格子
+
+
+class Mosaic:
+    """
+    一條 mosaic 串流的狀態；compose() 由同一個迭代器依 fps 呼叫，不需加鎖。
+    """
+
+    def __init__(
+        self,
+        hub,
+        urls: list[str],
+        layout: tuple[int, int],
+        width: int,
+        fps: float,
+        variant: FrameVariant = FrameVariant(),
+        label: str | None = None,
+    ):
+        cols, rows = layout
+        tile_width = max(width // cols, 2)
+        tile_height = max(int(tile_width / TILE_ASPECT), 2)
+        self.interval = 1.0 / fps
+        self.variant = variant
+        self.canvas = np.zeros((rows * tile_height, cols * tile_width, 3), dtype=np.uint8)
+        self.next_due = time.monotonic()
+        self.tiles = []
+        try:
+            for index, url in enumerate(urls):
+                row, col = divmod(index, cols)
+                subscription = hub.subscribe(url, label=label, fps=fps)
+                self.tiles.append(_Tile(subscription, row * tile_height, col * tile_width, tile_height, tile_width))
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def closed(self) -> bool:
+        return all(tile.subscription.closed for tile in self.tiles)
+
+    def delay(self) -> float:
+        """
+        距離下一次 compose 的秒數；排程以單調時鐘累加，不會隨處理時間漂移。
+        """
+        return max(self.next_due - time.monotonic(), 0.0)
+
+    def _place(self, tile: _Tile, frame):
+        cv2 = opencv()
+        height, width = frame.shape[:2]
+        scale = min(tile.width / width, tile.height / height)
+        size = (max(int(width * scale), 1), max(int(height * scale), 1))
+        region = self.canvas[tile.y:tile.y + tile.height, tile.x:tile.x + tile.width]
+        if tile.placed != size:
+            region[:] = 0
+            tile.placed = size
+        top = (tile.height - size[1]) // 2
+        left = (tile.width - size[0]) // 2
+        resized = cv2.resize(frame, size)
+        if resized.ndim == 2:
+            resized = resized[:, :, None]  # 灰階來源廣播到三個通道
+        region[top:top + size[1], left:left + size[0]] = resized
+
+    def compose(self) -> bytes | None:
+        """
+        把有新影格的來源放進畫布並編碼成一個 multipart 片段；沒有任何更新時回傳 None。
+        """
+        self.next_due += self.interval
+        now = time.monotonic()
+        if self.next_due <= now:
+            self.next_due = now + self.interval
+        started = time.perf_counter()
+        changed = False
+        for tile in self.tiles:
+            result = tile.subscription.poll_frame()
+            if result is not None:
+                self._place(tile, result[1])
+                changed = True
+        if not changed:
+            return None
+        observe_stage("mosaic", started)
+        return encode_part(self.canvas, self.variant)
+
+    def close(self):
+        for tile in self.tiles:
+            tile.subscription.close()
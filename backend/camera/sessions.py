@@ -0,0 +1,220 @@
+# camera/sessions.py
+"""
+串流會話登錄：同一個 client ID 只保留一條串流，並支援 /stream/abort/ 中斷。
+
+- local：process 內的 dict + threading.Event（單一 worker / runserver）。
+- sqlite：同一台主機上的多個 worker 共用一個 SQLite 檔案；
+  每個 process 以背景執行緒輪詢自己擁有的會話，被其他 worker 中斷或取代時
+  在 poll_interval 內設定本地的 Event。
+
+以 CAMERA_SESSION_BACKEND 選擇 (local / sqlite / 自訂類別的 dotted path)。
+跨 process 的實作會做阻塞 I/O：register / abort 只在同步 view 中呼叫 (ASGI 下由 Django 在執行緒中執行)，
+async generator 結束時以 arelease 釋放，不在 event loop 上連線資料庫。
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import closing
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+class StreamToken(threading.Event):
+    """
+    串流的停止旗標；session_id 用來在共用儲存中辨識是哪一條串流。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.session_id = uuid.uuid4().hex
+
+
+class LocalSessionRegistry:
+    def __init__(self):
+        self.streams: dict[str, threading.Event] = {}
+        self.lock = threading.Lock()
+
+    def register(self, client_id: str | None):
+        if not client_id:
+            return None
+        token = StreamToken()
+        # 先寫入共用儲存再登錄本地，避免輪詢執行緒誤判尚未寫入的會話已被中斷
+        self._claim(client_id, token)
+        with self.lock:
+            previous = self.streams.get(client_id)
+            self.streams[client_id] = token
+        if previous:
+            previous.set()
+        return token
+
+    def release(self, client_id: str | None, token: threading.Event | None):
+        if not client_id or token is None:
+            return
+        with self.lock:
+            current = self.streams.get(client_id)
+            if current is token:
+                self.streams.pop(client_id, None)
+        self._disown(client_id, token)
+        token.set()
+
+    async def arelease(self, client_id: str | None, token: threading.Event | None):
+        if not client_id or token is None:
+            return
+        await asyncio.to_thread(self.release, client_id, token)
+
+    def abort(self, client_id: str | None) -> bool:
+        if not client_id:
+            return False
+        with self.lock:
+            token = self.streams.get(client_id)
+        revoked = self._revoke(client_id)
+        if token:
+            token.set()
+            return True
+        return revoked
+
+    # 以下由跨 process 的實作覆寫
+    def _claim(self, client_id: str, token: StreamToken):
+        pass
+
+    def _disown(self, client_id: str, token: threading.Event):
+        pass
+
+    def _revoke(self, client_id: str) -> bool:
+        return False
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class SQLiteSessionRegistry(LocalSessionRegistry):
+    """
+    以 SQLite 表 stream_sessions(client_id, session_id, pid) 作為同主機 worker 間的共用狀態。
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.25):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self._schema_ready = False
+        self._poller_pid = None
+        self._poller_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        if not self._schema_ready:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS stream_sessions ("
+                " client_id TEXT PRIMARY KEY,"
+                " session_id TEXT NOT NULL,"
+                " pid INTEGER NOT NULL,"
+                " started_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS stream_sessions_pid ON stream_sessions (pid)")
+            self._schema_ready = True
+        return conn
+
+    def _claim(self, client_id: str, token: StreamToken):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO stream_sessions (client_id, session_id, pid, started_at)"
+                " VALUES (?, ?, ?, ?)",
+                (client_id, token.session_id, os.getpid(), time.time()),
+            )
+        self._ensure_poller()
+
+    def _disown(self, client_id: str, token: threading.Event):
+        session_id = getattr(token, "session_id", None)
+        if not session_id:
+            return
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "DELETE FROM stream_sessions WHERE client_id = ? AND session_id = ?",
+                (client_id, session_id),
+            )
+
+    def _revoke(self, client_id: str) -> bool:
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT pid FROM stream_sessions WHERE client_id = ?", (client_id,)
+            ).fetchone()
+            if row is None:
+                return False
+            conn.execute("DELETE FROM stream_sessions WHERE client_id = ?", (client_id,))
+        # worker 已不存在時只清掉殘留紀錄，不算成功中斷
+        return _pid_alive(row[0])
+
+    def _ensure_poller(self):
+        pid = os.getpid()
+        if self._poller_pid == pid:
+            return
+        with self._poller_lock:
+            if self._poller_pid == pid:
+                return
+            # fork 後背景執行緒不會被繼承，依 pid 重新啟動
+            self._poller_pid = pid
+            thread = threading.Thread(target=self._poll_loop, name="stream-sessions", daemon=True)
+            thread.start()
+
+    def _poll_loop(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.poll_once()
+            except sqlite3.Error:
+                continue
+
+    def poll_once(self):
+        """
+        將本 process 擁有、但已被刪除或被其他 worker 取代的會話標記為中斷。
+        """
+        with self.lock:
+            owned = {
+                token.session_id: (client_id, token)
+                for client_id, token in self.streams.items()
+                if isinstance(token, StreamToken)
+            }
+        if not owned:
+            return
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT session_id FROM stream_sessions WHERE pid = ?", (os.getpid(),)
+            ).fetchall()
+        alive = {row[0] for row in rows}
+        for session_id, (client_id, token) in owned.items():
+            if session_id in alive:
+                continue
+            with self.lock:
+                if self.streams.get(client_id) is token:
+                    self.streams.pop(client_id, None)
+            token.set()
+
+
+def build_session_registry():
+    backend = os.getenv("CAMERA_SESSION_BACKEND", "local").strip() or "local"
+    if backend == "local":
+        return LocalSessionRegistry()
+    if backend == "sqlite":
+        path = os.getenv("CAMERA_SESSION_DB") or os.path.join(
+            tempfile.gettempdir(), "camera-stream-sessions.sqlite3"
+        )
+        poll_interval = float(os.getenv("CAMERA_SESSION_POLL", "0.25"))
+        return SQLiteSessionRegistry(path, poll_interval=poll_interval)
+    try:
+        registry_class = import_string(backend)
+    except ImportError as exc:
+        raise ImproperlyConfigured(f"Unknown CAMERA_SESSION_BACKEND: {backend}") from exc
+    return registry_class()
@@ -1,17 +1,42 @@
+import asyncio
 import os
+import sys
+import tempfile
 import threading
-from django.test import RequestFactory, TestCase
+import time
+from django.core.exceptions import ImproperlyConfigured
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase
 from unittest.mock import patch
 
+from config.metrics import STAGE_SECONDS
+
+import cv2
+import numpy as np
+
+from .apps import _running_management_command
+from .frames import PART_HEADER, PART_TRAILER, FrameVariant, MotionGate, encode_part, encode_variant
+from .hub import FRAMES_DECODED, CaptureHub, CaptureSource, EncodePool, normalize_source_url
+from .mosaic import TILE_ASPECT, Mosaic, parse_layout
+from .pipeline import PipelineError, _load_presets, optimize, parse_ops, run
+from .sessions import LocalSessionRegistry, SQLiteSessionRegistry, build_session_registry
 from .views import (
+    _HUB,
     _ACTIVE_STREAMS,
     _ACTIVE_STREAMS_LOCK,
+    _parse_fps,
+    _parse_motion,
+    _parse_variant,
     _register_stream_session,
     _release_stream_session,
     camera_stream,
 )
 
 
+async def _empty_aiter():
+    return
+    yield
+
+
 class StreamProofViewTests(TestCase):
     def setUp(self):
         with _ACTIVE_STREAMS_LOCK:
@@ -57,6 +82,37 @@ class CameraStreamViewTests(TestCase):
         self.assertIsNone(iter_kwargs["client_id"])
         self.assertIsNone(iter_kwargs["stop_token"])
 
+    def test_asgi_request_uses_async_iterator(self):
+        request = AsyncRequestFactory().get("/stream/")
+        with patch.dict(os.environ, {"CAMERA_URL": "http://example.com"}, clear=True):
+            with patch("camera.views._aiter_stream") as aiter_mock, patch(
+                "camera.views._iter_stream"
+            ) as iter_mock, patch("camera.views._register_stream_session", return_value=None):
+                aiter_mock.return_value = _empty_aiter()
+                response = camera_stream(request)
+        self.assertTrue(response.is_async)
+        iter_mock.assert_not_called()
+        self.assertIs(aiter_mock.call_args.kwargs["request"], request)
+
+    def test_fps_query_overrides_env_default(self):
+        request = self.factory.get("/stream/", {"fps": "2"})
+        with patch.dict(os.environ, {"CAMERA_URL": "http://example.com"}, clear=True):
+            with patch("camera.views._iter_stream") as iter_mock, patch(
+                "camera.views._register_stream_session", return_value=None
+            ), patch("camera.views.FRAME_INTERVAL", 0.05):
+                iter_mock.return_value = iter(())
+                camera_stream(request)
+        self.assertEqual(iter_mock.call_args.kwargs["fps"], 2.0)
+
+    def test_parse_fps(self):
+        with patch("camera.views.FRAME_INTERVAL", 0.0):
+            self.assertIsNone(_parse_fps(None))
+            self.assertIsNone(_parse_fps("abc"))
+            self.assertIsNone(_parse_fps("0"))
+            self.assertEqual(_parse_fps("1000"), 60.0)
+        with patch("camera.views.FRAME_INTERVAL", 0.1):
+            self.assertEqual(_parse_fps(None), 10.0)
+
 
 class StreamSessionHelpersTests(TestCase):
     def setUp(self):
@@ -97,3 +153,879 @@ class StreamSessionHelpersTests(TestCase):
         resp = self.client.post("/stream/abort/?client=ghost")
         self.assertEqual(resp.status_code, 200)
         self.assertFalse(resp.json()["aborted"])
+
+
+class FakeCapture:
+    def __init__(self, frames=None, delay=0.005, static=False):
+        self.frames = frames
+        self.delay = delay
+        self.static = static
+        self.reads = 0
+        self.decodes = 0
+        self.released = threading.Event()
+
+    def grab(self):
+        time.sleep(self.delay)
+        if self.frames is not None and self.reads >= self.frames:
+            return False
+        self.reads += 1
+        return True
+
+    def retrieve(self):
+        self.decodes += 1
+        value = 0 if self.static else self.reads % 256
+        frame = np.full((48, 64, 3), value, dtype=np.uint8)
+        return True, frame
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def release(self):
+        self.released.set()
+
+
+class CaptureHubTests(SimpleTestCase):
+    def setUp(self):
+        self.opened = []
+
+    def _opener(self, frames=None):
+        def opener(url):
+            cap = FakeCapture(frames=frames)
+            self.opened.append((url, cap))
+            return cap
+
+        return opener
+
+    def test_normalize_source_url(self):
+        self.assertEqual(
+            normalize_source_url("HTTP://Cam.Local:80/video#x"),
+            "http://cam.local/video",
+        )
+        self.assertEqual(normalize_source_url("rtsp://cam:8554/live"), "rtsp://cam:8554/live")
+
+    def test_subscribers_share_single_capture(self):
+        hub = CaptureHub(self._opener())
+        first = hub.subscribe("http://cam/video")
+        second = hub.subscribe("HTTP://CAM:80/video")
+        try:
+            self.assertIsNotNone(first.next_frame(timeout=1))
+            self.assertIsNotNone(second.next_frame(timeout=1))
+            self.assertEqual(len(self.opened), 1)
+            self.assertEqual(hub.sources(), {"http://cam/video": 2})
+        finally:
+            first.close()
+        self.assertFalse(self.opened[0][1].released.wait(0.05))
+        second.close()
+        self.assertTrue(self.opened[0][1].released.wait(1))
+        self.assertEqual(hub.sources(), {})
+
+    def test_close_is_idempotent(self):
+        hub = CaptureHub(self._opener())
+        first = hub.subscribe("http://cam/video")
+        second = hub.subscribe("http://cam/video")
+        first.close()
+        first.close()
+        self.assertEqual(hub.sources(), {"http://cam/video": 1})
+        second.close()
+
+    def test_subscription_reports_closed_when_source_ends(self):
+        hub = CaptureHub(self._opener(frames=2))
+        with hub.subscribe("http://cam/video") as sub:
+            frames = []
+            while not sub.closed:
+                frame = sub.next_frame(timeout=1)
+                if frame is not None:
+                    frames.append(frame)
+            self.assertLessEqual(len(frames), 2)
+
+    def test_unopenable_source_closes_subscription(self):
+        hub = CaptureHub(lambda url: None)
+        with hub.subscribe("http://cam/video") as sub:
+            self.assertIsNone(sub.next_frame(timeout=1))
+            self.assertTrue(sub.closed)
+
+    def test_closed_sources_drop_their_metric_labels(self):
+        def labels():
+            return {values[0] for values in FRAMES_DECODED._children}
+
+        hub = CaptureHub(self._opener())
+        live = hub.subscribe("http://cam/live")
+        try:
+            for index in range(5):
+                with hub.subscribe(f"http://cam/gone{index}") as sub:
+                    sub.next_frame(timeout=1)
+            with CaptureHub(lambda url: None).subscribe("http://cam/missing") as sub:
+                self.assertIsNone(sub.next_frame(timeout=1))
+            deadline = time.monotonic() + 2
+            while time.monotonic() < deadline and any(label.startswith("cam/gone") for label in labels()):
+                time.sleep(0.01)
+            self.assertIn("cam/live", labels())
+            self.assertFalse({label for label in labels() if label.startswith(("cam/gone", "cam/missing"))})
+        finally:
+            live.close()
+        self.assertTrue(self.opened[0][1].released.wait(1))
+        deadline = time.monotonic() + 1
+        while time.monotonic() < deadline and "cam/live" in labels():
+            time.sleep(0.01)
+        self.assertNotIn("cam/live", labels())
+
+
+class FrameVariantCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.renders = []
+        self.capture = FakeCapture(delay=0.2)
+
+    def _renderer(self, frame, variant):
+        self.renders.append(variant)
+        return encode_variant(frame, variant)
+
+    def test_same_variant_encoded_once_per_frame(self):
+        hub = CaptureHub(lambda url: self.capture, self._renderer)
+        variant = FrameVariant(gray=True, width=32)
+        first = hub.subscribe("http://cam/video", variant)
+        second = hub.subscribe("http://cam/video", variant)
+        try:
+            payload = first.next_payload(timeout=1)
+            self.assertTrue(payload.startswith(b"\xff\xd8"))
+            shared = second.next_payload(timeout=1)
+            self.assertEqual(first.last_seq, second.last_seq)
+            self.assertIs(payload, shared)
+            self.assertEqual(self.renders, [variant])
+        finally:
+            first.close()
+            second.close()
+
+    def test_clients_share_one_multipart_part(self):
+        hub = CaptureHub(lambda url: self.capture, encode_part)
+        first = hub.subscribe("http://cam/video", FrameVariant(width=32))
+        second = hub.subscribe("http://cam/video", FrameVariant(width=32))
+        try:
+            part = first.next_payload(timeout=1)
+            self.assertIs(second.next_payload(timeout=1), part)
+        finally:
+            first.close()
+            second.close()
+        self.assertTrue(part.startswith(PART_HEADER + b"\xff\xd8"))
+        self.assertTrue(part.endswith(b"\xff\xd9" + PART_TRAILER))
+
+    def test_distinct_variants_are_evicted_when_unwatched(self):
+        hub = CaptureHub(lambda url: self.capture, self._renderer)
+        gray = hub.subscribe("http://cam/video", FrameVariant(gray=True))
+        color = hub.subscribe("http://cam/video", FrameVariant(quality=50))
+        source = gray.source
+        self.assertEqual(
+            source.variants(),
+            {FrameVariant(gray=True): 1, FrameVariant(quality=50): 1},
+        )
+        gray.close()
+        self.assertEqual(source.variants(), {FrameVariant(quality=50): 1})
+        color.close()
+        self.assertEqual(source.variants(), {})
+
+
+class AsyncSubscriptionTests(SimpleTestCase):
+    async def test_anext_payload_waits_without_thread(self):
+        capture = FakeCapture(delay=0.01)
+        hub = CaptureHub(lambda url: capture, encode_variant)
+        sub = hub.subscribe("http://cam/video", FrameVariant(width=32))
+        try:
+            payload = await sub.anext_payload(timeout=1)
+            self.assertTrue(payload.startswith(b"\xff\xd8"))
+            self.assertGreater(sub.last_seq, 0)
+        finally:
+            sub.close()
+
+    async def test_anext_payload_returns_none_when_source_closed(self):
+        hub = CaptureHub(lambda url: None, encode_variant)
+        with hub.subscribe("http://cam/video", FrameVariant()) as sub:
+            self.assertIsNone(await sub.anext_payload(timeout=1))
+            self.assertTrue(sub.closed)
+
+
+class FrameDropAccountingTests(SimpleTestCase):
+    def test_slow_subscriber_skips_to_latest_frame(self):
+        capture = FakeCapture(delay=0.01)
+        hub = CaptureHub(lambda url: capture, encode_variant)
+        with hub.subscribe("http://cam/video", FrameVariant(width=16), label="slow") as sub:
+            self.assertIsNotNone(sub.next_payload(timeout=1))
+            time.sleep(0.1)
+            self.assertIsNotNone(sub.next_payload(timeout=1))
+            stats = sub.stats()
+        self.assertEqual(stats["label"], "slow")
+        self.assertEqual(stats["delivered"], 2)
+        self.assertGreater(stats["dropped"], 0)
+        self.assertGreater(capture.reads, stats["delivered"] + 1)
+
+    def test_sessions_view_reports_counters(self):
+        capture = FakeCapture(delay=0.01)
+        with patch.object(_HUB, "_opener", lambda url: capture), patch.object(_HUB, "idle_ttl", 0):
+            sub = _HUB.subscribe("http://cam.local/video", FrameVariant(gray=True), label="abc")
+            try:
+                sub.next_payload(timeout=1)
+                resp = self.client.get("/stream/sessions/", {"client": "abc"})
+            finally:
+                sub.close()
+        self.assertEqual(resp.status_code, 200)
+        sessions = resp.json()["sessions"]
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(sessions[0]["client_id"], "abc")
+        self.assertEqual(sessions[0]["camera_host"], "cam.local")
+        self.assertTrue(sessions[0]["gray"])
+        self.assertEqual(sessions[0]["frames_delivered"], 1)
+        self.assertIn("frames_dropped", sessions[0])
+
+
+class FramePacingTests(SimpleTestCase):
+    def test_throttled_subscriber_only_decodes_due_frames(self):
+        capture = FakeCapture(delay=0.005)
+        hub = CaptureHub(lambda url: capture, encode_variant)
+        with hub.subscribe("http://cam/video", FrameVariant(width=16), fps=10) as sub:
+            deadline = time.monotonic() + 0.5
+            while time.monotonic() < deadline:
+                sub.next_payload(timeout=0.1)
+            delivered = sub.delivered
+        self.assertGreaterEqual(delivered, 4)
+        self.assertLessEqual(delivered, 6)
+        self.assertLessEqual(capture.decodes, delivered + 1)
+        self.assertGreater(capture.reads, capture.decodes * 3)
+
+    def test_unthrottled_subscriber_forces_decode_of_every_frame(self):
+        capture = FakeCapture(delay=0.005)
+        hub = CaptureHub(lambda url: capture, encode_variant)
+        slow = hub.subscribe("http://cam/video", FrameVariant(), fps=5)
+        fast = hub.subscribe("http://cam/video", FrameVariant())
+        try:
+            for _ in range(5):
+                fast.next_frame(timeout=1)
+            self.assertGreaterEqual(capture.decodes, 5)
+            self.assertIsNotNone(slow.next_frame(timeout=1))
+            self.assertEqual(slow.dropped, 0)
+        finally:
+            slow.close()
+            fast.close()
+
+    async def test_async_subscriber_respects_fps(self):
+        capture = FakeCapture(delay=0.005)
+        hub = CaptureHub(lambda url: capture, encode_variant)
+        sub = hub.subscribe("http://cam/video", FrameVariant(width=16), fps=20)
+        try:
+            start = time.monotonic()
+            for _ in range(3):
+                while await sub.anext_payload(timeout=0.5) is None:
+                    pass
+            elapsed = time.monotonic() - start
+        finally:
+            sub.close()
+        self.assertGreaterEqual(elapsed, 0.09)
+        self.assertLessEqual(capture.decodes, 4)
+
+
+class SQLiteSessionRegistryTests(SimpleTestCase):
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        path = os.path.join(tmpdir.name, "sessions.sqlite3")
+        # 兩個 registry 共用同一檔案，模擬兩個 gunicorn worker
+        self.worker_a = SQLiteSessionRegistry(path, poll_interval=0.02)
+        self.worker_b = SQLiteSessionRegistry(path, poll_interval=0.02)
+
+    def test_abort_from_other_worker_stops_stream(self):
+        token = self.worker_a.register("abc")
+        self.assertTrue(self.worker_b.abort("abc"))
+        self.assertTrue(token.wait(1))
+        self.assertNotIn("abc", self.worker_a.streams)
+
+    def test_register_on_other_worker_replaces_session(self):
+        first = self.worker_a.register("abc")
+        second = self.worker_b.register("abc")
+        self.worker_a.poll_once()
+        self.worker_b.poll_once()
+        self.assertTrue(first.is_set())
+        self.assertFalse(second.is_set())
+
+    def test_release_clears_shared_row(self):
+        token = self.worker_a.register("abc")
+        self.worker_a.release("abc", token)
+        self.assertFalse(self.worker_b.abort("abc"))
+
+    def test_abort_unknown_client(self):
+        self.assertFalse(self.worker_b.abort("ghost"))
+
+    async def test_async_release_runs_off_the_event_loop(self):
+        token = await asyncio.to_thread(self.worker_a.register, "abc")
+        threads = []
+        disown = self.worker_a._disown
+
+        def record(client_id, token):
+            threads.append(threading.get_ident())
+            disown(client_id, token)
+
+        with patch.object(self.worker_a, "_disown", record):
+            await self.worker_a.arelease("abc", token)
+        self.assertNotEqual(threads, [threading.get_ident()])
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(token.is_set())
+        self.assertFalse(await asyncio.to_thread(self.worker_b.abort, "abc"))
+
+
+class SessionRegistryConfigTests(SimpleTestCase):
+    def test_default_backend_is_local(self):
+        with patch.dict(os.environ, {}, clear=True):
+            self.assertIsInstance(build_session_registry(), LocalSessionRegistry)
+
+    def test_sqlite_backend_uses_configured_path(self):
+        env = {"CAMERA_SESSION_BACKEND": "sqlite", "CAMERA_SESSION_DB": "/tmp/x.sqlite3"}
+        with patch.dict(os.environ, env, clear=True):
+            registry = build_session_registry()
+        self.assertIsInstance(registry, SQLiteSessionRegistry)
+        self.assertEqual(registry.path, "/tmp/x.sqlite3")
+
+    def test_unknown_backend_raises(self):
+        with patch.dict(os.environ, {"CAMERA_SESSION_BACKEND": "nope"}, clear=True):
+            with self.assertRaises(ImproperlyConfigured):
+                build_session_registry()
+
+
+class IdleLingerTests(SimpleTestCase):
+    def setUp(self):
+        self.opened = []
+
+    def _opener(self, url):
+        cap = FakeCapture(delay=0.005)
+        self.opened.append(cap)
+        return cap
+
+    def test_released_source_is_reused_within_ttl(self):
+        hub = CaptureHub(self._opener, encode_variant, idle_ttl=0.3)
+        with hub.subscribe("http://cam/video") as sub:
+            sub.next_frame(timeout=1)
+            first_seq = sub.last_seq
+        self.assertFalse(self.opened[0].released.wait(0.05))
+        self.assertEqual(hub.sources(), {"http://cam/video": 0})
+
+        with hub.subscribe("http://cam/video") as sub:
+            self.assertIsNotNone(sub.next_frame(timeout=1))
+            self.assertGreater(sub.last_seq, first_seq)
+        self.assertEqual(len(self.opened), 1)
+
+        self.assertTrue(self.opened[0].released.wait(2))
+        self.assertEqual(hub.sources(), {})
+
+    def test_idle_source_does_not_decode(self):
+        hub = CaptureHub(self._opener, encode_variant, idle_ttl=1)
+        with hub.subscribe("http://cam/video") as sub:
+            sub.next_frame(timeout=1)
+        cap = self.opened[0]
+        decodes, reads = cap.decodes, cap.reads
+        time.sleep(0.1)
+        self.assertLessEqual(cap.decodes, decodes + 1)
+        self.assertGreater(cap.reads, reads)
+
+    def test_warm_source_stays_open(self):
+        hub = CaptureHub(self._opener, encode_variant, idle_ttl=0.05)
+        source = hub.warm("http://cam/video")
+        self.assertTrue(source.pinned)
+        with hub.subscribe("http://cam/video") as sub:
+            self.assertIs(sub.source, source)
+            self.assertIsNotNone(sub.next_frame(timeout=1))
+        self.assertFalse(self.opened[0].released.wait(0.2))
+        self.assertEqual(len(self.opened), 1)
+        source.stop()
+
+    def test_dropped_warm_source_reopens_pinned(self):
+        captures = [FakeCapture(frames=2), FakeCapture(delay=0.005)]
+
+        def opener(url):
+            cap = captures[len(self.opened)]
+            self.opened.append(cap)
+            return cap
+
+        hub = CaptureHub(opener, encode_variant, idle_ttl=0.05)
+        with patch("camera.hub.PIN_RETRY_MIN", 0.01):
+            dropped = hub.warm("http://cam/video")
+            self.addCleanup(dropped.stop)
+            self.assertTrue(captures[0].released.wait(1))
+            deadline = time.monotonic() + 2
+            while len(self.opened) < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+        source = hub._sources["http://cam/video"]
+        self.addCleanup(source.stop)
+        self.assertIsNot(source, dropped)
+        self.assertTrue(source.pinned)
+        # 重新開啟的來源同樣常駐，不受 idle_ttl 影響
+        self.assertFalse(captures[1].released.wait(0.2))
+        self.assertEqual(hub.sources(), {"http://cam/video": 0})
+
+    def test_forked_process_reopens_warm_source(self):
+        hub = CaptureHub(self._opener, encode_variant, idle_ttl=0)
+        inherited = hub.warm("http://cam/video")
+        self.addCleanup(inherited.stop)
+        # 模擬 fork：pid 改變後，父 process 的來源在子 process 中沒有讀取執行緒
+        with patch("camera.hub.os.getpid", return_value=os.getpid() + 1):
+            with hub.subscribe("http://cam/video") as sub:
+                self.addCleanup(sub.source.stop)
+                self.assertIsNot(sub.source, inherited)
+                self.assertTrue(sub.source.pinned)
+                self.assertIsNotNone(sub.next_frame(timeout=1))
+            self.assertEqual(hub.sources(), {"http://cam/video": 0})
+        self.assertEqual(len(self.opened), 2)
+
+    def test_management_commands_skip_prewarm(self):
+        for argv, expected in (
+            (["manage.py", "migrate"], True),
+            (["/venv/bin/django-admin", "shell"], True),
+            (["manage.py", "runserver"], False),
+            (["/venv/bin/gunicorn", "config.wsgi"], False),
+        ):
+            with patch.object(sys, "argv", argv):
+                self.assertEqual(_running_management_command(), expected, argv)
+
+
+class MotionGateTests(SimpleTestCase):
+    def _collect(self, sub, attempts):
+        payloads = []
+        for _ in range(attempts):
+            payload = sub.next_payload(timeout=1)
+            if payload is not None:
+                payloads.append(payload)
+        return payloads
+
+    def test_static_scene_is_not_encoded(self):
+        capture = FakeCapture(delay=0.005, static=True)
+        renders = []
+
+        def renderer(frame, variant):
+            renders.append(variant)
+            return encode_variant(frame, variant)
+
+        hub = CaptureHub(lambda url: capture, renderer)
+        gate = MotionGate(threshold=5, keepalive=60)
+        with hub.subscribe("http://cam/video", FrameVariant(), gate=gate) as sub:
+            payloads = self._collect(sub, 6)
+            self.assertEqual(len(payloads), 1)
+            self.assertEqual(sub.unchanged, 5)
+            self.assertEqual(sub.stats()["unchanged"], 5)
+        self.assertEqual(len(renders), 1)
+
+    def test_changes_above_threshold_are_sent(self):
+        capture = FakeCapture(delay=0.005)
+        hub = CaptureHub(lambda url: capture, encode_variant)
+        gate = MotionGate(threshold=0.5, keepalive=60)
+        with hub.subscribe("http://cam/video", FrameVariant(), gate=gate) as sub:
+            self.assertEqual(len(self._collect(sub, 4)), 4)
+
+    def test_keepalive_sends_static_frame(self):
+        capture = FakeCapture(delay=0.005, static=True)
+        hub = CaptureHub(lambda url: capture, encode_variant)
+        gate = MotionGate(threshold=5, keepalive=0.05)
+        with hub.subscribe("http://cam/video", FrameVariant(), gate=gate) as sub:
+            self.assertIsNotNone(sub.next_payload(timeout=1))
+            time.sleep(0.06)
+            self.assertIsNotNone(sub.next_payload(timeout=1))
+
+    def test_parse_motion(self):
+        self.assertIsNone(_parse_motion(None))
+        self.assertIsNone(_parse_motion("x"))
+        self.assertIsNone(_parse_motion("0"))
+        self.assertEqual(_parse_motion("2.5"), 2.5)
+
+
+class EncodePipelineTests(SimpleTestCase):
+    def _collect(self, sub, count, timeout=2):
+        payloads = []
+        deadline = time.monotonic() + timeout
+        while len(payloads) < count and time.monotonic() < deadline:
+            payload = sub.next_payload(timeout=0.5)
+            if payload is not None:
+                payloads.append(payload)
+        return payloads
+
+    def test_results_are_delivered_in_capture_order(self):
+        capture = FakeCapture(delay=0.01)
+        calls = []
+
+        def renderer(frame, variant):
+            calls.append(int(frame[0, 0, 0]))
+            if len(calls) == 1:
+                time.sleep(0.05)  # 第一幀最慢，後面的幀會先編完
+            return bytes([frame[0, 0, 0]])
+
+        hub = CaptureHub(lambda url: capture, renderer, pool=EncodePool(4, max_inflight=16))
+        with hub.subscribe("http://cam/video", FrameVariant()) as sub:
+            self.assertTrue(sub.eager)
+            payloads = self._collect(sub, 5)
+            self.assertEqual(sub.dropped, 0)
+        values = [payload[0] for payload in payloads]
+        self.assertEqual(values[0], calls[0])
+        self.assertEqual(values, list(range(values[0], values[0] + 5)))
+
+    def test_inflight_frames_are_bounded(self):
+        capture = FakeCapture(delay=0.005)
+        release = threading.Event()
+        calls = []
+
+        def renderer(frame, variant):
+            calls.append(int(frame[0, 0, 0]))
+            release.wait(2)
+            return b"jpeg"
+
+        hub = CaptureHub(lambda url: capture, renderer, pool=EncodePool(2, max_inflight=2))
+        with hub.subscribe("http://cam/video", FrameVariant()) as sub:
+            self.assertIsNone(sub.next_payload(timeout=0.1))
+            self.assertEqual(len(calls), 2)
+            self.assertGreater(sub.source.encode_skipped.value, 0)
+            release.set()
+            self.assertEqual(self._collect(sub, 3), [b"jpeg"] * 3)
+            self.assertGreater(sub.dropped, 0)
+
+    def test_throttled_and_gated_subscribers_encode_on_demand(self):
+        capture = FakeCapture(delay=0.01)
+        hub = CaptureHub(lambda url: capture, encode_variant, pool=EncodePool(2))
+        throttled = hub.subscribe("http://cam/video", FrameVariant(), fps=5)
+        gated = hub.subscribe("http://cam/video", FrameVariant(), gate=MotionGate(1, 5))
+        try:
+            self.assertFalse(throttled.eager)
+            self.assertFalse(gated.eager)
+            self.assertIsNotNone(throttled.next_payload(timeout=1))
+            self.assertEqual(throttled.source._variants[FrameVariant()].inflight, {})
+        finally:
+            throttled.close()
+            gated.close()
+
+    def test_subscription_closes_after_pipeline_drains(self):
+        capture = FakeCapture(frames=3, delay=0.01)
+        hub = CaptureHub(lambda url: capture, encode_variant, pool=EncodePool(2))
+        with hub.subscribe("http://cam/video", FrameVariant(width=16)) as sub:
+            payloads = []
+            while not sub.closed:
+                payload = sub.next_payload(timeout=1)
+                if payload is not None:
+                    payloads.append(payload)
+        self.assertTrue(1 <= len(payloads) <= 3)
+
+    async def test_async_subscriber_reads_pipeline_without_thread(self):
+        capture = FakeCapture(delay=0.01)
+        hub = CaptureHub(lambda url: capture, encode_variant, pool=EncodePool(2))
+        sub = hub.subscribe("http://cam/video", FrameVariant(width=32))
+        try:
+            with patch("camera.hub.asyncio.to_thread", side_effect=AssertionError("no thread")):
+                first = await sub.anext_payload(timeout=1)
+                second = await sub.anext_payload(timeout=1)
+            self.assertTrue(first.startswith(b"\xff\xd8"))
+            self.assertTrue(second.startswith(b"\xff\xd8"))
+            self.assertGreater(sub.last_seq, 1)
+        finally:
+            sub.close()
+
+
+class SnapshotLockingTests(SimpleTestCase):
+    def test_encode_does_not_block_cache_lookups_or_other_variants(self):
+        started, release = threading.Event(), threading.Event()
+        slow, fast = FrameVariant(width=32), FrameVariant(gray=True)
+
+        def renderer(frame, variant):
+            if variant == slow:
+                started.set()
+                release.wait(2)
+            return encode_part(frame, variant)
+
+        source = CaptureSource("http://cam/video", "http://cam/video", lambda url: None, renderer)
+        self.addCleanup(source._close)
+        frame = np.zeros((48, 64, 3), dtype=np.uint8)
+        worker = threading.Thread(target=source.snapshot, args=(slow, 1, frame))
+        worker.start()
+        self.addCleanup(worker.join)
+        self.addCleanup(release.set)
+        self.assertTrue(started.wait(1))
+
+        began = time.monotonic()
+        self.assertIsNone(source.snapshot(slow, 1, frame, encode=False))
+        self.assertEqual(source.snapshot(fast, 1, frame)[0], 1)
+        self.assertEqual(source.snapshot(fast, 1, frame, encode=False)[0], 1)
+        self.assertLess(time.monotonic() - began, 0.5)
+
+        release.set()
+        worker.join(1)
+        self.assertEqual(source.snapshot(slow, 1, frame, encode=False)[0], 1)
+        self.assertEqual(set(source._snapshots), {slow, fast})
+
+
+class SnapshotViewTests(SimpleTestCase):
+    def setUp(self):
+        self.opened = []
+
+    def _opener(self, delay=0.005):
+        def opener(url):
+            cap = FakeCapture(delay=delay)
+            self.opened.append(cap)
+            return cap
+
+        return opener
+
+    def _patched(self, opener, idle_ttl=0):
+        return patch.multiple(_HUB, _opener=opener, idle_ttl=idle_ttl, _sources={}, _subscriptions=set())
+
+    def test_opens_short_lived_capture_without_running_source(self):
+        with self._patched(self._opener()):
+            resp = self.client.get("/stream/snapshot/", {"url": "http://cam.local/video", "width": "32", "gray": "1"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "image/jpeg")
+        self.assertTrue(resp.content.startswith(b"\xff\xd8") and resp.content.endswith(b"\xff\xd9"))
+        image = cv2.imdecode(np.frombuffer(resp.content, np.uint8), cv2.IMREAD_UNCHANGED)
+        self.assertEqual(image.shape, (24, 32))
+        self.assertTrue(resp["ETag"].startswith('"'))
+        self.assertEqual(len(self.opened), 1)
+        self.assertTrue(self.opened[0].released.wait(1))
+
+    def test_running_source_is_reused_and_revalidated(self):
+        with self._patched(self._opener(delay=0.5)):
+            sub = _HUB.subscribe("http://cam.local/video", FrameVariant())
+            try:
+                self.assertIsNotNone(sub.next_frame(timeout=2))
+                first = self.client.get("/stream/snapshot/", {"url": "http://cam.local/video"})
+                again = self.client.get(
+                    "/stream/snapshot/", {"url": "http://cam.local/video"}, headers={"If-None-Match": first["ETag"]}
+                )
+                other = self.client.get(
+                    "/stream/snapshot/", {"url": "http://cam.local/video", "gray": "1"},
+                    headers={"If-None-Match": first["ETag"]},
+                )
+            finally:
+                sub.close()
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again["ETag"], first["ETag"])
+        self.assertEqual(other.status_code, 200)
+        self.assertNotEqual(other["ETag"], first["ETag"])
+
+    def test_cached_snapshot_does_not_encode_twice(self):
+        renders = []
+
+        def renderer(frame, variant):
+            renders.append(variant)
+            return encode_part(frame, variant)
+
+        hub = CaptureHub(self._opener(delay=0.5), renderer)
+        with hub.subscribe("http://cam/video") as sub:
+            self.assertIsNotNone(sub.next_frame(timeout=2))
+            variant = FrameVariant(width=32)
+            self.assertIsNone(hub.cached_snapshot("http://cam/video", variant, max_age=5))
+            token, seq, part = hub.snapshot("http://cam/video", variant, max_age=5)
+            self.assertEqual(hub.cached_snapshot("http://cam/video", variant, max_age=5), (token, seq, part))
+        self.assertEqual(renders, [variant])
+
+    def test_unavailable_source_returns_503(self):
+        with self._patched(lambda url: None):
+            resp = self.client.get("/stream/snapshot/", {"url": "http://cam.local/video"})
+        self.assertEqual(resp.status_code, 503)
+
+    def test_requires_camera_url(self):
+        with patch.dict(os.environ, {}, clear=True):
+            resp = self.client.get("/stream/snapshot/")
+        self.assertEqual(resp.status_code, 400)
+
+
+class SolidCapture(FakeCapture):
+    def __init__(self, value, shape=(48, 64, 3), delay=0.005):
+        super().__init__(delay=delay)
+        self.value = value
+        self.shape = shape
+
+    def retrieve(self):
+        self.decodes += 1
+        return True, np.full(self.shape, self.value, dtype=np.uint8)
+
+
+class MosaicTests(SimpleTestCase):
+    def setUp(self):
+        self.captures = {}
+
+    def _opener(self, url):
+        value = int(url.rsplit("/", 1)[1])
+        capture = self.captures[url] = SolidCapture(value)
+        return capture
+
+    def _compose(self, mosaic, timeout=2):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(mosaic.delay())
+            part = mosaic.compose()
+            if part is not None and all(tile.placed for tile in mosaic.tiles):
+                return part
+        self.fail("mosaic produced no complete frame")
+
+    def test_parse_layout(self):
+        self.assertEqual(parse_layout(None, 3), (2, 2))
+        self.assertEqual(parse_layout(None, 1), (1, 1))
+        self.assertEqual(parse_layout("3X1", 3), (3, 1))
+        self.assertIsNone(parse_layout("1x1", 2))
+        self.assertIsNone(parse_layout("3", 1))
+        self.assertIsNone(parse_layout("0x4", 1))
+        self.assertIsNone(parse_layout("1x20000", 1))
+        self.assertIsNone(parse_layout("4x1", 2))
+        self.assertIsNone(parse_layout("2x3", 4))
+        self.assertEqual(parse_layout("2x3", 5), (2, 3))
+
+    def test_tiles_are_letterboxed_into_one_canvas(self):
+        hub = CaptureHub(self._opener)
+        mosaic = Mosaic(hub, ["http://cam/100", "http://cam/200"], (2, 1), width=128, fps=50)
+        try:
+            part = self._compose(mosaic)
+        finally:
+            mosaic.close()
+        self.assertTrue(part.startswith(PART_HEADER))
+        canvas = mosaic.canvas
+        self.assertEqual(canvas.shape, (36, 128, 3))
+        # 4:3 的影格縮成 48x36，左右各留 8px 黑邊
+        self.assertEqual(int(canvas[18, 32, 0]), 100)
+        self.assertEqual(int(canvas[18, 96, 0]), 200)
+        self.assertEqual(int(canvas[18, 2, 0]), 0)
+        self.assertEqual(int(canvas[18, 66, 0]), 0)
+        jpeg = part[len(PART_HEADER):-len(PART_TRAILER)]
+        self.assertEqual(cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR).shape, (36, 128, 3))
+        self.assertEqual(hub.sources(), {})
+
+    def test_sources_decode_at_mosaic_rate(self):
+        hub = CaptureHub(self._opener)
+        mosaic = Mosaic(hub, ["http://cam/1", "http://cam/2"], (2, 1), width=128, fps=5)
+        try:
+            self._compose(mosaic)
+            self.assertIsNone(mosaic.compose())  # 尚未到期：不解碼、不編碼
+            before = {url: (capture.reads, capture.decodes) for url, capture in self.captures.items()}
+            time.sleep(0.4)
+        finally:
+            mosaic.close()
+        for url, capture in self.captures.items():
+            reads, decodes = before[url]
+            self.assertGreater(capture.reads - reads, 20)
+            self.assertLessEqual(capture.decodes - decodes, 3)
+
+    def test_view_streams_single_multipart(self):
+        with patch.multiple(_HUB, _opener=self._opener, idle_ttl=0, _sources={}, _subscriptions=set()):
+            resp = self.client.get(
+                "/stream/mosaic/", {"url": ["http://cam.local/10", "http://cam.local/20", "http://cam.local/30"], "fps": "20"}
+            )
+            try:
+                self.assertEqual(resp.status_code, 200)
+                self.assertEqual(resp["Content-Type"], "multipart/x-mixed-replace; boundary=frame")
+                self.assertTrue(next(iter(resp.streaming_content)).startswith(PART_HEADER + b"\xff\xd8"))
+                self.assertEqual(len(_HUB.sources()), 3)
+            finally:
+                resp.close()
+            self.assertEqual(_HUB.sources(), {})
+
+    def test_tall_layouts_keep_canvas_height_bounded(self):
+        urls = [f"http://cam/{index}" for index in range(4)]
+        with patch("camera.views.Mosaic") as mosaic_mock:
+            mosaic_mock.return_value.closed = True
+            self.client.get("/stream/mosaic/", {"url": urls, "layout": "1x4", "width": "3840"}).close()
+        (_, _, layout, width, _), _ = mosaic_mock.call_args
+        self.assertEqual(layout, (1, 4))
+        self.assertLessEqual(4 * int(width / TILE_ASPECT), 3840)
+
+    def test_view_rejects_invalid_requests(self):
+        self.assertEqual(self.client.get("/stream/mosaic/").status_code, 400)
+        self.assertEqual(self.client.get("/stream/mosaic/", {"url": "ftp://cam/1"}).status_code, 400)
+        resp = self.client.get("/stream/mosaic/", {"url": ["http://cam/1", "http://cam/2"], "layout": "1x1"})
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.get("/stream/mosaic/", {"url": "http://cam/1", "layout": "1x20000"})
+        self.assertEqual(resp.status_code, 400)
+        with patch("camera.views.MOSAIC_MAX_TILES", 1):
+            resp = self.client.get("/stream/mosaic/", {"url": ["http://cam/1", "http://cam/2"]})
+        self.assertEqual(resp.status_code, 400)
+
+
+class FramePipelineTests(SimpleTestCase):
+    def test_parse_ops(self):
+        self.assertEqual(
+            parse_ops("crop:0.25:0:0.5:0.5, resize:640,GRAY"),
+            (("crop", 0.25, 0.0, 0.5, 0.5), ("resize", 640), ("gray",)),
+        )
+        for value in ("sharpen", "resize", "resize:abc", "resize:8", "blur:4", "gray:1", "crop:0.5:0:0.6:1", "rotate:45"):
+            with self.assertRaises(PipelineError, msg=value):
+                parse_ops(value)
+
+    def test_invalid_env_preset_is_a_configuration_error(self):
+        self.assertEqual(_load_presets("wall=resize:480,gray; ;"), {"wall": (("resize", 480), ("gray",))})
+        with self.assertRaisesMessage(ImproperlyConfigured, "CAM_PIPELINE_PRESETS: invalid preset 'door'"):
+            _load_presets("wall=gray;door=rotate:45")
+
+    def test_optimize_fuses_and_reorders(self):
+        # resize → crop 改為 crop → resize，輸出寬度不變
+        self.assertEqual(
+            optimize(parse_ops("resize:640,crop:0:0:0.5:1")),
+            (("crop", 0.0, 0.0, 0.5, 1.0), ("resize", 320)),
+        )
+        self.assertEqual(
+            optimize(parse_ops("crop:0.5:0:0.5:1,crop:0:0.5:0.5:0.5")),
+            (("crop", 0.5, 0.5, 0.25, 0.5),),
+        )
+        self.assertEqual(optimize(parse_ops("resize:640,resize:320,gray,gray")), (("resize", 320), ("gray",)))
+        self.assertEqual(optimize(parse_ops("gray,resize:320")), (("resize", 320), ("gray",)))
+        self.assertEqual(optimize(parse_ops("rotate:90,blur:3,gray")), (("gray",), ("rotate", 90), ("blur", 3)))
+        self.assertEqual(optimize(parse_ops("rotate:90,rotate:270,timestamp")), (("timestamp",),))
+
+    def test_fused_pipeline_matches_written_order(self):
+        frame = np.random.default_rng(0).integers(0, 256, (240, 320, 3), dtype=np.uint8)
+        steps = parse_ops("resize:160,crop:0.25:0.25:0.5:0.5")
+        self.assertEqual(run(steps, frame).shape, run(optimize(steps), frame).shape)
+
+    def test_equivalent_queries_share_one_variant(self):
+        legacy = _parse_variant({"gray": "1", "width": "320"})
+        self.assertEqual(legacy, FrameVariant(gray=True, width=320))
+        self.assertEqual(_parse_variant({"ops": "gray,resize:320"}), legacy)
+        self.assertEqual(_parse_variant({"preset": "thumb-gray"}), legacy)
+        self.assertEqual(_parse_variant({}), FrameVariant())
+        cropped = _parse_variant({"ops": "resize:640,crop:0:0:0.5:1"})
+        self.assertEqual(cropped, _parse_variant({"ops": "crop:0:0:0.5:1", "width": "320"}))
+        self.assertEqual(cropped.ops, (("crop", 0.0, 0.0, 0.5, 1.0), ("resize", 320)))
+        with self.assertRaises(PipelineError):
+            _parse_variant({"preset": "missing"})
+
+    def test_pipeline_variant_is_encoded_once_for_all_clients(self):
+        renders = []
+
+        def renderer(frame, variant):
+            renders.append(variant)
+            return encode_part(frame, variant)
+
+        capture = FakeCapture(delay=0.2)
+        hub = CaptureHub(lambda url: capture, renderer)
+        first = hub.subscribe("http://cam/video", _parse_variant({"ops": "crop:0:0:0.5:0.5,timestamp"}))
+        second = hub.subscribe("http://cam/video", _parse_variant({"ops": "crop:0:0:0.5:0.5,timestamp,rotate:0"}))
+        try:
+            part = first.next_payload(timeout=1)
+            self.assertIs(second.next_payload(timeout=1), part)
+        finally:
+            first.close()
+            second.close()
+        self.assertEqual(len(renders), 1)
+        jpeg = part[len(PART_HEADER):-len(PART_TRAILER)]
+        self.assertEqual(cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR).shape, (24, 32, 3))
+
+    def test_drawing_operators_leave_shared_frame_untouched(self):
+        frame = np.zeros((240, 320, 3), dtype=np.uint8)
+        out = run(parse_ops("crop:0:0:0.5:0.5,timestamp"), frame)
+        self.assertGreater(int(out.max()), 0)
+        self.assertEqual(int(frame.max()), 0)
+
+    def test_each_operator_reports_its_stage(self):
+        def count(stage):
+            return sum(STAGE_SECONDS.labels(stage).counts)
+
+        before = {stage: count(stage) for stage in ("crop", "resize", "cvtcolor", "blur")}
+        encode_variant(np.zeros((240, 320, 3), dtype=np.uint8), _parse_variant({"ops": "crop:0:0:0.5:1,blur:3", "gray": "1"}))
+        self.assertEqual(count("crop") - before["crop"], 1)
+        self.assertEqual(count("cvtcolor") - before["cvtcolor"], 1)
+        self.assertEqual(count("blur") - before["blur"], 1)
+        self.assertEqual(count("resize") - before["resize"], 0)
+
+    def test_views_reject_invalid_pipeline(self):
+        for path in ("/stream/", "/stream/snapshot/"):
+            resp = self.client.get(path, {"url": "http://cam/1", "ops": "sharpen"})
+            self.assertEqual(resp.status_code, 400, path)
+        resp = self.client.get("/stream/mosaic/", {"url": "http://cam/1", "preset": "missing"})
+        self.assertEqual(resp.status_code, 400)
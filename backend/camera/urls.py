@@ -1,9 +1,12 @@
 from django.urls import path
 
-from .views import abort_stream, camera_stream, stream_proof
+from .views import abort_stream, camera_mosaic, camera_stream, stream_proof, stream_sessions, stream_snapshot
 
 urlpatterns = [
     path("stream/", camera_stream, name="camera-stream"),
+    path("stream/snapshot/", stream_snapshot, name="camera-stream-snapshot"),
+    path("stream/mosaic/", camera_mosaic, name="camera-stream-mosaic"),
     path("stream/proof/", stream_proof, name="camera-stream-proof"),
     path("stream/abort/", abort_stream, name="camera-stream-abort"),
+    path("stream/sessions/", stream_sessions, name="camera-stream-sessions"),
 ]
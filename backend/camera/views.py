@@ -1,17 +1,41 @@
 # camera/views.py
+import asyncio
 import hashlib
 import os
 import threading
 import time
 import uuid
+import zlib
+from datetime import UTC, datetime
 from urllib.parse import urlparse
 
-import cv2
+from django.core.handlers.asgi import ASGIRequest
 from django.http import StreamingHttpResponse, HttpResponse, JsonResponse
 from django.utils import timezone
+from django.utils.http import parse_etags
 from django.views.decorators.http import require_GET, require_POST
 
+from config.metrics import format_header, format_sample, observe_stage, register_collector
+
+from .frames import DEFAULT_JPEG_QUALITY, FrameVariant, MotionGate, encode_part, opencv, part_jpeg
+from .hub import CaptureHub, EncodePool
+from .mosaic import TILE_ASPECT, Mosaic, parse_layout
+from .pipeline import PRESETS, PipelineError, describe, optimize, parse_ops
+from .sessions import build_session_registry
+
 FRAME_INTERVAL = float(os.getenv("CAM_FRAME_INTERVAL", "0"))  # 例：0.05 ≈ 20fps
+MAX_FPS = 60.0
+IDLE_TTL = float(os.getenv("CAM_IDLE_TTL", "15"))  # 最後一位觀看者離開後保留連線的秒數
+MOTION_KEEPALIVE = float(os.getenv("CAM_MOTION_KEEPALIVE", "5"))  # 靜止畫面仍至少每 N 秒送一幀
+ENCODE_WORKERS = int(os.getenv("CAM_ENCODE_WORKERS", "0"))  # >0 時以執行緒池平行編碼
+ENCODE_INFLIGHT = int(os.getenv("CAM_ENCODE_INFLIGHT", "0"))  # 每個 variant 同時編碼的影格上限，0 為 workers×2
+FRAME_WAIT_TIMEOUT = 0.5  # 等待新影格的上限，逾時後重新檢查中斷狀態
+SNAPSHOT_MAX_AGE = float(os.getenv("CAM_SNAPSHOT_MAX_AGE", "1"))  # 快照可沿用的影格最長秒數
+SNAPSHOT_TIMEOUT = float(os.getenv("CAM_SNAPSHOT_TIMEOUT", "5"))  # 需要開啟來源時等待第一幀的上限
+MOSAIC_FPS = float(os.getenv("CAM_MOSAIC_FPS", "5"))  # /stream/mosaic/ 預設輸出 fps
+MOSAIC_WIDTH = int(os.getenv("CAM_MOSAIC_WIDTH", "1280"))  # mosaic 畫布預設寬度 (px)
+MOSAIC_MAX_TILES = int(os.getenv("CAM_MOSAIC_MAX_TILES", "16"))
+MOSAIC_MAX_WIDTH = 3840  # 畫布寬、高的上限 (px)
 
 
 def _open_ip():
@@ -27,6 +51,7 @@ def _open_capture(url: str):
     """
     優先使用 FFMPEG，若失敗則退回預設 (CAP_ANY) 以容忍不同的 OpenCV 編譯選項。
     """
+    cv2 = opencv()
     cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG)
     if not cap.isOpened():
         cap.release()
@@ -41,6 +66,90 @@ def _open_capture(url: str):
     return None
 
 
+_HUB = CaptureHub(
+    _open_capture,
+    encode_part,
+    idle_ttl=IDLE_TTL,
+    pool=EncodePool(ENCODE_WORKERS, ENCODE_INFLIGHT) if ENCODE_WORKERS > 0 else None,
+)
+
+
+def prewarm_default_source():
+    """
+    啟動時預先連上 CAMERA_URL，第一位觀看者不必等待 RTSP 握手。
+    """
+    url = _open_ip()
+    if _is_url_allowed(url):
+        _HUB.warm(url)
+
+
+def _parse_fps(value: str | None) -> float | None:
+    """
+    ?fps= 優先，否則沿用 CAM_FRAME_INTERVAL；None 代表不限速。
+    """
+    try:
+        fps = float(value) if value is not None else None
+    except (ValueError, TypeError):
+        fps = None
+    if fps is None and FRAME_INTERVAL > 0:
+        fps = 1.0 / FRAME_INTERVAL
+    if fps is None or fps <= 0 or fps != fps:
+        return None
+    return min(fps, MAX_FPS)
+
+
+def _parse_motion(value: str | None) -> float | None:
+    """
+    ?motion=<門檻> 啟用動態偵測：縮圖平均灰階差 (0–255) 低於門檻的影格不編碼也不送出。
+    """
+    try:
+        threshold = float(value) if value is not None else None
+    except (ValueError, TypeError):
+        return None
+    if threshold is None or threshold <= 0 or threshold != threshold:
+        return None
+    return min(threshold, 255.0)
+
+
+def _parse_width(value: str | None) -> int | None:
+    try:
+        width = int(value) if value is not None else None
+    except (ValueError, TypeError):
+        width = None
+    if width is not None and width < 16:
+        width = 16
+    return width
+
+
+def _parse_variant(params, sized: bool = True) -> FrameVariant:
+    """
+    ?preset=thumb&ops=crop:0:0:0.5:0.5,timestamp&gray=1&width=640&quality=70 → FrameVariant。
+    依序執行 preset、ops，再套用 width 與 gray；管線經 optimize 後作為快取鍵。
+    width / quality 的無效值回到預設，preset / ops 無法解析時拋出 PipelineError。
+    sized=False 時忽略 width (mosaic 以 width 指定畫布寬度)。
+    """
+    steps = ()
+    preset = params.get("preset")
+    if preset:
+        if preset not in PRESETS:
+            raise PipelineError(f"unknown preset {preset!r}")
+        steps += PRESETS[preset]
+    steps += parse_ops(params.get("ops") or "")
+    width = _parse_width(params.get("width")) if sized else None
+    if width:
+        steps += (("resize", width),)
+    if params.get("gray") in ("1", "true", "True"):
+        steps += (("gray",),)
+
+    q = params.get("quality")
+    try:
+        quality = int(q) if q is not None else DEFAULT_JPEG_QUALITY
+    except (ValueError, TypeError):
+        quality = DEFAULT_JPEG_QUALITY
+    quality = min(max(quality, 1), 100)
+    return FrameVariant.from_steps(optimize(steps), quality)
+
+
 def _is_url_allowed(url: str | None) -> bool:
     if not url:
         return False
@@ -51,58 +160,39 @@ def _is_url_allowed(url: str | None) -> bool:
     return parsed.scheme in ("http", "https", "rtsp")
 
 
-_ACTIVE_STREAMS: dict[str, threading.Event] = {}
-_ACTIVE_STREAMS_LOCK = threading.Lock()
+_SESSIONS = build_session_registry()
+_ACTIVE_STREAMS = _SESSIONS.streams
+_ACTIVE_STREAMS_LOCK = _SESSIONS.lock
 
 
 def _register_stream_session(client_id: str | None):
-    if not client_id:
-        return None
-    event = threading.Event()
-    previous = None
-    with _ACTIVE_STREAMS_LOCK:
-        previous = _ACTIVE_STREAMS.get(client_id)
-        _ACTIVE_STREAMS[client_id] = event
-    if previous:
-        previous.set()
-    return event
+    return _SESSIONS.register(client_id)
 
 
 def _release_stream_session(client_id: str | None, token: threading.Event | None):
-    if not client_id or token is None:
-        return
-    with _ACTIVE_STREAMS_LOCK:
-        current = _ACTIVE_STREAMS.get(client_id)
-        if current is token:
-            _ACTIVE_STREAMS.pop(client_id, None)
-    token.set()
+    _SESSIONS.release(client_id, token)
+
+
+async def _arelease_stream_session(client_id: str | None, token: threading.Event | None):
+    await _SESSIONS.arelease(client_id, token)
 
 
 def _abort_stream_session(client_id: str | None) -> bool:
-    if not client_id:
-        return False
-    with _ACTIVE_STREAMS_LOCK:
-        token = _ACTIVE_STREAMS.get(client_id)
-    if token:
-        token.set()
-        return True
-    return False
+    return _SESSIONS.abort(client_id)
 
 
 def _iter_stream(
     request,
     url: str,
     *,
-    to_gray: bool,
-    width: int | None,
+    variant: FrameVariant,
     client_id: str | None,
     stop_token: threading.Event | None,
+    fps: float | None = None,
+    motion: float | None = None,
 ):
-    cap = _open_capture(url)
-    if cap is None:
-        _release_stream_session(client_id, stop_token)
-        return
-    last_frame_ts = 0.0
+    gate = MotionGate(motion, MOTION_KEEPALIVE) if motion else None
+    subscription = _HUB.subscribe(url, variant, label=client_id, fps=fps, gate=gate)
     check_aborted = getattr(request, "is_aborted", None)
 
     def _request_disconnected() -> bool:
@@ -117,62 +207,93 @@ def _iter_stream(
         while True:
             if (stop_token and stop_token.is_set()) or _request_disconnected():
                 break
-            if FRAME_INTERVAL > 0:
-                now = time.time()
-                sleep = FRAME_INTERVAL - (now - last_frame_ts)
-                if sleep > 0:
-                    time.sleep(sleep)
-                last_frame_ts = time.time()
-
-            ok, frame = cap.read()
-            if not ok or frame is None:
-                break
-
-            if width:
-                h = int(frame.shape[0] * (width / frame.shape[1]))
-                frame = cv2.resize(frame, (width, h))
-            if to_gray:
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
-            ok, buf = cv2.imencode(".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), 80])
-            if not ok:
+            payload = subscription.next_payload(timeout=FRAME_WAIT_TIMEOUT)
+            if payload is None:
+                if subscription.closed:
+                    break
                 continue
 
-            yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + buf.tobytes() + b"\r\n"
+            # payload 已是完整的 multipart 片段，所有連線共用同一個 bytes 物件
+            started = time.perf_counter()
+            yield payload
+            observe_stage("write", started)
+            subscription.record_sent(len(payload))
     finally:
-        cap.release()
+        subscription.close()
         _release_stream_session(client_id, stop_token)
 
 
+async def _aiter_stream(
+    request,
+    url: str,
+    *,
+    variant: FrameVariant,
+    client_id: str | None,
+    stop_token: threading.Event | None,
+    fps: float | None = None,
+    motion: float | None = None,
+):
+    """
+    ASGI 版本：等待影格不佔執行緒，只有編碼 (cv2) 才交給 thread pool。
+    客戶端斷線時 Django 會取消此 generator，finally 負責釋放資源。
+    """
+    gate = MotionGate(motion, MOTION_KEEPALIVE) if motion else None
+    subscription = _HUB.subscribe(url, variant, label=client_id, fps=fps, gate=gate)
+    try:
+        while True:
+            if stop_token and stop_token.is_set():
+                break
+
+            payload = await subscription.anext_payload(timeout=FRAME_WAIT_TIMEOUT)
+            if payload is None:
+                if subscription.closed:
+                    break
+                continue
+
+            # payload 已是完整的 multipart 片段，所有連線共用同一個 bytes 物件
+            started = time.perf_counter()
+            yield payload
+            observe_stage("write", started)
+            subscription.record_sent(len(payload))
+    finally:
+        subscription.close()
+        await _arelease_stream_session(client_id, stop_token)
+
+
 @require_GET
 def camera_stream(request):
     """
     /stream/                → 用環境變數 CAMERA_URL
     /stream/?url=...        → 指定來源 (http://IP:4747/video、rtsp://...)
     /stream/?gray=1&width=640
+    /stream/?ops=crop:0.5:0:0.5:1,resize:640,timestamp 或 ?preset=thumb → 影格處理管線 (camera.pipeline)
+    /stream/?fps=2          → 每秒最多 2 幀，其餘影格只 grab 不解碼
+    /stream/?motion=3       → 畫面變化低於門檻時不送出 (至少每 CAM_MOTION_KEEPALIVE 秒一幀)
+    在 ASGI 伺服器下改用 async generator 輸出，觀看者不會佔住 worker。
     """
     url = request.GET.get("url") or _open_ip()
     if not _is_url_allowed(url):
         return HttpResponse("Invalid or missing camera URL", status=400)
 
-    to_gray = request.GET.get("gray") in ("1", "true", "True")
-    w = request.GET.get("width")
     try:
-        width = int(w) if w is not None else None
-    except (ValueError, TypeError):
-        width = None
-    if width is not None and width < 16:
-        width = 16
+        variant = _parse_variant(request.GET)
+    except PipelineError as exc:
+        return HttpResponse(f"Invalid pipeline: {exc}", status=400)
+    fps = _parse_fps(request.GET.get("fps"))
+    motion = _parse_motion(request.GET.get("motion"))
 
     client_id = request.GET.get("client")
     stop_token = _register_stream_session(client_id)
 
+    iter_stream = _aiter_stream if isinstance(request, ASGIRequest) else _iter_stream
     response = StreamingHttpResponse(
-        _iter_stream(
+        iter_stream(
             request=request,
             url=url,
-            to_gray=to_gray,
-            width=width,
+            variant=variant,
+            fps=fps,
+            motion=motion,
             client_id=client_id,
             stop_token=stop_token,
         ),
@@ -184,6 +305,119 @@ def camera_stream(request):
     return response
 
 
+def _iter_mosaic(mosaic: Mosaic, client_id: str | None, stop_token: threading.Event | None):
+    try:
+        while not (stop_token and stop_token.is_set()) and not mosaic.closed:
+            time.sleep(mosaic.delay())
+            part = mosaic.compose()
+            if part is None:
+                continue
+            started = time.perf_counter()
+            yield part
+            observe_stage("write", started)
+    finally:
+        mosaic.close()
+        _release_stream_session(client_id, stop_token)
+
+
+async def _aiter_mosaic(mosaic: Mosaic, client_id: str | None, stop_token: threading.Event | None):
+    """
+    ASGI 版本：等待排程不佔執行緒，縮放與編碼交給 thread pool。
+    """
+    try:
+        while not (stop_token and stop_token.is_set()) and not mosaic.closed:
+            await asyncio.sleep(mosaic.delay())
+            part = await asyncio.to_thread(mosaic.compose)
+            if part is None:
+                continue
+            started = time.perf_counter()
+            yield part
+            observe_stage("write", started)
+    finally:
+        mosaic.close()
+        await _arelease_stream_session(client_id, stop_token)
+
+
+@require_GET
+def camera_mosaic(request):
+    """
+    /stream/mosaic/?url=...&url=...&layout=3x2&width=1280&fps=5
+    把多個來源拼成一張畫布，以單一 MJPEG 串流輸出；每個來源只依 fps 解碼，畫布每次只編碼一次。
+    支援 gray、ops、preset、quality 與 client (可被 /stream/abort/ 中斷)；管線套用在整張畫布上。
+    """
+    urls = request.GET.getlist("url")
+    if not urls or len(urls) > MOSAIC_MAX_TILES or not all(_is_url_allowed(url) for url in urls):
+        return HttpResponse(f"Provide 1-{MOSAIC_MAX_TILES} valid camera url parameters", status=400)
+    layout = parse_layout(request.GET.get("layout"), len(urls))
+    if layout is None:
+        return HttpResponse("Invalid layout, expected COLSxROWS with room for every url", status=400)
+
+    try:
+        variant = _parse_variant(request.GET, sized=False)
+    except PipelineError as exc:
+        return HttpResponse(f"Invalid pipeline: {exc}", status=400)
+    cols, rows = layout
+    # 列數多於欄數時畫布較高：寬度再依比例縮小，讓高度同樣不超過 MOSAIC_MAX_WIDTH
+    max_width = min(MOSAIC_MAX_WIDTH, int(MOSAIC_MAX_WIDTH * TILE_ASPECT * cols / rows))
+    width = min(max(_parse_width(request.GET.get("width")) or MOSAIC_WIDTH, 16 * cols), max_width)
+    fps = request.GET.get("fps")
+    fps = min((_parse_fps(fps) if fps is not None else None) or MOSAIC_FPS, MAX_FPS)
+
+    client_id = request.GET.get("client")
+    stop_token = _register_stream_session(client_id)
+    try:
+        mosaic = Mosaic(_HUB, urls, layout, width, fps, variant=variant, label=client_id)
+    except Exception:
+        _release_stream_session(client_id, stop_token)
+        raise
+
+    iter_mosaic = _aiter_mosaic if isinstance(request, ASGIRequest) else _iter_mosaic
+    response = StreamingHttpResponse(
+        iter_mosaic(mosaic, client_id, stop_token),
+        content_type="multipart/x-mixed-replace; boundary=frame",
+    )
+    response["Cache-Control"] = "no-store"
+    response["Pragma"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+@require_GET
+async def stream_snapshot(request):
+    """
+    /stream/snapshot/?url=...&gray=1&width=320 → 來源最新一幀的 JPEG。
+    已有觀看者或閒置中的來源直接取最新影格 (CAM_SNAPSHOT_MAX_AGE 秒內)，同一幀同一組參數只編碼一次；
+    沒有開啟的來源時才短暫開一個 capture。ETag 由來源、影格序號與 variant 組成，支援 If-None-Match。
+    """
+    url = request.GET.get("url") or _open_ip()
+    if not _is_url_allowed(url):
+        return HttpResponse("Invalid or missing camera URL", status=400)
+    try:
+        variant = _parse_variant(request.GET)
+    except PipelineError as exc:
+        return HttpResponse(f"Invalid pipeline: {exc}", status=400)
+
+    snapshot = _HUB.cached_snapshot(url, variant, SNAPSHOT_MAX_AGE)
+    if snapshot is None:
+        snapshot = await asyncio.to_thread(_HUB.snapshot, url, variant, SNAPSHOT_MAX_AGE, SNAPSHOT_TIMEOUT)
+    if snapshot is None:
+        response = HttpResponse("Camera frame unavailable", status=503)
+        response["Retry-After"] = "1"
+        return response
+
+    token, seq, part = snapshot
+    etag = f'"{token}-{seq}-{zlib.crc32(repr(variant).encode()):08x}"'
+    etags = parse_etags(request.headers.get("If-None-Match", ""))
+    if etag in etags or "*" in etags:
+        response = HttpResponse(status=304)
+        del response["Content-Type"]
+    else:
+        response = HttpResponse(part_jpeg(part), content_type="image/jpeg")
+    response["ETag"] = etag
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
 @require_GET
 def stream_proof(request):
     """
@@ -206,6 +440,68 @@ def stream_proof(request):
     return JsonResponse(proof_payload)
 
 
+@register_collector
+def _session_metrics() -> list[str]:
+    """
+    /metrics 抓取時輸出目前各串流連線的累計數字與平均 fps。
+    """
+    subscriptions = _HUB.subscriptions()
+    sources = _HUB.sources()
+    lines = format_header("camera_sources", "gauge", "Open capture sources, including idle ones.")
+    lines.append(format_sample("camera_sources", {}, len(sources)))
+    lines += format_header("camera_sessions", "gauge", "Active stream sessions.")
+    lines.append(format_sample("camera_sessions", {}, len(subscriptions)))
+    series = (
+        ("camera_session_frames_delivered", "counter", "Frames sent to this session.", "delivered"),
+        ("camera_session_frames_dropped", "counter", "Frames this session skipped.", "dropped"),
+        ("camera_session_frames_unchanged", "counter", "Frames suppressed by motion gating.", "unchanged"),
+        ("camera_session_bytes_sent", "counter", "MJPEG bytes written to this session.", "bytes_sent"),
+    )
+    stats = [subscription.stats() for subscription in subscriptions]
+    now = time.time()
+    for name, kind, documentation, key in series:
+        lines += format_header(name, kind, documentation)
+        for item in stats:
+            labels = {"session": item["id"], "client": item["label"] or "", "source": item["source"]}
+            lines.append(format_sample(name, labels, item[key]))
+    lines += format_header("camera_session_fps", "gauge", "Average delivered fps since the session started.")
+    for item in stats:
+        labels = {"session": item["id"], "client": item["label"] or "", "source": item["source"]}
+        elapsed = max(now - item["started_at"], 1e-6)
+        lines.append(format_sample("camera_session_fps", labels, round(item["delivered"] / elapsed, 3)))
+    return lines
+
+
+@require_GET
+def stream_sessions(request):
+    """
+    列出目前 process 內的串流連線與送出 / 丟棄的影格數；可用 ?client= 篩選。
+    """
+    client_id = request.GET.get("client")
+    sessions = []
+    for subscription in _HUB.subscriptions():
+        if client_id and subscription.label != client_id:
+            continue
+        stats = subscription.stats()
+        variant = stats["variant"] or FrameVariant()
+        parsed = urlparse(subscription.source.url)
+        sessions.append({
+            "client_id": stats["label"],
+            "camera_host": parsed.hostname,
+            "camera_signature": hashlib.sha256(subscription.source.url.encode("utf-8")).hexdigest(),
+            "gray": variant.gray,
+            "width": variant.width,
+            "quality": variant.quality,
+            "ops": describe(variant.steps),
+            "started_at": datetime.fromtimestamp(stats["started_at"], UTC).isoformat(),
+            "frames_delivered": stats["delivered"],
+            "frames_dropped": stats["dropped"],
+            "frames_unchanged": stats["unchanged"],
+            "bytes_sent": stats["bytes_sent"],
+        })
+    return JsonResponse({"sessions": sessions})
+
+
 @require_POST
 def abort_stream(request):
     client_id = request.GET.get("client") or request.POST.get("client")
@@ -3,6 +3,11 @@ ASGI config for config project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Docker image 以 gunicorn + uvicorn worker 載入此入口；`/stream/` 在 ASGI 下
+會改用 async generator 輸出，長時間觀看的連線不會佔住 worker。
+URLconf 預設為 config.urls_asgi：/data/ 的 CRUD 由 data.async_views 在 event loop 上處理，
+與串流共用同一個 process 時不必每個請求佔一條執行緒。
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +17,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+os.environ.setdefault('DJANGO_ROOT_URLCONF', 'config.urls_asgi')
 
 application = get_asgi_application()
@@ -0,0 +1,225 @@
+"""
+Process 內的輕量指標登錄，以 Prometheus text format 輸出於 /metrics。
+
+- Counter / Histogram：以 labels(...) 取得子項後 inc() / observe()，熱路徑只有一次 dict 查詢與一把鎖。
+- register_collector：抓取時才計算的指標（例如目前串流連線），回傳已格式化的行。
+
+多個 gunicorn worker 各自持有一份指標，Prometheus 會依抓到的 worker 取得該 process 的數字。
+"""
+import bisect
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.http import HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+_METRICS: list["_Metric"] = []
+_COLLECTORS = []
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_sample(name: str, labels: dict, value) -> str:
+    if labels:
+        body = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+        return f"{name}{{{body}}} {value}"
+    return f"{name} {value}"
+
+
+def format_header(name: str, kind: str, documentation: str) -> list[str]:
+    return [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        with _REGISTRY_LOCK:
+            _METRICS.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def remove(self, *values):
+        """
+        移除一組 label 的子項 (例如已關閉的來源)，之後不再輸出；再次 labels() 時從 0 開始。
+        """
+        with self._lock:
+            self._children.pop(values, None)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        lines = format_header(self.name, self.kind, self.documentation)
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            lines.extend(self._render_child(dict(zip(self.labelnames, values)), child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _render_child(self, labels: dict, child: _CounterChild):
+        return [format_sample(self.name, labels, child.value)]
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _render_child(self, labels: dict, child: _HistogramChild):
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(format_sample(f"{self.name}_bucket", {**labels, "le": le}, cumulative))
+        lines.append(format_sample(f"{self.name}_sum", labels, total))
+        lines.append(format_sample(f"{self.name}_count", labels, cumulative))
+        return lines
+
+
+def register_collector(collector):
+    """
+    collector() 於每次抓取時呼叫，回傳已格式化的指標行。
+    """
+    with _REGISTRY_LOCK:
+        if collector not in _COLLECTORS:
+            _COLLECTORS.append(collector)
+    return collector
+
+
+def render() -> str:
+    with _REGISTRY_LOCK:
+        metrics = list(_METRICS)
+        collectors = list(_COLLECTORS)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    for collector in collectors:
+        lines.extend(collector())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "camera_stage_seconds",
+    "Time spent in each stage of the streaming hot path.",
+    ("stage",),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Latency of non-streaming HTTP responses by view.",
+    ("view", "method", "status"),
+)
+
+
+def observe_stage(stage: str, start: float) -> float:
+    """
+    記錄 start 至今的耗時並回傳現在時間，方便串接下一個階段。
+    """
+    now = time.perf_counter()
+    STAGE_SECONDS.labels(stage).observe(now - start)
+    return now
+
+
+# method 由客戶端決定；其他值一律記為 other，避免任意字串讓 histogram 子項無限增加
+KNOWN_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+
+def _observe_request(request, response, start: float):
+    if response.streaming:
+        return
+    match = getattr(request, "resolver_match", None)
+    view = match.view_name if match else "unmatched"
+    method = request.method if request.method in KNOWN_METHODS else "other"
+    HTTP_REQUEST_SECONDS.labels(view, method, str(response.status_code)).observe(
+        time.perf_counter() - start
+    )
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            start = time.perf_counter()
+            response = await get_response(request)
+            _observe_request(request, response, start)
+            return response
+
+    else:
+
+        def middleware(request):
+            start = time.perf_counter()
+            response = get_response(request)
+            _observe_request(request, response, start)
+            return response
+
+    return middleware
+
+
+def metrics(request):
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -2,6 +2,7 @@ from pathlib import Path
 import os
 from dotenv import load_dotenv
 from corsheaders.defaults import default_headers, default_methods
+from django.core.exceptions import ImproperlyConfigured
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR / ".env")
@@ -14,6 +15,13 @@ if not SECRET_KEY:
 DEBUG = os.getenv("DJANGO_DEBUG", "False").lower() == "true"
 ALLOWED_HOSTS = [h.strip() for h in os.getenv("DJANGO_ALLOWED_HOSTS", "").split(",") if h.strip()]
 
+# 同一個映像可分成不同角色的 worker (見 config/urls.py)：
+# all = 全部路由；api = /data/ 與 admin，不載入 camera.views 與 OpenCV；stream = 只有 /stream/
+SERVER_ROLES = ("all", "api", "stream")
+SERVER_ROLE = os.getenv("DJANGO_SERVER_ROLE", "all").lower()
+if SERVER_ROLE not in SERVER_ROLES:
+    raise ImproperlyConfigured(f"DJANGO_SERVER_ROLE must be one of {', '.join(SERVER_ROLES)}, got {SERVER_ROLE!r}")
+
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -38,9 +46,11 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'config.metrics.request_metrics_middleware',
 ]
 
-ROOT_URLCONF = 'config.urls'
+# config/asgi.py 預設改用 config.urls_asgi (/data/ 走 async view)；設為 config.urls 可停用
+ROOT_URLCONF = os.getenv("DJANGO_ROOT_URLCONF", 'config.urls')
 
 TEMPLATES = [
     {
@@ -74,6 +84,38 @@ DATABASES = {
     }
 }
 
+# DJANGO_DB_PROFILE=production：多個 gunicorn worker 共用同一個 SQLite 檔時使用
+# - WAL：讀取不會被寫入擋住；synchronous=NORMAL 在 WAL 下只有斷電才可能遺失最後幾筆 commit
+# - transaction_mode=IMMEDIATE：transaction 一開始就取得寫入鎖，避免讀鎖升級時直接 "database is locked"
+# - busy_timeout：等鎖而不是立即失敗；CONN_MAX_AGE 讓同一個執行緒沿用連線，不必每個請求重開並重設 pragma
+# - DATA_WRITE_COALESCE：同一個 process 的 Data 寫入合併成批次 commit (見 data/writes.py)
+DB_PROFILE = os.getenv("DJANGO_DB_PROFILE", "default").lower()
+if DB_PROFILE == "production":
+    busy_timeout_ms = int(os.getenv("DJANGO_DB_BUSY_TIMEOUT", "5000"))
+    sqlite_pragmas = [
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        f"PRAGMA busy_timeout = {busy_timeout_ms}",
+        f"PRAGMA mmap_size = {int(os.getenv('DJANGO_DB_MMAP_SIZE', str(256 * 1024 * 1024)))}",
+        f"PRAGMA cache_size = -{int(os.getenv('DJANGO_DB_CACHE_KB', '65536'))}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': int(os.getenv("DJANGO_DB_CONN_MAX_AGE", "600")),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': "; ".join(sqlite_pragmas),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': busy_timeout_ms / 1000,
+        },
+    })
+elif DB_PROFILE != "default":
+    raise ImproperlyConfigured(f"DJANGO_DB_PROFILE must be 'default' or 'production', got {DB_PROFILE!r}")
+
+DATA_WRITE_COALESCE = os.getenv(
+    "DATA_WRITE_COALESCE", "true" if DB_PROFILE == "production" else "false"
+).lower() == "true"
+
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
 USE_I18N = True
@@ -85,3 +127,4 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_HEADERS = list(default_headers) + ["content-type"]
 CORS_ALLOW_METHODS = list(default_methods)  # 包含 GET, POST, PUT, PATCH, DELETE, OPTIONS
+CORS_EXPOSE_HEADERS = ["Link", "X-Next-Cursor", "X-Data-Version"]  # /data/ 分頁游標與變更版本號
@@ -0,0 +1,119 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+
+from camera.frames import FrameVariant, encode_variant
+
+from .metrics import STAGE_SECONDS, Counter, Histogram, render
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = Histogram("test_latency_seconds", "Test histogram.", ("stage",), buckets=(0.1, 1.0))
+        child = histogram.labels("a")
+        child.observe(0.05)
+        child.observe(0.5)
+        child.observe(5)
+        lines = histogram.render()
+        self.assertIn('test_latency_seconds_bucket{stage="a",le="0.1"} 1', lines)
+        self.assertIn('test_latency_seconds_bucket{stage="a",le="1.0"} 2', lines)
+        self.assertIn('test_latency_seconds_bucket{stage="a",le="+Inf"} 3', lines)
+        self.assertIn('test_latency_seconds_count{stage="a"} 3', lines)
+
+    def test_counter_escapes_label_values(self):
+        counter = Counter("test_events_total", "Test counter.", ("name",))
+        counter.labels('say "hi"\n').inc(2)
+        self.assertIn('test_events_total{name="say \\"hi\\"\\n"} 2.0', counter.render())
+
+    def test_encode_records_stage_latency(self):
+        before = STAGE_SECONDS.labels("imencode").counts[:]
+        encode_variant(np.zeros((32, 32, 3), dtype=np.uint8), FrameVariant(gray=True, width=16))
+        self.assertEqual(sum(STAGE_SECONDS.labels("imencode").counts), sum(before) + 1)
+        self.assertIn('camera_stage_seconds_count{stage="cvtcolor"}', render())
+
+
+class MetricsEndpointTests(TestCase):
+    def test_metrics_exposes_request_latency(self):
+        self.client.get("/data/")
+        resp = self.client.get("/metrics")
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp["Content-Type"].startswith("text/plain; version=0.0.4"))
+        body = resp.content.decode()
+        self.assertIn(
+            'http_request_duration_seconds_count{view="data-collection",method="GET",status="200"}',
+            body,
+        )
+        self.assertIn("# TYPE camera_session_frames_delivered counter", body)
+        self.assertIn("camera_sessions ", body)
+
+    def test_unknown_methods_share_one_label(self):
+        for index in range(5):
+            self.client.generic(f"X{index}", "/no-such-path/")
+        body = self.client.get("/metrics").content.decode()
+        self.assertNotIn('method="X', body)
+        self.assertIn('http_request_duration_seconds_count{view="unmatched",method="other",status="404"} 5', body)
+
+
+PROBE = """
+import json, sys
+import django
+django.setup()
+from django.test import Client
+from django.urls import Resolver404, resolve
+
+def routed(path):
+    try:
+        resolve(path)
+        return True
+    except Resolver404:
+        return False
+
+health = Client().get("/healthz/").json()
+import camera.frames
+print(json.dumps({
+    "health": health,
+    "data": routed("/data/"),
+    "stream": routed("/stream/"),
+    "camera_views": "camera.views" in sys.modules,
+    "cv2": "cv2" in sys.modules,
+}))
+"""
+
+
+class ServerRoleTests(SimpleTestCase):
+    """
+    以子 process 檢查各角色啟動後載入的模組 (測試 process 本身早已載入 cv2)。
+    """
+
+    def _probe(self, role: str, urlconf: str = "config.urls") -> dict:
+        env = {**os.environ, "DJANGO_SERVER_ROLE": role, "DJANGO_ROOT_URLCONF": urlconf,
+               "DJANGO_SETTINGS_MODULE": "config.settings", "DJANGO_ALLOWED_HOSTS": "testserver"}
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE], cwd=Path(__file__).resolve().parent.parent,
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
+
+    def test_opencv_is_not_loaded_until_a_stream_needs_it(self):
+        result = self._probe("all")
+        self.assertEqual(result["health"], {"ok": True, "role": "all"})
+        self.assertTrue(result["data"] and result["stream"])
+        self.assertTrue(result["camera_views"])
+        self.assertFalse(result["cv2"])
+
+    def test_api_role_skips_camera_routes(self):
+        for urlconf in ("config.urls", "config.urls_asgi"):
+            result = self._probe("api", urlconf)
+            self.assertTrue(result["data"])
+            self.assertFalse(result["stream"])
+            self.assertFalse(result["camera_views"])
+
+    def test_stream_role_skips_data_routes(self):
+        result = self._probe("stream")
+        self.assertFalse(result["data"])
+        self.assertTrue(result["stream"])
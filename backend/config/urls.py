@@ -1,13 +1,24 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
 
+from .metrics import metrics
+
 def healthz(request):
-    return JsonResponse({"ok": True})
+    return JsonResponse({"ok": True, "role": settings.SERVER_ROLE})
 
 urlpatterns = [
-    path("admin/", admin.site.urls),
     path("healthz/", healthz),
-    path("", include("data.urls")),
-    path("", include("camera.urls")),
+    path("metrics", metrics),
 ]
+# 依 DJANGO_SERVER_ROLE 只掛載該角色需要的路由；api worker 不會 import camera.views
+if settings.SERVER_ROLE in ("all", "api"):
+    urlpatterns += [
+        path("admin/", admin.site.urls),
+        path("", include("data.urls")),
+    ]
+if settings.SERVER_ROLE in ("all", "stream"):
+    urlpatterns += [
+        path("", include("camera.urls")),
+    ]
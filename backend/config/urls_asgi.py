@@ -0,0 +1,13 @@
+"""
+ASGI 使用的 URLconf (由 config/asgi.py 指定)：/data/ 與 /data/<id>/ 改用 data.async_views，
+其餘路由與 config.urls 相同。
+"""
+from django.conf import settings
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = list(sync_urlpatterns)
+if settings.SERVER_ROLE in ("all", "api"):
+    from data.urls import async_urlpatterns
+
+    urlpatterns = async_urlpatterns + urlpatterns
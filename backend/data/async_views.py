@@ -0,0 +1,184 @@
+# data/async_views.py
+"""
+/data/ 與 /data/<id>/ 的 async 版本，由 config/urls_asgi.py 在 ASGI 下取代同路徑的 DRF view。
+
+- 一般的 JSON 請求直接在 event loop 上處理：版本號、單筆讀寫走 async ORM (afirst / asave / adelete)，
+  304 與回應快取命中不需要任何執行緒；列表未命中時把分頁查詢交給一次 sync_to_async，
+  沿用 DataListCreateView._fast_list，輸出與 DRF view 逐位元組相同。
+- 驗證仍由 DataSerializer 負責 (不查資料庫)，錯誤格式與狀態碼不變。
+- 其他情況 (Browsable API、表單、?format=、無法解析的 JSON、OPTIONS 等) 交回原本的 DRF view，
+  行為與 WSGI 完全一致。
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import condition
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.utils import json
+
+from .cache import LIST_CACHE, arow_state, atable_state, detail_etag, detail_last_modified, list_etag, list_last_modified
+from .changes import NOTIFIER
+from .listing import LIST_FIELDS, FastJSONRenderer, fast_path_enabled, rows_to_data
+from .models import Data
+from .serializers import DataSerializer
+from .views import DataListCreateView, DataRetrieveUpdateDestroyView
+from .writes import WRITES, coalescing_enabled
+
+COLLECTION_ALLOW = "GET, POST, HEAD, OPTIONS"
+DETAIL_ALLOW = "GET, PUT, PATCH, DELETE, HEAD, OPTIONS"
+NOT_FOUND = {"detail": "No Data matches the given query."}
+
+_sync_collection = DataListCreateView.as_view()
+_sync_detail = DataRetrieveUpdateDestroyView.as_view()
+_renderer = FastJSONRenderer()
+
+
+def _wants_json(request) -> bool:
+    # 與 DRF 的內容協商結果一致時才自行處理；有疑慮的一律交回 DRF
+    if "format" in request.GET:
+        return False
+    accept = request.headers.get("Accept", "")
+    if "text/html" in accept or "indent" in accept:
+        return False
+    return not accept or "application/json" in accept or "*/*" in accept
+
+
+def _json_payload(request):
+    """
+    回傳解析後的 JSON；非 JSON 或解析失敗時回傳 None，由 DRF 產生一致的錯誤訊息。
+    """
+    body = request.body
+    if not body:
+        return {}
+    if request.content_type != "application/json":
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
+
+
+def _finalize(response, allow: str):
+    response["Allow"] = allow
+    patch_vary_headers(response, ("Accept",))
+    return response
+
+
+def _json(data, allow: str, status: int = 200) -> HttpResponse:
+    content = _renderer.render(data, "application/json", {})
+    return _finalize(HttpResponse(content, content_type="application/json", status=status), allow)
+
+
+async def _delegate(view, request, *args, **kwargs):
+    return await sync_to_async(view)(request, *args, **kwargs)
+
+
+async def _save(instance):
+    if coalescing_enabled():
+        await WRITES.arun(instance.save)
+    else:
+        await instance.asave()
+
+
+async def _delete(queryset) -> int:
+    if coalescing_enabled():
+        deleted, _ = await WRITES.arun(queryset.delete)
+    else:
+        deleted, _ = await queryset.adelete()
+    return deleted
+
+
+def _render_list(request, version: int | None) -> HttpResponse:
+    view = DataListCreateView()
+    view.setup(Request(request))
+    view.format_kwarg = None
+    page = view._fast_list()
+    response = HttpResponse(_renderer.render(page.data, "application/json", {}), content_type="application/json")
+    for name in ("Link", "X-Next-Cursor"):
+        if page.has_header(name):
+            response[name] = page[name]
+    if version is not None:
+        response["X-Data-Version"] = str(version)
+    return response
+
+
+@condition(etag_func=list_etag, last_modified_func=list_last_modified)
+async def _list(request):
+    state = await atable_state(request)
+    if state[0] is None:
+        # 沒有變更 trigger 時版本號不會前進，不能快取
+        return _finalize(await sync_to_async(_render_list)(request, None), COLLECTION_ALLOW)
+    key = LIST_CACHE.key(request, state)
+    response = LIST_CACHE.get(key)
+    if response is None:
+        response = await sync_to_async(_render_list)(request, state[0])
+        LIST_CACHE.put(key, response)
+    return _finalize(response, COLLECTION_ALLOW)
+
+
+async def _create(request, payload):
+    serializer = DataSerializer(data=payload)
+    if not serializer.is_valid():
+        return _json(serializer.errors, COLLECTION_ALLOW, status=400)
+    instance = Data(**serializer.validated_data)
+    await _save(instance)
+    await NOTIFIER.apoke()
+    return _json(DataSerializer(instance).data, COLLECTION_ALLOW, status=201)
+
+
+@condition(etag_func=detail_etag, last_modified_func=detail_last_modified)
+async def _retrieve(request, pk):
+    row = await Data.objects.filter(pk=pk).values_list(*LIST_FIELDS).afirst()
+    if row is None:
+        return _json(NOT_FOUND, DETAIL_ALLOW, status=404)
+    return _json(rows_to_data([row])[0], DETAIL_ALLOW)
+
+
+async def _update(request, pk, payload):
+    instance = await Data.objects.filter(pk=pk).afirst()
+    if instance is None:
+        return _json(NOT_FOUND, DETAIL_ALLOW, status=404)
+    serializer = DataSerializer(instance, data=payload, partial=request.method == "PATCH")
+    if not serializer.is_valid():
+        return _json(serializer.errors, DETAIL_ALLOW, status=400)
+    for name, value in serializer.validated_data.items():
+        setattr(instance, name, value)
+    await _save(instance)
+    await NOTIFIER.apoke()
+    return _json(DataSerializer(instance).data, DETAIL_ALLOW)
+
+
+async def _destroy(request, pk):
+    if not await _delete(Data.objects.filter(pk=pk)):
+        return _json(NOT_FOUND, DETAIL_ALLOW, status=404)
+    await NOTIFIER.apoke()
+    response = HttpResponse(status=204)
+    del response["Content-Type"]
+    return _finalize(response, DETAIL_ALLOW)
+
+
+async def data_collection(request):
+    if _wants_json(request):
+        if request.method in ("GET", "HEAD") and fast_path_enabled():
+            await atable_state(request)
+            try:
+                return await _list(request)
+            except APIException as exc:
+                # 例如無效的 ?cursor= (NotFound)；與 DRF exception handler 的回應相同，也不帶 ETag
+                return _json({"detail": exc.detail}, COLLECTION_ALLOW, status=exc.status_code)
+        if request.method == "POST" and (payload := _json_payload(request)) is not None:
+            return await _create(request, payload)
+    return await _delegate(_sync_collection, request)
+
+
+async def data_detail(request, pk):
+    if _wants_json(request):
+        if request.method in ("GET", "HEAD"):
+            await arow_state(request, pk)
+            return await _retrieve(request, pk)
+        if request.method in ("PUT", "PATCH") and (payload := _json_payload(request)) is not None:
+            return await _update(request, pk, payload)
+        if request.method == "DELETE":
+            return await _destroy(request, pk)
+    return await _delegate(_sync_detail, request, pk=pk)
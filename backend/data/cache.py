@@ -0,0 +1,197 @@
+# data/cache.py
+"""
+/data/ 的條件式 GET 與回應快取。
+
+- 版本號取自 DataChange (每次寫入由 trigger 遞增，跨 worker 一致)：列表用整張表的最新版本，
+  單筆用該列最後一次變更的版本。ETag / Last-Modified 由此產生，客戶端帶 If-None-Match /
+  If-Modified-Since 時直接回 304，不查資料也不序列化。
+- ResponseCache：以 (版本號, 變更時間, 路徑與查詢參數, Accept) 為 key 的 LRU，限制總位元組數；
+  版本號前進後舊項目不會再被命中，寫入新版本時一併清掉。每個 process 各自一份。
+- trigger 只在 SQLite 上建立；其他資料庫的版本號不會前進，此時 table_state 回傳 (None, None)，
+  不產生 ETag / Last-Modified 也不使用回應快取，每次都查詢最新資料。
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.http import HttpResponse
+
+from .models import DataChange
+
+CACHE_MAX_BYTES = int(os.getenv("DATA_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CACHE_MAX_ENTRIES = int(os.getenv("DATA_CACHE_MAX_ENTRIES", "1024"))
+CACHED_HEADERS = ("Content-Type", "Link", "X-Next-Cursor", "X-Data-Version")
+CHANGE_TRIGGER = "data_datachange_ai"
+UNTRACKED = (None, None)
+
+_TRACKED: set[str] = set()
+
+
+def versions_tracked(using: str = "default") -> bool:
+    """
+    DataChange 是否由 migration 0006 的 trigger 維護；找到後記住，之後不再查詢。
+    """
+    if using in _TRACKED:
+        return True
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = %s", [CHANGE_TRIGGER])
+        found = cursor.fetchone() is not None
+    if found:
+        _TRACKED.add(using)
+    return found
+
+
+async def aversions_tracked(using: str = "default") -> bool:
+    if using in _TRACKED:
+        return True
+    return await sync_to_async(versions_tracked)(using)
+
+
+def table_state(request) -> tuple[int | None, object]:
+    """
+    整張表的 (版本號, 最後變更時間)；同一個請求內只查一次。沒有 trigger 時為 UNTRACKED。
+    """
+    state = getattr(request, "_data_table_state", None)
+    if state is None and not versions_tracked():
+        state = request._data_table_state = UNTRACKED
+    if state is None:
+        row = DataChange.objects.order_by("-id").values_list("id", "changed_at").first()
+        state = row or (0, None)
+        request._data_table_state = state
+    return state
+
+
+def row_state(request, pk) -> tuple[int | None, object]:
+    """
+    單筆資料的 (版本號, 最後變更時間)；沒有任何變更紀錄時為 (None, None)。
+    """
+    state = getattr(request, "_data_row_state", None)
+    if state is None and not versions_tracked():
+        state = request._data_row_state = UNTRACKED
+    if state is None:
+        row = DataChange.objects.filter(data_id=pk).order_by("-id").values_list("id", "changed_at").first()
+        state = row or (None, None)
+        request._data_row_state = state
+    return state
+
+
+async def atable_state(request) -> tuple[int | None, object]:
+    """
+    table_state 的 async 版本；結果同樣存在 request 上，之後的 list_etag 等不會再查詢。
+    """
+    state = getattr(request, "_data_table_state", None)
+    if state is None and not await aversions_tracked():
+        state = request._data_table_state = UNTRACKED
+    if state is None:
+        row = await DataChange.objects.order_by("-id").values_list("id", "changed_at").afirst()
+        state = request._data_table_state = row or (0, None)
+    return state
+
+
+async def arow_state(request, pk) -> tuple[int | None, object]:
+    state = getattr(request, "_data_row_state", None)
+    if state is None and not await aversions_tracked():
+        state = request._data_row_state = UNTRACKED
+    if state is None:
+        row = await DataChange.objects.filter(data_id=pk).order_by("-id").values_list("id", "changed_at").afirst()
+        state = request._data_row_state = row or (None, None)
+    return state
+
+
+def _representation(request) -> str:
+    # 同一版本下，不同查詢參數或 Accept 是不同的表示，需要不同的 ETag
+    raw = f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}"
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+def list_etag(request, *args, **kwargs) -> str | None:
+    version = table_state(request)[0]
+    return None if version is None else f"{version}-{_representation(request)}"
+
+
+def list_last_modified(request, *args, **kwargs):
+    return table_state(request)[1]
+
+
+def detail_etag(request, pk, *args, **kwargs) -> str | None:
+    version = row_state(request, pk)[0]
+    return None if version is None else f"{version}-{_representation(request)}"
+
+
+def detail_last_modified(request, pk, *args, **kwargs):
+    return row_state(request, pk)[1]
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.version = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, tuple[bytes, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(request, state: tuple[int, object]) -> tuple:
+        # 帶上變更時間：資料庫被重建或還原使版本號重複時也不會誤用舊內容
+        version, changed_at = state
+        return (version, changed_at, request.get_full_path(), request.META.get("HTTP_ACCEPT", ""))
+
+    def get(self, key: tuple) -> HttpResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        content, headers = entry
+        response = HttpResponse(content)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    def put(self, key: tuple, response) -> None:
+        if response.status_code != 200 or response.streaming:
+            return
+        content = response.content
+        # 單一回應超過上限的 1/8 不快取，避免一次擠掉所有項目
+        if len(content) * 8 > self.max_bytes:
+            return
+        headers = {name: response[name] for name in CACHED_HEADERS if response.has_header(name)}
+        version = key[0]
+        with self._lock:
+            if version < self.version:
+                return
+            if version > self.version:
+                self._entries.clear()
+                self.size = 0
+                self.version = version
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[0])
+            self._entries[key] = (content, headers)
+            self.size += len(content)
+            while self._entries and (self.size > self.max_bytes or len(self._entries) > self.max_entries):
+                _, (evicted, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.version = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+LIST_CACHE = ResponseCache()
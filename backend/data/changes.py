@@ -0,0 +1,164 @@
+# data/changes.py
+"""
+Data 的增量同步：以 DataChange.id 作為版本號，?since=<version> 只回傳之後變動的資料列，
+刪除以 tombstone 表示。
+
+ChangeNotifier 讓同一個 process 內的所有 SSE 訂閱者共用一個輪詢執行緒
+(只查 MAX(id)，且只在有人等待時才查)；寫入 API 於 commit 後直接 poke，不必等下一輪。
+資料庫負擔因此取決於變更頻率，而非訂閱者數量乘上資料表大小。
+"""
+import asyncio
+import os
+import threading
+
+from django.db import close_old_connections, connection
+
+from .models import Data, DataChange
+from .serializers import DataSerializer
+
+DEFAULT_CHANGE_LIMIT = 500
+MAX_CHANGE_LIMIT = 5000
+POLL_INTERVAL = float(os.getenv("DATA_CHANGE_POLL", "0.5"))
+
+
+def current_version() -> int:
+    version = DataChange.objects.order_by("-id").values_list("id", flat=True).first()
+    return version or 0
+
+
+async def acurrent_version() -> int:
+    version = await DataChange.objects.order_by("-id").values_list("id", flat=True).afirst()
+    return version or 0
+
+
+def changes_since(since: int, limit: int = DEFAULT_CHANGE_LIMIT) -> dict:
+    """
+    回傳 {"version", "has_more", "changes"}；version 為本批最後一筆的版本號，
+    下次以 ?since=<version> 接續。create / update 附上目前的資料列，delete 的 data 為 None。
+    """
+    rows = list(
+        DataChange.objects.filter(id__gt=since).order_by("id").values_list("id", "data_id", "op")[: limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    live = Data.objects.in_bulk([data_id for _, data_id, op in rows if op != DataChange.DELETE])
+    payloads = dict(zip(live, DataSerializer(live.values(), many=True).data))
+    changes = []
+    for version, data_id, op in rows:
+        data = payloads.get(data_id)
+        if data is None:
+            # 讀取期間被刪除：下一批會收到對應的 tombstone
+            op = DataChange.DELETE
+        changes.append({"version": version, "op": op, "id": data_id, "data": data})
+    return {
+        "version": rows[-1][0] if rows else since,
+        "has_more": has_more,
+        "changes": changes,
+    }
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ChangeNotifier:
+    """
+    追蹤最新版本號並喚醒等待者；輪詢執行緒也能看到其他 worker 寫入的變更。
+    """
+
+    def __init__(self, interval: float = POLL_INTERVAL):
+        self.interval = interval
+        self.version: int | None = None
+        self._cond = threading.Condition()
+        self._waiting = 0
+        self._async_waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+        self._poller_pid = None
+
+    def poke(self):
+        """
+        重新讀取版本號；寫入 API 以 transaction.on_commit 呼叫。
+        """
+        self._publish(current_version())
+
+    async def apoke(self):
+        self._publish(await acurrent_version())
+
+    def _publish(self, version: int):
+        with self._cond:
+            if self.version is not None and version <= self.version:
+                return
+            self.version = version
+            self._cond.notify_all()
+            waiters, self._async_waiters = self._async_waiters, []
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_wake, future)
+            except RuntimeError:
+                pass  # event loop 已關閉
+
+    def _ensure_poller(self):
+        pid = os.getpid()
+        if self._poller_pid == pid:
+            return
+        with self._cond:
+            if self._poller_pid == pid:
+                return
+            # fork 後背景執行緒不會被繼承，依 pid 重新啟動
+            self._poller_pid = pid
+        thread = threading.Thread(target=self._poll_loop, name="data-changes", daemon=True)
+        thread.start()
+
+    def _poll_loop(self):
+        event = threading.Event()
+        while True:
+            event.wait(self.interval)
+            with self._cond:
+                idle = not self._waiting and not self._async_waiters
+            if idle:
+                continue
+            try:
+                close_old_connections()
+                self._publish(current_version())
+            except Exception:
+                connection.close()
+
+    def wait(self, after: int, timeout: float | None = None) -> int:
+        """
+        等到版本號大於 after 或逾時，回傳目前已知的版本號。
+        """
+        self._ensure_poller()
+        with self._cond:
+            self._waiting += 1
+            try:
+                self._cond.wait_for(lambda: (self.version or 0) > after, timeout)
+            finally:
+                self._waiting -= 1
+            return self.version or 0
+
+    async def wait_async(self, after: int, timeout: float | None = None) -> int:
+        """
+        wait 的 asyncio 版本；由 _publish 透過 call_soon_threadsafe 喚醒。
+        """
+        self._ensure_poller()
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            with self._cond:
+                if (self.version or 0) > after:
+                    return self.version
+                future = loop.create_future()
+                waiter = (loop, future)
+                self._async_waiters.append(waiter)
+            remaining = None if deadline is None else deadline - loop.time()
+            try:
+                await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                return self.version or 0
+            finally:
+                with self._cond:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+
+NOTIFIER = ChangeNotifier()
@@ -0,0 +1,76 @@
+# data/listing.py
+"""
+GET /data/ 的快速讀取路徑：以 values_list 取出 tuple 直接組成回應，不建立 Data 物件、
+也不逐欄位跑 DataSerializer；有安裝 orjson 時以其輸出 JSON。
+
+輸出與 DataSerializer + JSONRenderer 逐位元組相同 (含 datetime 格式與 \\u2028 / \\u2029 跳脫)，
+由 data.tests 的比對測試保證；DATETIME_FORMAT 不是 ISO 8601 時退回原本的 serializer。
+"""
+from datetime import UTC
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import ISO_8601, api_settings
+
+try:
+    import orjson
+except ImportError:  # orjson 為選用套件
+    orjson = None
+
+LIST_FIELDS = ("id", "text", "created_at", "updated_at")
+
+
+def fast_path_enabled() -> bool:
+    return (api_settings.DATETIME_FORMAT or "").lower() == ISO_8601
+
+
+def _datetime(value, tz):
+    # 與 rest_framework.fields.DateTimeField.to_representation 相同
+    if not value:
+        return None
+    if tz is not None:
+        value = value.astimezone(tz) if timezone.is_aware(value) else timezone.make_aware(value, tz)
+    elif timezone.is_aware(value):
+        value = timezone.make_naive(value, UTC)
+    text = value.isoformat()
+    if text.endswith("+00:00"):
+        text = text[:-6] + "Z"
+    return text
+
+
+def rows_to_data(rows) -> list[dict]:
+    """
+    rows 為 values_list(*LIST_FIELDS, ...) 的結果；多出的欄位 (例如排序用的 search_rank) 會被忽略。
+    """
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+    return [
+        {
+            "id": row[0],
+            "text": row[1],
+            "created_at": _datetime(row[2], tz),
+            "updated_at": _datetime(row[3], tz),
+        }
+        for row in rows
+    ]
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    compact、非 ASCII 跳脫的一般情況改用 orjson；其餘 (indent、ensure_ascii、orjson 不支援的型別) 交回 JSONRenderer。
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace("\u2028".encode(), b"\\u2028").replace("\u2029".encode(), b"\\u2029")
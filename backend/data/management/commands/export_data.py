@@ -0,0 +1,31 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from data.transfer import EXPORT_CHUNK_SIZE, FORMATS, export_iter, guess_format
+
+
+class Command(BaseCommand):
+    help = "以 NDJSON 或 CSV 串流匯出 Data (分批讀取，記憶體用量與資料量無關)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", nargs="?", default="-", help="輸出檔案，- 為 stdout")
+        parser.add_argument("--fmt", choices=sorted(FORMATS), help="預設依副檔名判斷，否則為 ndjson")
+        parser.add_argument("--chunk-size", type=int, default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, output, fmt, chunk_size, **options):
+        fmt = fmt or guess_format(output) or "ndjson"
+        if chunk_size < 1:
+            raise CommandError("--chunk-size must be positive")
+        try:
+            target = sys.stdout.buffer if output == "-" else open(output, "wb")
+        except OSError as exc:
+            raise CommandError(str(exc))
+        try:
+            for chunk in export_iter(fmt, chunk_size=chunk_size):
+                target.write(chunk)
+        finally:
+            if target is not sys.stdout.buffer:
+                target.close()
+            else:
+                target.flush()
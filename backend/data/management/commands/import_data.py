@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from data.transfer import FORMATS, IMPORT_BATCH_SIZE, ImportFormatError, guess_format, import_rows
+
+
+class Command(BaseCommand):
+    help = "逐行匯入 NDJSON 或 CSV 為新的 Data 列，每批一個 transaction"
+
+    def add_arguments(self, parser):
+        parser.add_argument("input", help="輸入檔案，- 為 stdin")
+        parser.add_argument("--fmt", choices=sorted(FORMATS), help="預設依副檔名判斷")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, input, fmt, batch_size, **options):
+        fmt = fmt or guess_format(input)
+        if fmt is None:
+            raise CommandError("cannot infer the format from the file name; pass --fmt")
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+        try:
+            source = sys.stdin if input == "-" else open(input, encoding="utf-8", newline="")
+        except OSError as exc:
+            raise CommandError(str(exc))
+        try:
+            result = import_rows(fmt, source, batch_size=batch_size)
+        except ImportFormatError as exc:
+            raise CommandError(str(exc))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+        for error in result["errors"]:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        self.stdout.write(f"created {result['created']}, failed {result['failed']}")
@@ -0,0 +1,54 @@
+from django.db import migrations, transaction
+from django.db.utils import OperationalError
+
+FTS_SQL = [
+    "CREATE VIRTUAL TABLE data_data_fts USING fts5("
+    " text, content='data_data', content_rowid='id', tokenize='trigram case_sensitive 0')",
+    "CREATE TRIGGER data_data_fts_ai AFTER INSERT ON data_data BEGIN"
+    " INSERT INTO data_data_fts (rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER data_data_fts_ad AFTER DELETE ON data_data BEGIN"
+    " INSERT INTO data_data_fts (data_data_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER data_data_fts_au AFTER UPDATE OF text ON data_data BEGIN"
+    " INSERT INTO data_data_fts (data_data_fts, rowid, text) VALUES ('delete', old.id, old.text);"
+    " INSERT INTO data_data_fts (rowid, text) VALUES (new.id, new.text); END",
+    "INSERT INTO data_data_fts (data_data_fts) VALUES ('rebuild')",
+]
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS data_data_fts_ai",
+    "DROP TRIGGER IF EXISTS data_data_fts_ad",
+    "DROP TRIGGER IF EXISTS data_data_fts_au",
+    "DROP TABLE IF EXISTS data_data_fts",
+]
+
+
+def create_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    try:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            for statement in FTS_SQL:
+                cursor.execute(statement)
+    except OperationalError:
+        # SQLite 未編入 FTS5 或版本早於 3.34 (無 trigram)：搜尋退回 icontains
+        pass
+
+
+def drop_fts(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for statement in DROP_SQL:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0004_alter_data_text'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
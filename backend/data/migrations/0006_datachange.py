@@ -0,0 +1,66 @@
+# Generated by Django 6.1.2 on 2026-10-18 02:32
+
+from django.db import migrations, models
+
+NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+TRIGGER_SQL = [
+    # 每個 data_id 只保留最新一筆變更，表格大小與資料筆數 (含 tombstone) 同級
+    "CREATE TRIGGER data_datachange_ai AFTER INSERT ON data_data BEGIN"
+    " DELETE FROM data_datachange WHERE data_id = new.id;"
+    f" INSERT INTO data_datachange (data_id, op, changed_at) VALUES (new.id, 'create', {NOW}); END",
+    "CREATE TRIGGER data_datachange_au AFTER UPDATE ON data_data BEGIN"
+    " DELETE FROM data_datachange WHERE data_id = new.id;"
+    f" INSERT INTO data_datachange (data_id, op, changed_at) VALUES (new.id, 'update', {NOW}); END",
+    "CREATE TRIGGER data_datachange_ad AFTER DELETE ON data_data BEGIN"
+    " DELETE FROM data_datachange WHERE data_id = old.id;"
+    f" INSERT INTO data_datachange (data_id, op, changed_at) VALUES (old.id, 'delete', {NOW}); END",
+    # 既有資料視為一次建立，?since=0 即可取得完整快照
+    "INSERT INTO data_datachange (data_id, op, changed_at)"
+    " SELECT id, 'create', updated_at FROM data_data ORDER BY id",
+]
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS data_datachange_ai",
+    "DROP TRIGGER IF EXISTS data_datachange_au",
+    "DROP TRIGGER IF EXISTS data_datachange_ad",
+]
+
+
+def create_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for statement in TRIGGER_SQL:
+            cursor.execute(statement)
+
+
+def drop_triggers(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for statement in DROP_SQL:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data', '0005_data_text_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_id', models.BigIntegerField(db_index=True)),
+                ('op', models.CharField(choices=[('create', 'create'), ('update', 'update'), ('delete', 'delete')], max_length=6)),
+                ('changed_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
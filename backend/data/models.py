@@ -10,3 +10,25 @@ class Data(models.Model):
 
     def __str__(self):
         return f"Data<{self.id}>"
+
+
+class DataChange(models.Model):
+    """
+    Data 的變更紀錄，由 SQLite trigger 寫入 (見 migration 0006)；id 即單調遞增的版本號。
+    每個 data_id 只保留最新一筆，刪除時留下 op="delete" 的 tombstone。
+    """
+
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+    OP_CHOICES = [(CREATE, "create"), (UPDATE, "update"), (DELETE, "delete")]
+
+    data_id = models.BigIntegerField(db_index=True)
+    op = models.CharField(max_length=6, choices=OP_CHOICES)
+    changed_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"DataChange<{self.id} {self.op} {self.data_id}>"
@@ -0,0 +1,57 @@
+# data/pagination.py
+"""
+/data/ 的 keyset (cursor) 分頁：以 WHERE id > ? 取下一頁，不使用 OFFSET，
+每次請求的成本與資料表大小無關。
+
+回應本體維持原本的陣列格式；下一頁 / 上一頁以 Link header (rel="next" / rel="prev")
+與 X-Next-Cursor 提供，舊的呼叫端不需修改即可取得第一頁。
+"""
+import os
+from urllib.parse import parse_qs, urlparse
+
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DATA_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("DATA_MAX_PAGE_SIZE", "1000"))
+# ?ordering= 可用的值；cursor 以第一個欄位定位，後面的 id 讓同值時順序穩定
+ORDERINGS = {
+    "id": ("id",),
+    "updated_at": ("updated_at", "id"),
+    "-updated_at": ("-updated_at", "-id"),
+}
+RELEVANCE_ORDERING = ("search_rank", "id")
+
+
+class DataCursorPagination(CursorPagination):
+    page_size = DEFAULT_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = MAX_PAGE_SIZE
+    ordering = ORDERINGS["id"]
+
+    def get_ordering(self, request, queryset, view):
+        if "search_rank" in queryset.query.annotations:
+            return RELEVANCE_ORDERING
+        return ORDERINGS.get(request.query_params.get("ordering"), self.ordering)
+
+    def _cursor_of(self, link: str | None) -> str | None:
+        if not link:
+            return None
+        return parse_qs(urlparse(link).query).get(self.cursor_query_param, [None])[0]
+
+    def get_paginated_response(self, data):
+        headers = {}
+        next_link = self.get_next_link()
+        previous_link = self.get_previous_link()
+        links = []
+        if next_link:
+            links.append(f'<{next_link}>; rel="next"')
+            headers["X-Next-Cursor"] = self._cursor_of(next_link)
+        if previous_link:
+            links.append(f'<{previous_link}>; rel="prev"')
+        if links:
+            headers["Link"] = ", ".join(links)
+        return Response(data, headers=headers)
+
+    def get_paginated_response_schema(self, schema):
+        return schema
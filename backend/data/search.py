@@ -0,0 +1,60 @@
+# data/search.py
+"""
+/data/?search= 的全文檢索。
+
+SQLite 上由 migration 0005 建立 FTS5 trigram 索引 data_data_fts (external content 指向 data_data，
+以 trigger 同步)，子字串查詢不必再全表掃描；其他資料庫、缺少 FTS5 或關鍵字少於 3 個字元時
+退回原本的 icontains。
+"""
+from django.db import connections
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "data_data_fts"
+TRIGRAM_MIN_CHARS = 3
+
+_AVAILABLE: set[str] = set()
+
+
+def fts_available(using: str = "default") -> bool:
+    if using in _AVAILABLE:
+        return True
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        found = cursor.fetchone() is not None
+    if found:
+        _AVAILABLE.add(using)
+    return found
+
+
+def match_expression(keyword: str) -> str:
+    """
+    以 FTS5 phrase 包住關鍵字，trigram 下即為不分大小寫的子字串比對。
+    """
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+def search(queryset, keyword: str, rank: bool = False):
+    """
+    依 keyword 篩選 queryset；rank=True 時依 bm25 相關度排序 (越相關越前面)，否則保留原排序。
+    """
+    using = queryset.db
+    if len(keyword) < TRIGRAM_MIN_CHARS or not fts_available(using):
+        return queryset.filter(text__icontains=keyword)
+
+    table = queryset.model._meta.db_table
+    expression = match_expression(keyword)
+    queryset = queryset.filter(
+        id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [expression])
+    )
+    if rank:
+        score = RawSQL(
+            f'SELECT bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+            [expression],
+            output_field=FloatField(),
+        )
+        queryset = queryset.annotate(search_rank=score).order_by("search_rank", "id")
+    return queryset
@@ -1,7 +1,14 @@
+import os
+
+from django.db import connection, transaction
+from django.utils import timezone
 from rest_framework import serializers
 
 from .models import Data
 
+BULK_MAX_ITEMS = int(os.getenv("DATA_BULK_MAX_ITEMS", "50000"))
+BULK_BATCH_SIZE = 1000
+
 
 class DataSerializer(serializers.ModelSerializer):
     text = serializers.CharField(max_length=1024, trim_whitespace=True, allow_blank=False, required=True)
@@ -18,3 +25,103 @@ class DataSerializer(serializers.ModelSerializer):
         if not trimmed:
             raise serializers.ValidationError("text is required")
         return trimmed
+
+
+class DataBulkUpdateItemSerializer(DataSerializer):
+    id = serializers.IntegerField(min_value=1)
+
+    class Meta(DataSerializer.Meta):
+        fields = ["id", "text"]
+        read_only_fields = []
+
+
+class DataBulkSerializer(serializers.Serializer):
+    """
+    POST /data/bulk/：{"create": [{text}], "update": [{id, text}], "delete": [id]}
+    逐筆沿用 DataSerializer 的驗證；任一筆有誤即整批不套用，錯誤依位置回傳。
+    """
+
+    def get_fields(self):
+        # 欄位名與 Serializer.create / update 方法同名，不能宣告成類別屬性
+        return {
+            "create": DataSerializer(many=True, required=False),
+            "update": DataBulkUpdateItemSerializer(many=True, required=False),
+            "delete": serializers.ListField(child=serializers.IntegerField(min_value=1), required=False),
+        }
+
+    def validate(self, attrs):
+        total = sum(len(attrs.get(key, [])) for key in ("create", "update", "delete"))
+        if total == 0:
+            raise serializers.ValidationError("at least one of create, update or delete is required")
+        if total > BULK_MAX_ITEMS:
+            raise serializers.ValidationError(f"at most {BULK_MAX_ITEMS} items per request")
+
+        update_ids = [item["id"] for item in attrs.get("update", [])]
+        delete_ids = attrs.get("delete", [])
+        errors = {}
+        if len(set(update_ids)) != len(update_ids):
+            errors["update"] = ["duplicate id"]
+        if len(set(delete_ids)) != len(delete_ids):
+            errors["delete"] = ["duplicate id"]
+        if set(update_ids) & set(delete_ids):
+            errors["delete"] = ["id appears in both update and delete"]
+        if errors:
+            raise serializers.ValidationError(errors)
+        self._check_exists(Data.objects, update_ids, delete_ids)
+        return attrs
+
+    @staticmethod
+    def _check_exists(queryset, update_ids: list[int], delete_ids: list[int]):
+        existing = set(queryset.in_bulk(update_ids + delete_ids))
+        errors = {}
+        for key, ids in (("update", update_ids), ("delete", delete_ids)):
+            missing = [pk for pk in ids if pk not in existing]
+            if missing:
+                errors[key] = [f"not found: {pk}" for pk in missing]
+        if errors:
+            raise serializers.ValidationError(errors)
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            # validate() 在 transaction 之外；合併寫入時實際執行較晚，期間可能被其他請求刪除，
+            # 在同一個 transaction 內鎖定後再確認一次，缺少時整批不套用並回 400
+            self._check_exists(
+                Data.objects.select_for_update(),
+                [item["id"] for item in validated_data.get("update", [])],
+                validated_data.get("delete", []),
+            )
+            created = Data.objects.bulk_create(
+                [Data(text=item["text"]) for item in validated_data.get("create", [])],
+                batch_size=BULK_BATCH_SIZE,
+            )
+
+            updates = validated_data.get("update", [])
+            updated = []
+            if updates:
+                now = timezone.now()
+                # bulk_update 會為每一列組 CASE WHEN，上萬列時 Python 端成本遠高於 SQL；
+                # 改用同一條 UPDATE 的 executemany。updated_at 不會自動帶入，需自行設定
+                meta = Data._meta
+                stamp = meta.get_field("updated_at").get_db_prep_value(now, connection)
+                qn = connection.ops.quote_name
+                with connection.cursor() as cursor:
+                    cursor.executemany(
+                        f"UPDATE {qn(meta.db_table)} SET {qn('text')} = %s, {qn('updated_at')} = %s"
+                        f" WHERE {qn('id')} = %s",
+                        [(item["text"], stamp, item["id"]) for item in updates],
+                    )
+                rows = Data.objects.in_bulk([item["id"] for item in updates])
+                updated = [rows[item["id"]] for item in updates]
+
+            deleted = validated_data.get("delete", [])
+            step = connection.ops.bulk_batch_size(["id"], deleted) or len(deleted)
+            for start in range(0, len(deleted), step):
+                Data.objects.filter(id__in=deleted[start:start + step]).delete()
+        return {"created": created, "updated": updated, "deleted": deleted}
+
+    def to_representation(self, instance):
+        return {
+            "created": DataSerializer(instance["created"], many=True).data,
+            "updated": DataSerializer(instance["updated"], many=True).data,
+            "deleted": instance["deleted"],
+        }
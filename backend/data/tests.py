@@ -1,8 +1,35 @@
-from django.test import TestCase
+import asyncio
+import csv
+import io
+import json
+import os
+import tempfile
+import threading
+from importlib import import_module
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 
+from . import async_views
+from .cache import LIST_CACHE, ResponseCache
+from .changes import ChangeNotifier
 from .models import Data
+from .pagination import DataCursorPagination
+from .serializers import DataBulkSerializer, DataSerializer
+from .search import FTS_TABLE, fts_available
+from .transfer import IMPORT_BATCH_SIZE, export_iter, import_rows
+from .views import _aiter_sync
+from .writes import WriteCoalescer
 
 
 class DataCollectionTests(TestCase):
@@ -85,3 +112,706 @@ class DataMutationApiTests(APITestCase):
         resp = self.client.delete(reverse("data-detail", args=[item.id]))
         self.assertEqual(resp.status_code, 204)
         self.assertFalse(Data.objects.filter(id=item.id).exists())
+
+
+class DataFullTextSearchTests(TestCase):
+    def setUp(self):
+        Data.objects.bulk_create([
+            Data(text="camera stream settings"),
+            Data(text="Streaming over RTSP, stream stream"),
+            Data(text="plain note"),
+        ])
+
+    def _search(self, **params):
+        resp = self.client.get(reverse("data-collection"), params)
+        self.assertEqual(resp.status_code, 200)
+        return [item["text"] for item in resp.json()]
+
+    def test_index_is_created_on_sqlite(self):
+        self.assertTrue(fts_available())
+
+    def test_substring_search_uses_index_and_matches_icontains(self):
+        with CaptureQueriesContext(connection) as queries:
+            texts = self._search(search="TREAM")
+        self.assertEqual(texts, ["camera stream settings", "Streaming over RTSP, stream stream"])
+        self.assertTrue(any(FTS_TABLE in query["sql"] for query in queries.captured_queries))
+
+    def test_index_follows_updates_and_deletes(self):
+        item = Data.objects.get(text="plain note")
+        item.text = "plain streamer"
+        item.save()
+        self.assertIn("plain streamer", self._search(search="stream"))
+        Data.objects.filter(text__startswith="camera").delete()
+        self.assertNotIn("camera stream settings", self._search(search="stream"))
+        self.assertEqual(self._search(search="note"), [])
+
+    def test_short_keyword_falls_back_to_icontains(self):
+        self.assertEqual(self._search(search="pl"), ["plain note"])
+
+    def test_quotes_in_keyword_are_literal(self):
+        Data.objects.create(text='say "hello" there')
+        self.assertEqual(self._search(search='"hello"'), ['say "hello" there'])
+
+    def test_relevance_ordering(self):
+        texts = self._search(search="stream", ordering="relevance")
+        self.assertEqual(texts[0], "Streaming over RTSP, stream stream")
+        self.assertEqual(len(texts), 2)
+
+
+class DataCursorPaginationTests(TestCase):
+    def setUp(self):
+        Data.objects.bulk_create([Data(text=f"item {i:02d}") for i in range(25)])
+
+    def _pages(self, **params):
+        url = reverse("data-collection")
+        pages = []
+        while url:
+            resp = self.client.get(url, params)
+            self.assertEqual(resp.status_code, 200)
+            pages.append([item["text"] for item in resp.json()])
+            cursor = resp.headers.get("X-Next-Cursor")
+            url = reverse("data-collection") if cursor else None
+            params = {**params, "cursor": cursor}
+        return pages
+
+    def test_pages_follow_next_cursor_without_offset(self):
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse("data-collection"), {"page_size": 10})
+        self.assertNotIn("OFFSET", queries.captured_queries[-1]["sql"])
+        self.assertIn('rel="next"', resp.headers["Link"])
+
+        pages = self._pages(page_size=10)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual(sum(pages, []), [f"item {i:02d}" for i in range(25)])
+
+    def test_cursor_is_stable_when_rows_are_inserted(self):
+        first = self.client.get(reverse("data-collection"), {"page_size": 10})
+        Data.objects.create(text="item new")
+        second = self.client.get(
+            reverse("data-collection"), {"page_size": 10, "cursor": first.headers["X-Next-Cursor"]}
+        )
+        self.assertEqual(second.json()[0]["text"], "item 10")
+
+    def test_page_size_is_capped(self):
+        with patch.object(DataCursorPagination, "max_page_size", 5):
+            resp = self.client.get(reverse("data-collection"), {"page_size": 10_000})
+        self.assertEqual(len(resp.json()), 5)
+
+    def test_search_results_are_paginated(self):
+        pages = self._pages(search="item 1", page_size=4)
+        self.assertEqual(sum(pages, []), [f"item {i:02d}" for i in range(10, 20)])
+
+    def test_relevance_results_are_paginated(self):
+        Data.objects.create(text="item 1 item 1 item 1")
+        pages = self._pages(search="item 1", ordering="relevance", page_size=4)
+        texts = sum(pages, [])
+        self.assertEqual(texts[0], "item 1 item 1 item 1")
+        self.assertEqual(len(texts), 11)
+
+    def test_updated_at_ordering(self):
+        Data.objects.filter(text="item 03").update(text="item 03!")
+        item = Data.objects.get(text="item 03!")
+        item.save()
+        pages = self._pages(ordering="-updated_at", page_size=7)
+        self.assertEqual(pages[0][0], "item 03!")
+        self.assertEqual(len(sum(pages, [])), 25)
+
+
+class DataBulkApiTests(APITestCase):
+    def setUp(self):
+        self.keep = Data.objects.create(text="keep")
+        self.edit = Data.objects.create(text="edit me")
+        self.drop = Data.objects.create(text="drop me")
+
+    def test_bulk_applies_creates_updates_and_deletes(self):
+        resp = self.client.post(
+            reverse("data-bulk"),
+            {
+                "create": [{"text": "  new one "}, {"text": "new two"}],
+                "update": [{"id": self.edit.id, "text": " edited "}],
+                "delete": [self.drop.id],
+            },
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 200)
+        payload = resp.json()
+        self.assertEqual([item["text"] for item in payload["created"]], ["new one", "new two"])
+        self.assertTrue(all(item["id"] for item in payload["created"]))
+        self.assertEqual(payload["updated"][0]["text"], "edited")
+        self.assertEqual(payload["deleted"], [self.drop.id])
+
+        self.edit.refresh_from_db()
+        self.assertEqual(self.edit.text, "edited")
+        self.assertGreater(self.edit.updated_at, self.keep.updated_at)
+        self.assertFalse(Data.objects.filter(id=self.drop.id).exists())
+        self.assertEqual(Data.objects.count(), 4)
+
+    def test_invalid_item_rejects_whole_batch_with_positional_errors(self):
+        resp = self.client.post(
+            reverse("data-bulk"),
+            {"create": [{"text": "ok"}, {"text": "   "}], "delete": [self.drop.id]},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(list(resp.json()["create"]), ["1"])
+        self.assertIn("text", resp.json()["create"]["1"])
+        self.assertEqual(Data.objects.count(), 3)
+
+    def test_unknown_ids_are_reported(self):
+        resp = self.client.post(
+            reverse("data-bulk"),
+            {"update": [{"id": 9999, "text": "x"}], "delete": [self.keep.id, 8888]},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json(), {"update": ["not found: 9999"], "delete": ["not found: 8888"]})
+        self.assertTrue(Data.objects.filter(id=self.keep.id).exists())
+
+    def test_ids_deleted_after_validation_are_rejected(self):
+        serializer = DataBulkSerializer(
+            data={"create": [{"text": "new"}], "update": [{"id": self.edit.id, "text": "x"}], "delete": [self.drop.id]}
+        )
+        self.assertTrue(serializer.is_valid())
+        # 模擬合併寫入排隊期間被其他請求刪除
+        Data.objects.filter(id__in=[self.edit.id, self.drop.id]).delete()
+        with self.assertRaises(ValidationError) as raised:
+            serializer.save()
+        self.assertEqual(
+            raised.exception.detail,
+            {"update": [f"not found: {self.edit.id}"], "delete": [f"not found: {self.drop.id}"]},
+        )
+        self.assertEqual(list(Data.objects.values_list("text", flat=True)), ["keep"])
+
+    def test_conflicting_ids_and_empty_body_are_rejected(self):
+        resp = self.client.post(
+            reverse("data-bulk"),
+            {"update": [{"id": self.edit.id, "text": "x"}], "delete": [self.edit.id]},
+            format="json",
+        )
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("delete", resp.json())
+        resp = self.client.post(reverse("data-bulk"), {}, format="json")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_bulk_create_runs_in_constant_queries(self):
+        items = [{"text": f"row {i}"} for i in range(500)]
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.post(reverse("data-bulk"), {"create": items}, format="json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertLess(len(queries.captured_queries), 10)
+        self.assertEqual(Data.objects.filter(text__startswith="row ").count(), 500)
+        self.assertEqual(len(self.client.get(reverse("data-collection"), {"search": "row 49"}).json()), 11)
+
+
+class DataChangeFeedTests(APITestCase):
+    def _changes(self, since, **params):
+        resp = self.client.get(reverse("data-changes"), {"since": since, **params})
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_since_returns_only_later_changes_with_tombstones(self):
+        first = Data.objects.create(text="first")
+        second = Data.objects.create(text="second")
+        version = self.client.get(reverse("data-collection"))["X-Data-Version"]
+
+        self.client.put(reverse("data-detail", args=[first.id]), {"text": "first!"}, format="json")
+        self.client.delete(reverse("data-detail", args=[second.id]))
+        third = self.client.post(reverse("data-collection"), {"text": "third"}, format="json").json()
+
+        feed = self._changes(version)
+        self.assertEqual(
+            [(change["op"], change["id"]) for change in feed["changes"]],
+            [("update", first.id), ("delete", second.id), ("create", third["id"])],
+        )
+        self.assertEqual(feed["changes"][0]["data"]["text"], "first!")
+        self.assertIsNone(feed["changes"][1]["data"])
+        self.assertEqual(self._changes(feed["version"])["changes"], [])
+
+    def test_repeated_edits_collapse_to_latest(self):
+        item = Data.objects.create(text="v1")
+        for text in ("v2", "v3", "v4"):
+            item.text = text
+            item.save()
+        feed = self._changes(0)
+        self.assertEqual(len(feed["changes"]), 1)
+        self.assertEqual(feed["changes"][0]["data"]["text"], "v4")
+
+    def test_bulk_writes_are_recorded_and_paged(self):
+        self.client.post(reverse("data-bulk"), {"create": [{"text": f"b{i}"} for i in range(5)]}, format="json")
+        feed = self._changes(0, limit=3)
+        self.assertTrue(feed["has_more"])
+        rest = self._changes(feed["version"], limit=3)
+        self.assertFalse(rest["has_more"])
+        self.assertEqual(len(feed["changes"]) + len(rest["changes"]), 5)
+
+    def test_invalid_since_is_rejected(self):
+        resp = self.client.get(reverse("data-changes"), {"since": "-1"})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_stream_emits_pending_changes_as_sse(self):
+        item = Data.objects.create(text="streamed")
+        resp = self.client.get(reverse("data-changes-stream"), {"since": 0})
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        event = next(iter(resp.streaming_content)).decode()
+        resp.close()
+        header, _, data = event.partition("\ndata: ")
+        self.assertIn("event: changes", header)
+        payload = json.loads(data)
+        self.assertEqual(header.splitlines()[0], f"id: {payload['version']}")
+        self.assertEqual(payload["changes"][0]["id"], item.id)
+
+
+class ChangeNotifierTests(SimpleTestCase):
+    def test_publish_wakes_sync_and_async_waiters(self):
+        notifier = ChangeNotifier(interval=60)
+        notifier._poller_pid = os.getpid()
+        threading.Timer(0.05, notifier._publish, args=(3,)).start()
+        self.assertEqual(notifier.wait(0, timeout=2), 3)
+
+        async def wait():
+            return await notifier.wait_async(3, timeout=2)
+
+        threading.Timer(0.05, notifier._publish, args=(5,)).start()
+        self.assertEqual(asyncio.run(wait()), 5)
+        self.assertEqual(notifier.wait(5, timeout=0.01), 5)
+
+
+class DataFastListTests(TestCase):
+    TEXTS = [
+        "plain",
+        "中文 ✓ emoji 😀",
+        'quote " backslash \\ slash /',
+        "line\u2028sep\u2029para",
+        "ctrl \x00\x01\x1f\x7f tab\t nl\n",
+        "".join(map(chr, range(1024))),
+        "".join(map(chr, range(0x2000, 0x2400))),
+        "".join(map(chr, range(0x10FC00, 0x110000))),
+    ]
+
+    def setUp(self):
+        Data.objects.bulk_create([Data(text=text) for text in self.TEXTS])
+
+    def _expected(self, queryset):
+        return JSONRenderer().render(DataSerializer(queryset, many=True).data)
+
+    def test_output_matches_serializer_byte_for_byte(self):
+        resp = self.client.get(reverse("data-collection"))
+        self.assertEqual(resp.content, self._expected(Data.objects.order_by("id")))
+
+    def test_stdlib_fallback_matches_too(self):
+        with patch("data.listing.orjson", None):
+            resp = self.client.get(reverse("data-collection"))
+        self.assertEqual(resp.content, self._expected(Data.objects.order_by("id")))
+
+    def test_non_utc_timezone_matches(self):
+        with timezone.override("Asia/Taipei"):
+            resp = self.client.get(reverse("data-collection"))
+            expected = self._expected(Data.objects.order_by("id"))
+        self.assertIn(b"+08:00", resp.content)
+        self.assertEqual(resp.content, expected)
+
+    def test_paginated_and_ranked_pages_match(self):
+        resp = self.client.get(reverse("data-collection"), {"page_size": 2})
+        self.assertEqual(resp.content, self._expected(Data.objects.order_by("id")[:2]))
+        self.assertIn("X-Next-Cursor", resp.headers)
+        resp = self.client.get(reverse("data-collection"), {"search": "sep", "ordering": "relevance"})
+        self.assertEqual(resp.content, self._expected(Data.objects.filter(text__contains="sep")))
+
+    def test_skips_model_instances(self):
+        with patch.object(DataSerializer, "to_representation", side_effect=AssertionError):
+            resp = self.client.get(reverse("data-collection"))
+        self.assertEqual(resp.status_code, 200)
+
+    def test_browsable_api_still_uses_serializer(self):
+        resp = self.client.get(reverse("data-collection"), HTTP_ACCEPT="text/html")
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(b"plain", resp.content)
+
+
+class DataConditionalGetTests(TestCase):
+    def setUp(self):
+        LIST_CACHE.clear()
+        self.item = Data.objects.create(text="cached")
+
+    def test_list_etag_returns_304_until_a_write(self):
+        first = self.client.get(reverse("data-collection"))
+        etag = first["ETag"]
+        self.assertTrue(first.has_header("Last-Modified"))
+        with CaptureQueriesContext(connection) as queries:
+            resp = self.client.get(reverse("data-collection"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(len(queries.captured_queries), 1)
+
+        self.client.post(reverse("data-collection"), {"text": "more"}, content_type="application/json")
+        resp = self.client.get(reverse("data-collection"), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()), 2)
+
+    def test_etag_differs_per_query(self):
+        plain = self.client.get(reverse("data-collection"))["ETag"]
+        searched = self.client.get(reverse("data-collection"), {"search": "cac"})["ETag"]
+        self.assertNotEqual(plain, searched)
+
+    def test_repeat_list_is_served_from_cache(self):
+        first = self.client.get(reverse("data-collection"), {"page_size": 1})
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(reverse("data-collection"), {"page_size": 1})
+        self.assertEqual(len(queries.captured_queries), 1)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["X-Data-Version"], first["X-Data-Version"])
+        self.assertEqual(second["Content-Type"], first["Content-Type"])
+        self.assertEqual(second["ETag"], first["ETag"])
+
+    def test_detail_etag_tracks_the_row(self):
+        other = Data.objects.create(text="other")
+        url = reverse("data-detail", args=[self.item.id])
+        etag = self.client.get(url)["ETag"]
+        other.text = "changed"
+        other.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.patch(url, {"text": "edited"}, content_type="application/json")
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["text"], "edited")
+
+    def test_without_change_triggers_etag_and_cache_are_disabled(self):
+        # 非 SQLite 資料庫上 migration 0006 不建立 trigger，版本號永遠不會前進
+        with connection.cursor() as cursor:
+            for statement in import_module("data.migrations.0006_datachange").DROP_SQL:
+                cursor.execute(statement)
+        with patch("data.cache._TRACKED", set()):
+            first = self.client.get(reverse("data-collection"))
+            self.assertFalse(first.has_header("ETag"))
+            self.assertFalse(first.has_header("X-Data-Version"))
+            self.assertFalse(self.client.get(reverse("data-detail", args=[self.item.id])).has_header("ETag"))
+
+            Data.objects.create(text="more")
+            self.assertEqual(len(self.client.get(reverse("data-collection")).json()), 2)
+            with self.settings(ROOT_URLCONF="config.urls_asgi"):
+                resp = async_to_sync(self.async_client.get)(reverse("data-collection"))
+            self.assertFalse(resp.has_header("ETag"))
+            self.assertEqual(len(resp.json()), 2)
+        self.assertEqual(len(LIST_CACHE), 0)
+
+
+class ResponseCacheTests(SimpleTestCase):
+    def _response(self, size):
+        resp = HttpResponse(b"x" * size, content_type="application/json")
+        return resp
+
+    def test_lru_eviction_respects_byte_budget(self):
+        cache = ResponseCache(max_bytes=800, max_entries=10)
+        for i in range(5):
+            cache.put((1, None, f"/data/?p={i}", ""), self._response(100))
+        cache.get((1, None, "/data/?p=0", ""))
+        cache.put((1, None, "/data/?p=5", ""), self._response(100))
+        cache.put((1, None, "/data/?p=6", ""), self._response(100))
+        cache.put((1, None, "/data/?p=7", ""), self._response(100))
+        cache.put((1, None, "/data/?p=8", ""), self._response(100))
+        self.assertEqual(len(cache), 8)
+        self.assertLessEqual(cache.size, 800)
+        self.assertIsNotNone(cache.get((1, None, "/data/?p=0", "")))
+        self.assertIsNone(cache.get((1, None, "/data/?p=1", "")))
+
+    def test_newer_version_drops_older_entries(self):
+        cache = ResponseCache(max_bytes=10_000)
+        cache.put((1, None, "/data/", ""), self._response(10))
+        cache.put((2, None, "/data/", ""), self._response(10))
+        self.assertEqual(len(cache), 1)
+        cache.put((1, None, "/data/?late", ""), self._response(10))
+        self.assertIsNone(cache.get((1, None, "/data/?late", "")))
+
+
+class DataTransferTests(TestCase):
+    TRICKY = ['plain', 'comma, "quoted"', "multi\nline", "中文 \u2028 sep"]
+
+    def setUp(self):
+        Data.objects.bulk_create([Data(text=text) for text in self.TRICKY])
+
+    def _body(self, resp):
+        return b"".join(resp.streaming_content).decode()
+
+    def test_export_ndjson_matches_serializer(self):
+        resp = self.client.get(reverse("data-export"))
+        self.assertEqual(resp["Content-Type"], "application/x-ndjson")
+        self.assertIn("attachment", resp["Content-Disposition"])
+        lines = self._body(resp).splitlines()
+        expected = json.loads(json.dumps(DataSerializer(Data.objects.order_by("id"), many=True).data))
+        self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_export_reads_in_keyset_chunks(self):
+        Data.objects.bulk_create([Data(text=f"row {i}") for i in range(96)])
+        with CaptureQueriesContext(connection) as queries:
+            chunks = list(export_iter("ndjson", chunk_size=25))
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(len(queries.captured_queries), 5)
+        self.assertEqual(sum(chunk.count(b"\n") for chunk in chunks), 100)
+
+    def test_csv_round_trip_preserves_text(self):
+        body = self._body(self.client.get(reverse("data-export"), {"fmt": "csv"}))
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([row["text"] for row in rows], self.TRICKY)
+
+        Data.objects.all().delete()
+        resp = self.client.post(reverse("data-import"), body, content_type="text/csv")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {"created": 4, "failed": 0, "errors": []})
+        self.assertEqual(list(Data.objects.order_by("id").values_list("text", flat=True)), self.TRICKY)
+
+    def test_export_empty_csv_still_has_header(self):
+        Data.objects.all().delete()
+        body = self._body(self.client.get(reverse("data-export"), {"fmt": "csv"}))
+        self.assertEqual(body.strip(), "id,text,created_at,updated_at")
+
+    def test_ndjson_import_reports_bad_lines_and_keeps_good_ones(self):
+        body = "\n".join([
+            json.dumps({"text": "  one  "}),
+            "not json",
+            json.dumps({"text": ""}),
+            "",
+            json.dumps([1]),
+            json.dumps({"text": "two", "id": 999}),
+        ])
+        resp = self.client.post(reverse("data-import"), body, content_type="application/x-ndjson")
+        self.assertEqual(resp.status_code, 200)
+        payload = resp.json()
+        self.assertEqual(payload["created"], 2)
+        self.assertEqual(payload["failed"], 3)
+        self.assertEqual([error["line"] for error in payload["errors"]], [2, 3, 5])
+        self.assertTrue(Data.objects.filter(text="one").exists())
+        self.assertFalse(Data.objects.filter(id=999).exists())
+
+    def test_import_commits_in_batches(self):
+        lines = (json.dumps({"text": f"t{i}"}) + "\n" for i in range(10))
+        seen = []
+        result = import_rows("ndjson", lines, batch_size=4, on_batch=seen.append)
+        self.assertEqual(result["created"], 10)
+        self.assertEqual(seen, [4, 8, 10])
+
+    def test_invalid_utf8_after_committed_batches_is_reported(self):
+        valid = IMPORT_BATCH_SIZE + 500
+        body = b"".join(json.dumps({"text": f"t{i}"}).encode() + b"\n" for i in range(valid)) + b"\xff\n"
+        resp = self.client.post(reverse("data-import"), body, content_type="application/x-ndjson")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            resp.json(),
+            {"created": valid, "failed": 1, "errors": [{"line": valid + 1, "error": "invalid UTF-8; import stopped"}]},
+        )
+        self.assertEqual(Data.objects.count(), len(self.TRICKY) + valid)
+
+    def test_import_rejects_unknown_format_and_bad_header(self):
+        resp = self.client.post(reverse("data-import"), "x", content_type="application/octet-stream")
+        self.assertEqual(resp.status_code, 415)
+        resp = self.client.post(reverse("data-import") + "?fmt=csv", "name\nx\n", content_type="text/plain")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("body", resp.json())
+
+    def test_management_commands_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "dump.csv")
+            call_command("export_data", path, chunk_size=2)
+            Data.objects.all().delete()
+            out = io.StringIO()
+            call_command("import_data", path, batch_size=3, stdout=out)
+        self.assertIn("created 4, failed 0", out.getvalue())
+        self.assertEqual(list(Data.objects.order_by("id").values_list("text", flat=True)), self.TRICKY)
+
+    def test_asgi_export_pulls_one_chunk_at_a_time(self):
+        pulled = []
+
+        def source():
+            for chunk in (b"a", b"b", b"c"):
+                pulled.append(chunk)
+                yield chunk
+
+        async def first_two():
+            stream = _aiter_sync(source())
+            return [await anext(stream), await anext(stream)]
+
+        self.assertEqual(asyncio.run(first_two()), [b"a", b"b"])
+        self.assertEqual(pulled, [b"a", b"b"])
+
+
+@override_settings(DATA_WRITE_COALESCE=True)
+class WriteCoalescerTests(TransactionTestCase):
+    def _concurrently(self, coalescer, fns):
+        results = [None] * len(fns)
+        threads_seen = set()
+
+        def call(index, fn):
+            def wrapped():
+                threads_seen.add(threading.get_ident())
+                return fn()
+            try:
+                results[index] = coalescer.run(wrapped)
+            except Exception as exc:
+                results[index] = exc
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=call, args=(i, fn)) for i, fn in enumerate(fns)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        return results, threads_seen
+
+    def test_concurrent_writes_share_one_writer_thread(self):
+        coalescer = WriteCoalescer(max_batch=64, linger=0.05)
+        fns = [lambda i=i: Data.objects.create(text=f"w{i}").id for i in range(8)]
+        results, threads_seen = self._concurrently(coalescer, fns)
+        self.assertEqual(len(set(results)), 8)
+        self.assertEqual(len(threads_seen), 1)
+        self.assertEqual(Data.objects.count(), 8)
+
+    def test_failing_write_does_not_roll_back_the_batch(self):
+        coalescer = WriteCoalescer(max_batch=64, linger=0.05)
+
+        def boom():
+            Data.objects.create(text="rolled back")
+            raise ValueError("boom")
+
+        results, _ = self._concurrently(coalescer, [lambda: Data.objects.create(text="kept").id, boom])
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(list(Data.objects.values_list("text", flat=True)), ["kept"])
+
+    def test_runs_inline_inside_a_transaction(self):
+        coalescer = WriteCoalescer()
+        with transaction.atomic():
+            self.assertEqual(coalescer.run(threading.get_ident), threading.get_ident())
+
+    @override_settings(DATA_WRITE_COALESCE=False)
+    def test_disabled_runs_inline(self):
+        self.assertEqual(WriteCoalescer().run(threading.get_ident), threading.get_ident())
+
+    def test_api_writes_go_through_the_coalescer(self):
+        resp = self.client.post(reverse("data-collection"), {"text": "queued"}, content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+        url = reverse("data-detail", args=[resp.json()["id"]])
+        self.assertEqual(self.client.patch(url, {"text": "edited"}, content_type="application/json").json()["text"], "edited")
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(Data.objects.exists())
+
+
+    def test_arun_awaits_the_writer_thread(self):
+        coalescer = WriteCoalescer()
+
+        async def create():
+            return await coalescer.arun(lambda: (threading.get_ident(), Data.objects.create(text="async").id))
+
+        writer, pk = asyncio.run(create())
+        self.assertNotEqual(writer, threading.get_ident())
+        self.assertTrue(Data.objects.filter(pk=pk, text="async").exists())
+
+
+class DataAsyncViewTests(TestCase):
+    """
+    config.urls_asgi 下的 async view 與 DRF view 的輸出必須一致。
+    """
+
+    def setUp(self):
+        LIST_CACHE.clear()
+        Data.objects.bulk_create([Data(text=f"item {i}") for i in range(5)])
+        self.first = Data.objects.order_by("id").first()
+
+    def _sync(self, method, path, **kwargs):
+        with self.settings(ROOT_URLCONF="config.urls"):
+            return getattr(self.client, method)(path, **kwargs)
+
+    def _async(self, method, path, **kwargs):
+        with self.settings(ROOT_URLCONF="config.urls_asgi"):
+            response = async_to_sync(getattr(self.async_client, method))(path, **kwargs)
+            response.resolver_match.func  # resolver_match 是 lazy 的，需在 URLconf 還原前解析
+        return response
+
+    def _assert_same(self, sync, asynchronous):
+        self.assertEqual(asynchronous.status_code, sync.status_code)
+        self.assertEqual(asynchronous.content, sync.content)
+        for header in ("Content-Type", "Allow", "Link", "X-Next-Cursor", "X-Data-Version", "ETag"):
+            self.assertEqual(asynchronous.headers.get(header), sync.headers.get(header), header)
+
+    def test_reads_match_the_drf_views(self):
+        detail = f"/data/{self.first.id}/"
+        for path, params in [
+            ("/data/", {}),
+            ("/data/", {"page_size": 2}),
+            ("/data/", {"search": "item", "ordering": "-updated_at"}),
+            (detail, {}),
+            ("/data/999999/", {}),
+            ("/data/", {"cursor": "garbage"}),
+        ]:
+            LIST_CACHE.clear()
+            sync = self._sync("get", path, data=params)
+            LIST_CACHE.clear()
+            asynchronous = self._async("get", path, data=params)
+            self._assert_same(sync, asynchronous)
+
+        cursor = self._async("get", "/data/", data={"page_size": 2})["X-Next-Cursor"]
+        self._assert_same(
+            self._sync("get", "/data/", data={"page_size": 2, "cursor": cursor}),
+            self._async("get", "/data/", data={"page_size": 2, "cursor": cursor}),
+        )
+
+    def test_async_views_handle_json_requests(self):
+        resp = self._async("get", "/data/")
+        self.assertIs(resp.resolver_match.func, async_views.data_collection)
+        resp = self._async("get", f"/data/{self.first.id}/")
+        self.assertIs(resp.resolver_match.func, async_views.data_detail)
+
+    def test_validation_errors_match(self):
+        detail = f"/data/{self.first.id}/"
+        for method, path, body in [
+            ("post", "/data/", {"text": "   "}),
+            ("post", "/data/", {}),
+            ("post", "/data/", [1]),
+            ("put", detail, {}),
+            ("patch", detail, {"text": "x" * 1025}),
+            ("patch", "/data/999999/", {"text": "ok"}),
+            ("post", "/data/", "{broken"),
+        ]:
+            payload = body if isinstance(body, str) else json.dumps(body)
+            sync = self._sync(method, path, data=payload, content_type="application/json")
+            asynchronous = self._async(method, path, data=payload, content_type="application/json")
+            self._assert_same(sync, asynchronous)
+
+    def test_writes_round_trip(self):
+        resp = self._async("post", "/data/", data={"text": "  created  "}, content_type="application/json")
+        self.assertEqual(resp.status_code, 201)
+        created = resp.json()
+        self.assertEqual(created["text"], "created")
+        self.assertEqual(created, self._sync("get", f"/data/{created['id']}/").json())
+
+        detail = f"/data/{created['id']}/"
+        resp = self._async("patch", detail, data={"text": "patched"}, content_type="application/json")
+        self.assertEqual(resp.json()["text"], "patched")
+        resp = self._async("put", detail, data={"text": "put"}, content_type="application/json")
+        self.assertEqual(resp.json()["text"], "put")
+        self.assertEqual(Data.objects.get(pk=created["id"]).text, "put")
+
+        resp = self._async("delete", detail)
+        self.assertEqual(resp.status_code, 204)
+        self.assertEqual(resp.content, b"")
+        self.assertEqual(self._async("delete", detail).status_code, 404)
+
+    def test_conditional_get_and_cache(self):
+        etag = self._async("get", "/data/")["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            resp = self._async("get", "/data/", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(len(queries.captured_queries), 1)
+        with CaptureQueriesContext(connection) as queries:
+            resp = self._async("get", "/data/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(queries.captured_queries), 1)
+
+        detail = f"/data/{self.first.id}/"
+        etag = self._async("get", detail)["ETag"]
+        self.assertEqual(self._async("get", detail, headers={"If-None-Match": etag}).status_code, 304)
+
+    def test_other_representations_fall_back_to_drf(self):
+        resp = self._async("get", "/data/", headers={"Accept": "text/html"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("text/html", resp["Content-Type"])
+        resp = self._async("options", "/data/")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["name"], "Data List Create")
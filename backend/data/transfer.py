@@ -0,0 +1,228 @@
+# data/transfer.py
+"""
+Data 的串流匯出 / 匯入 (NDJSON、CSV)，供 /data/export/、/data/import/ 與
+export_data / import_data 指令共用。
+
+- 匯出以 WHERE id > ? LIMIT n 分批讀取 (keyset，與分頁相同)，每批轉成一段 bytes 後即丟棄；
+  不持有長時間的讀取交易，記憶體只與批次大小有關。
+- 匯入逐行解析，每 batch_size 筆以一個 transaction 的 bulk_create 寫入；
+  text 的驗證與 POST /data/ 相同，無效的列略過並回報行號。id 與時間欄位不匯入，一律建立新資料列。
+  遇到無法以 UTF-8 解碼的行時停止讀取，該行同樣回報為錯誤，已 commit 的批次保留並計入 created。
+"""
+import codecs
+import csv
+import io
+import json
+import os
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from .listing import LIST_FIELDS, rows_to_data
+from .models import Data
+from .serializers import DataSerializer
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+EXPORT_CHUNK_SIZE = int(os.getenv("DATA_EXPORT_CHUNK_SIZE", "2000"))
+IMPORT_BATCH_SIZE = int(os.getenv("DATA_IMPORT_BATCH_SIZE", "1000"))
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportFormatError(ValueError):
+    """
+    整份輸入無法解析 (例如 CSV 缺少 text 欄位)，與單列的驗證錯誤區分。
+    """
+
+
+def guess_format(name: str | None) -> str | None:
+    """
+    由 Content-Type 或檔名推斷格式；無法判斷時回傳 None。
+    """
+    name = (name or "").lower()
+    if "csv" in name:
+        return "csv"
+    if "ndjson" in name or "jsonl" in name or "json" in name:
+        return "ndjson"
+    return None
+
+
+def iter_chunks(queryset=None, chunk_size: int = EXPORT_CHUNK_SIZE):
+    """
+    依 id 遞增逐批產生 rows_to_data 格式的 list；每批一次查詢。
+    """
+    queryset = (queryset if queryset is not None else Data.objects.all()).order_by("id")
+    last_id = 0
+    while True:
+        rows = list(queryset.filter(id__gt=last_id).values_list(*LIST_FIELDS)[:chunk_size])
+        if not rows:
+            return
+        yield rows_to_data(rows)
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+
+def _ndjson_chunk(items: list[dict]) -> bytes:
+    text = "".join(json.dumps(item, ensure_ascii=False, separators=(",", ":")) + "\n" for item in items)
+    # 與 JSONRenderer 相同跳脫 U+2028 / U+2029，以 str.splitlines 切行的讀取端也不會斷在字串中間
+    return text.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029").encode()
+
+
+def _csv_chunk(items: list[dict], header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(LIST_FIELDS)
+    writer.writerows([item[field] for field in LIST_FIELDS] for item in items)
+    return buffer.getvalue().encode()
+
+
+def encode_chunks(fmt: str, chunks):
+    """
+    把 iter_chunks 的輸出轉成 bytes；CSV 在第一段前加上標題列 (資料表為空時仍會輸出)。
+    """
+    if fmt == "csv":
+        header = True
+        for items in chunks:
+            yield _csv_chunk(items, header)
+            header = False
+        if header:
+            yield _csv_chunk([], True)
+    else:
+        for items in chunks:
+            yield _ndjson_chunk(items)
+
+
+def export_iter(fmt: str, queryset=None, chunk_size: int = EXPORT_CHUNK_SIZE):
+    return encode_chunks(fmt, iter_chunks(queryset, chunk_size))
+
+
+def _ndjson_texts(lines):
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield number, None, "invalid JSON"
+            continue
+        if not isinstance(item, dict):
+            yield number, None, "each line must be a JSON object"
+            continue
+        yield number, item.get("text"), None
+
+
+def _csv_texts(lines):
+    reader = csv.reader(lines)
+    try:
+        header = next(reader)
+    except StopIteration:
+        return
+    except csv.Error as exc:
+        raise ImportFormatError(f"invalid CSV: {exc}")
+    header = [name.strip().lstrip("\ufeff") for name in header]
+    if "text" not in header:
+        raise ImportFormatError("CSV header must contain a text column")
+    index = header.index("text")
+    while True:
+        # line_num 為讀完此列後的實體行號，帶換行的欄位也能對到起始行
+        number = reader.line_num + 1
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            yield number, None, f"invalid CSV: {exc}"
+            return
+        if not row:
+            continue
+        yield number, row[index] if index < len(row) else None, None
+
+
+def parse_texts(fmt: str, lines):
+    """
+    逐行解析，產生 (行號, text, 錯誤訊息)；lines 為 str 的 iterable (檔案或解碼後的請求本體)。
+    """
+    return _csv_texts(lines) if fmt == "csv" else _ndjson_texts(lines)
+
+
+def decode_lines(chunks, encoding: str = "utf-8"):
+    """
+    bytes 行 (例如 HttpRequest 的迭代結果) 以增量解碼轉成 str，不讀入整份本體。
+    """
+    return codecs.iterdecode(chunks, encoding)
+
+
+class _DecodedLines:
+    """
+    包住 lines 計算已讀的行數；解碼失敗時停止迭代並記下失敗的行號，而不是讓例外中斷整個匯入。
+    """
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.count = 0
+        self.failed_line = None
+
+    def __iter__(self):
+        try:
+            for line in self.lines:
+                self.count += 1
+                yield line
+        except UnicodeDecodeError:
+            self.failed_line = self.count + 1
+
+
+def _validate_text(field, serializer, value):
+    if value is None:
+        return None, "text is required"
+    try:
+        return serializer.validate_text(field.run_validation(value)), None
+    except ValidationError as exc:
+        detail = exc.detail
+        return None, str(detail[0] if isinstance(detail, list) and detail else detail)
+
+
+def import_rows(fmt: str, lines, batch_size: int = IMPORT_BATCH_SIZE, on_batch=None) -> dict:
+    """
+    匯入並回傳 {"created", "failed", "errors"}；errors 只保留前 MAX_REPORTED_ERRORS 筆。
+    每批各自 commit，中途失敗時已寫入的批次會保留；on_batch(created) 於每批 commit 後呼叫。
+    無法以 UTF-8 解碼時停止匯入，之前的有效列照常寫入，失敗的行記為一筆錯誤。
+    """
+    serializer = DataSerializer()
+    field = serializer.fields["text"]
+    created = failed = 0
+    errors = []
+    batch = []
+    lines = _DecodedLines(lines)
+
+    def flush():
+        nonlocal created
+        with transaction.atomic():
+            Data.objects.bulk_create(batch)
+        created += len(batch)
+        batch.clear()
+        if on_batch is not None:
+            on_batch(created)
+
+    for number, raw, error in parse_texts(fmt, lines):
+        text = None
+        if error is None:
+            text, error = _validate_text(field, serializer, raw)
+        if error is not None:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": number, "error": error})
+            continue
+        batch.append(Data(text=text))
+        if len(batch) >= batch_size:
+            flush()
+    if lines.failed_line is not None:
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": lines.failed_line, "error": "invalid UTF-8; import stopped"})
+    if batch:
+        flush()
+    return {"created": created, "failed": failed, "errors": errors}
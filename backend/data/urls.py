@@ -1,9 +1,29 @@
 from django.urls import path
 
-from .views import DataListCreateView, DataRetrieveUpdateDestroyView
+from . import async_views
+from .views import (
+    DataBulkView,
+    DataChangesView,
+    DataImportView,
+    DataListCreateView,
+    DataRetrieveUpdateDestroyView,
+    data_change_stream,
+    data_export,
+)
 
 
 urlpatterns = [
     path("data/", DataListCreateView.as_view(), name="data-collection"),
+    path("data/bulk/", DataBulkView.as_view(), name="data-bulk"),
+    path("data/export/", data_export, name="data-export"),
+    path("data/import/", DataImportView.as_view(), name="data-import"),
+    path("data/changes/", DataChangesView.as_view(), name="data-changes"),
+    path("data/changes/stream/", data_change_stream, name="data-changes-stream"),
     path("data/<int:pk>/", DataRetrieveUpdateDestroyView.as_view(), name="data-detail"),
 ]
+
+# ASGI 下由 config/urls_asgi.py 放在最前面，同路徑改由 async view 處理
+async_urlpatterns = [
+    path("data/", async_views.data_collection, name="data-collection"),
+    path("data/<int:pk>/", async_views.data_detail, name="data-detail"),
+]
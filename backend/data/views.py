@@ -1,22 +1,241 @@
-from rest_framework import generics, permissions
+import json
 
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.views.decorators.http import require_GET
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import UnsupportedMediaType, ValidationError
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .cache import LIST_CACHE, detail_etag, detail_last_modified, list_etag, list_last_modified, table_state
+from .changes import DEFAULT_CHANGE_LIMIT, MAX_CHANGE_LIMIT, NOTIFIER, changes_since
+from .listing import LIST_FIELDS, FastJSONRenderer, fast_path_enabled, rows_to_data
 from .models import Data
-from .serializers import DataSerializer
+from .pagination import DataCursorPagination
+from .search import search
+from .serializers import DataBulkSerializer, DataSerializer
+from .transfer import FORMATS, ImportFormatError, decode_lines, export_iter, guess_format, import_rows
+from .writes import WRITES
+
+SSE_KEEPALIVE = 15.0
+
+
+def _notify_changes():
+    transaction.on_commit(NOTIFIER.poke)
+
 
+def _parse_version(value, default: int = 0) -> int | None:
+    if value in (None, ""):
+        return default
+    try:
+        version = int(value)
+    except (TypeError, ValueError):
+        return None
+    return version if version >= 0 else None
 
+
+@method_decorator(condition(etag_func=list_etag, last_modified_func=list_last_modified), name="get")
 class DataListCreateView(generics.ListCreateAPIView):
     serializer_class = DataSerializer
     permission_classes = [permissions.AllowAny]
+    pagination_class = DataCursorPagination
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
 
     def get_queryset(self):
+        """
+        ?search=<kw>                      → 子字串搜尋 (SQLite 上走 FTS5 trigram 索引)
+        ?search=<kw>&ordering=relevance   → 依相關度排序，預設依 id
+        ?ordering=updated_at|-updated_at  → 依更新時間排序
+        分頁由 DataCursorPagination 處理 (?cursor=、?page_size=)。
+        """
         keyword = (self.request.query_params.get("search") or "").strip()
-        queryset = Data.objects.all()
+        queryset = Data.objects.all().order_by("id")
         if keyword:
-            queryset = queryset.filter(text__icontains=keyword)
-        return queryset.order_by("id")
+            rank = self.request.query_params.get("ordering") == "relevance"
+            queryset = search(queryset, keyword, rank=rank)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # 先取版本號再查詢：之後的變更一定會出現在 /data/changes/?since=<version>
+        state = table_state(request)
+        version = state[0]
+        key = None if version is None else LIST_CACHE.key(request, state)
+        cached = None if key is None else LIST_CACHE.get(key)
+        if cached is not None:
+            return cached
+        if isinstance(request.accepted_renderer, JSONRenderer) and fast_path_enabled():
+            response = self._fast_list()
+        else:
+            response = super().list(request, *args, **kwargs)
+        if key is not None:
+            # 沒有版本號 (資料庫上沒有變更 trigger) 時不快取，每次都查詢
+            response["X-Data-Version"] = str(version)
+            response.add_post_render_callback(lambda rendered: LIST_CACHE.put(key, rendered))
+        return response
+
+    def _fast_list(self):
+        """
+        以 values_list 取 tuple 組成回應，略過 Data 物件與 DataSerializer；輸出與 super().list() 相同。
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        # 分頁以 getattr 取排序欄位，named tuple 需帶上 search_rank 等 annotation
+        rows = queryset.values_list(*LIST_FIELDS, *queryset.query.annotations, named=True)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(rows_to_data(rows))
+        return self.get_paginated_response(rows_to_data(page))
 
+    def perform_create(self, serializer):
+        WRITES.run(serializer.save)
+        _notify_changes()
 
+
+@method_decorator(condition(etag_func=detail_etag, last_modified_func=detail_last_modified), name="get")
 class DataRetrieveUpdateDestroyView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = DataSerializer
     permission_classes = [permissions.AllowAny]
     queryset = Data.objects.all().order_by("id")
+
+    def perform_update(self, serializer):
+        WRITES.run(serializer.save)
+        _notify_changes()
+
+    def perform_destroy(self, instance):
+        WRITES.run(instance.delete)
+        _notify_changes()
+
+
+class DataBulkView(generics.GenericAPIView):
+    """
+    POST /data/bulk/：一次建立 / 更新 / 刪除多筆，整批在同一個 transaction 內完成。
+    """
+
+    serializer_class = DataBulkSerializer
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        WRITES.run(serializer.save)
+        _notify_changes()
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class DataChangesView(APIView):
+    """
+    GET /data/changes/?since=<version>&limit=<n>：回傳 version 之後變動的資料列 (含刪除的 tombstone)。
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        since = _parse_version(request.query_params.get("since"))
+        limit = _parse_version(request.query_params.get("limit"), DEFAULT_CHANGE_LIMIT)
+        if since is None:
+            raise ValidationError({"since": ["must be a non-negative integer"]})
+        if not limit:
+            raise ValidationError({"limit": ["must be a positive integer"]})
+        return Response(changes_since(since, min(limit, MAX_CHANGE_LIMIT)))
+
+
+class DataImportView(APIView):
+    """
+    POST /data/import/?fmt=ndjson|csv：逐行讀取請求本體並分批寫入，不把整份內容載入記憶體。
+    未指定 fmt 時依 Content-Type 判斷；回傳 {"created", "failed", "errors"}。
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def post(self, request, *args, **kwargs):
+        fmt = request.query_params.get("fmt") or guess_format(request.content_type)
+        if fmt not in FORMATS:
+            raise UnsupportedMediaType(request.content_type or "", detail="use ?fmt=ndjson or ?fmt=csv")
+        stream = request.stream
+        if stream is None:
+            raise ValidationError({"body": ["request body is empty"]})
+        try:
+            result = import_rows(fmt, decode_lines(stream), on_batch=lambda created: _notify_changes())
+        except ImportFormatError as exc:
+            raise ValidationError({"body": [str(exc)]})
+        return Response(result, status=status.HTTP_200_OK)
+
+
+async def _aiter_sync(iterator):
+    # 在 ASGI 下逐段於 worker thread 取值；直接交給 StreamingHttpResponse 會先整份讀入記憶體
+    step = sync_to_async(next)
+    while (chunk := await step(iterator, None)) is not None:
+        yield chunk
+
+
+@require_GET
+def data_export(request):
+    """
+    GET /data/export/?fmt=ndjson|csv[&search=<kw>]：依 id 順序串流輸出全部資料。
+    """
+    fmt = request.GET.get("fmt") or "ndjson"
+    if fmt not in FORMATS:
+        return HttpResponse("fmt must be ndjson or csv", status=400)
+    queryset = Data.objects.all()
+    keyword = (request.GET.get("search") or "").strip()
+    if keyword:
+        queryset = search(queryset, keyword)
+    chunks = export_iter(fmt, queryset)
+    if isinstance(request, ASGIRequest):
+        chunks = _aiter_sync(chunks)
+    response = StreamingHttpResponse(chunks, content_type=FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="data.{fmt}"'
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+def _sse_event(batch: dict) -> bytes:
+    payload = json.dumps(batch, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {batch['version']}\nevent: changes\ndata: {payload}\n\n".encode()
+
+
+def _iter_changes(since: int):
+    while True:
+        batch = changes_since(since, MAX_CHANGE_LIMIT)
+        if batch["changes"]:
+            since = batch["version"]
+            yield _sse_event(batch)
+            if batch["has_more"]:
+                continue
+        if NOTIFIER.wait(since, SSE_KEEPALIVE) <= since:
+            yield b": keepalive\n\n"
+
+
+async def _aiter_changes(since: int):
+    fetch = sync_to_async(changes_since)
+    while True:
+        batch = await fetch(since, MAX_CHANGE_LIMIT)
+        if batch["changes"]:
+            since = batch["version"]
+            yield _sse_event(batch)
+            if batch["has_more"]:
+                continue
+        if await NOTIFIER.wait_async(since, SSE_KEEPALIVE) <= since:
+            yield b": keepalive\n\n"
+
+
+@require_GET
+def data_change_stream(request):
+    """
+    GET /data/changes/stream/?since=<version>：Server-Sent Events，每批變更一個 "changes" 事件，
+    事件 id 為版本號，瀏覽器重連時會以 Last-Event-ID 接續。
+    在 ASGI 伺服器下改用 async generator，等待中的訂閱者不佔 worker。
+    """
+    since = _parse_version(request.headers.get("Last-Event-ID") or request.GET.get("since"))
+    if since is None:
+        return HttpResponse("since must be a non-negative integer", status=400)
+    iter_changes = _aiter_changes if isinstance(request, ASGIRequest) else _iter_changes
+    response = StreamingHttpResponse(iter_changes(since), content_type="text/event-stream")
+    response["Cache-Control"] = "no-store"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -23,7 +23,7 @@ export default function DataFetcher() {
     setResult(null)
     try {
       const payload = mode === 'all'
-        ? await api.listData()
+        ? (await api.listData()).items
         : await api.getData(recordId.trim())
       setResult(payload)
     } catch (err) {
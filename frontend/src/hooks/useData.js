@@ -1,11 +1,31 @@
 import { useCallback, useEffect, useRef, useState } from 'react'
 import { api } from '../services/api'
 
+// 把 /data/changes/ 的增量套用到目前載入的列表
+function applyChanges(prev, changes, { appendCreates }) {
+  let next = prev
+  for (const change of changes) {
+    const index = next.findIndex((item) => item.id === change.id)
+    if (change.op === 'delete') {
+      if (index !== -1) next = next.filter((item) => item.id !== change.id)
+    } else if (index !== -1) {
+      next = next.map((item) => (item.id === change.id ? change.data : item))
+    } else if (change.op === 'create' && appendCreates) {
+      next = [...next, change.data]
+    }
+  }
+  return next
+}
+
 export function useData(autoLoad = true) {
   const [items, setItems] = useState([])
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState('')
+  const [nextCursor, setNextCursor] = useState(null)
   const lastQueryRef = useRef('')
+  const versionRef = useRef(null)
+  const nextCursorRef = useRef(null)
+  const [streamFrom, setStreamFrom] = useState(null)
 
   const runMutation = useCallback(async (fn, fallbackMessage = 'Operation failed') => {
     try {
@@ -17,6 +37,15 @@ export function useData(autoLoad = true) {
     }
   }, [])
 
+  const applyBatch = useCallback((batch) => {
+    const fresh = batch.changes.filter((change) => change.version > (versionRef.current ?? 0))
+    if (batch.version > (versionRef.current ?? 0)) versionRef.current = batch.version
+    if (fresh.length === 0) return
+    // 只有在未搜尋且已載入到最後一頁時，新建立的資料才確定屬於目前列表
+    const appendCreates = lastQueryRef.current === '' && !nextCursorRef.current
+    setItems((prev) => applyChanges(prev, fresh, { appendCreates }))
+  }, [])
+
   const refresh = useCallback(async (searchTerm) => {
     const normalized = typeof searchTerm === 'string' ? searchTerm.trim() : undefined
     const effectiveQuery = normalized !== undefined ? normalized : lastQueryRef.current
@@ -26,8 +55,12 @@ export function useData(autoLoad = true) {
     try {
       setLoading(true)
       setError('')
-      const data = await api.listData(effectiveQuery)
-      setItems(Array.isArray(data) ? data : [])
+      const page = await api.listData(effectiveQuery)
+      setItems(page.items)
+      setNextCursor(page.nextCursor)
+      nextCursorRef.current = page.nextCursor
+      versionRef.current = page.version
+      setStreamFrom((current) => current ?? page.version)
     } catch (e) {
       setError(e?.message || 'Load failed')
     } finally {
@@ -35,30 +68,76 @@ export function useData(autoLoad = true) {
     }
   }, [])
 
+  // 只拉取上次同步之後的變更，取代整份列表重抓
+  const sync = useCallback(async () => {
+    if (versionRef.current === null) {
+      await refresh()
+      return
+    }
+    let batch
+    do {
+      batch = await api.listChanges(versionRef.current)
+      applyBatch(batch)
+    } while (batch.has_more)
+  }, [applyBatch, refresh])
+
+  const loadMore = useCallback(async () => {
+    if (!nextCursor) return
+    try {
+      setLoading(true)
+      setError('')
+      const page = await api.listData(lastQueryRef.current, nextCursor)
+      setItems((prev) => [...prev, ...page.items])
+      setNextCursor(page.nextCursor)
+      nextCursorRef.current = page.nextCursor
+    } catch (e) {
+      setError(e?.message || 'Load failed')
+    } finally {
+      setLoading(false)
+    }
+  }, [nextCursor])
+
   const createItem = useCallback(async (text) => {
     await runMutation(async () => {
       await api.createData(text)
-      await refresh()
+      await sync()
     }, 'Create failed')
-  }, [refresh, runMutation])
+  }, [sync, runMutation])
 
   const updateItem = useCallback(async (id, text) => {
     await runMutation(async () => {
       await api.updateData(id, text)
-      await refresh()
+      await sync()
     }, 'Update failed')
-  }, [refresh, runMutation])
+  }, [sync, runMutation])
 
   const deleteItem = useCallback(async (id) => {
     await runMutation(async () => {
       await api.deleteData(id)
-      await refresh()
+      await sync()
     }, 'Delete failed')
-  }, [refresh, runMutation])
+  }, [sync, runMutation])
 
   useEffect(() => {
     if (autoLoad) refresh()
   }, [autoLoad, refresh])
 
-  return { items, loading, error, refresh, createItem, updateItem, deleteItem }
+  // 其他使用者的變更經由 SSE 推送；瀏覽器斷線重連時會帶 Last-Event-ID 接續
+  useEffect(() => {
+    if (!autoLoad || streamFrom === null || typeof EventSource === 'undefined') return undefined
+    const source = new EventSource(api.changesStreamUrl(streamFrom))
+    source.addEventListener('changes', (event) => {
+      try {
+        applyBatch(JSON.parse(event.data))
+      } catch {
+        // 忽略無法解析的事件，下一次 sync 會補齊
+      }
+    })
+    return () => source.close()
+  }, [autoLoad, streamFrom, applyBatch])
+
+  return {
+    items, loading, error, refresh, createItem, updateItem, deleteItem,
+    hasMore: Boolean(nextCursor), loadMore,
+  }
 }
@@ -9,10 +9,14 @@ function withTimeout(promise, ms = DEFAULT_TIMEOUT) {
   })]
 }
 
-export async function http(method, url, { json, headers, timeout } = {}) {
+export function apiUrl(url) {
   const rawBase = import.meta.env.VITE_API_BASE_URL
   const base = rawBase && rawBase.trim() !== '' ? rawBase.replace(/\/$/, '') : '/api'
-  const full = url.startsWith('http') ? url : `${base}${url}`
+  return url.startsWith('http') ? url : `${base}${url}`
+}
+
+export async function http(method, url, { json, headers, timeout, withHeaders } = {}) {
+  const full = apiUrl(url)
 
   const [controller, run] = withTimeout((signal) => fetch(full, {
     method,
@@ -31,7 +35,7 @@ export async function http(method, url, { json, headers, timeout } = {}) {
     let data
     try { data = text ? JSON.parse(text) : null } catch { data = text }
     if (!res.ok) throw Object.assign(new Error('HTTP Error'), { status: res.status, data })
-    return data
+    return withHeaders ? { data, headers: res.headers } : data
   } catch (err) {
     if (err.name === 'AbortError') throw new Error('Request timeout')
     throw err
@@ -7,7 +7,8 @@ import { Button } from '@/components/ui/button'
 export default function DataCrud() {
   const {
     items, loading, error,
-    createItem, updateItem, deleteItem, refresh
+    createItem, updateItem, deleteItem, refresh,
+    hasMore, loadMore
   } = useData(true)
   const [searchInput, setSearchInput] = useState('')
   const [appliedSearch, setAppliedSearch] = useState('')
@@ -61,6 +62,11 @@ export default function DataCrud() {
 
       <DataForm onSubmit={createItem} />
       <DataTable items={items} onDelete={deleteItem} onUpdate={updateItem} />
+      {hasMore && (
+        <Button variant="outline" type="button" onClick={loadMore} disabled={loading}>
+          Load more
+        </Button>
+      )}
     </section>
   )
 }
@@ -1,15 +1,25 @@
-import { get, post, put, patch, del } from '../lib/fetcher'
+import { apiUrl, get, post, put, patch, del } from '../lib/fetcher'
 
 export const api = {
   health: () => get('/healthz/'),
 
-  // /data/ CRUD
-  listData: (search) => {
-    const query = typeof search === 'string' && search.trim() !== ''
-      ? `?search=${encodeURIComponent(search.trim())}`
-      : ''
-    return get(`/data/${query}`)
+  // /data/ CRUD；列表為 cursor 分頁，下一頁游標在 X-Next-Cursor header
+  listData: async (search, cursor) => {
+    const params = new URLSearchParams()
+    if (typeof search === 'string' && search.trim() !== '') params.set('search', search.trim())
+    if (cursor) params.set('cursor', cursor)
+    const query = params.toString() ? `?${params}` : ''
+    const { data, headers } = await get(`/data/${query}`, { withHeaders: true })
+    const version = Number(headers.get('X-Data-Version'))
+    return {
+      items: Array.isArray(data) ? data : [],
+      nextCursor: headers.get('X-Next-Cursor'),
+      version: Number.isFinite(version) ? version : 0,
+    }
   },
+  // 增量同步：since 之後的變更 (含刪除 tombstone)，以及推送用的 SSE 位址
+  listChanges: (since) => get(`/data/changes/?since=${encodeURIComponent(since)}`),
+  changesStreamUrl: (since) => apiUrl(`/data/changes/stream/?since=${encodeURIComponent(since)}`),
   getData: (id) => get(`/data/${id}/`),
   createData: (text) => post('/data/', { json: { text } }),
   updateData: (id, text) => put(`/data/${id}/`, { json: { text } }),